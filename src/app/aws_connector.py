@@ -1,15 +1,32 @@
 import os
+import json
+import queue
+import random
+import threading
+import time
 import boto3
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import Binary
+from .dynamo_metrics import instrument_resource
 
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+# Default number of segments for parallel scans
+SCAN_SEGMENTS = int(os.getenv('AUTOWAR_SCAN_SEGMENTS', '4'))
+# Concurrent BatchGetItem/BatchWriteItem requests per helper call
+BATCH_CONCURRENCY = int(os.getenv('AUTOWAR_BATCH_CONCURRENCY', '4'))
+BATCH_MAX_RETRIES = int(os.getenv('AUTOWAR_BATCH_MAX_RETRIES', '8'))
+BATCH_GET_LIMIT = 100
+BATCH_WRITE_LIMIT = 25
 
 _dynamo_resource = None
 
 def _get_resource():
     global _dynamo_resource
     if _dynamo_resource is None:
-        _dynamo_resource = boto3.resource('dynamodb', region_name=AWS_REGION)
+        _dynamo_resource = instrument_resource(boto3.resource('dynamodb', region_name=AWS_REGION))
     return _dynamo_resource
 
 def get_table(table_name: str):
@@ -22,3 +39,200 @@ def get_item(table_name: str, item_id: str):
     table = get_table(table_name)
     resp = table.get_item(Key={'id': item_id})
     return resp.get('Item')
+
+
+_SEGMENT_DONE = object()
+
+
+class _SegmentError:
+    def __init__(self, error: BaseException) -> None:
+        self.error = error
+
+
+def parallel_scan(table, total_segments: Optional[int] = None, projection: Optional[str] = None,
+                  filter_expression: Any = None, expression_attribute_names: Optional[Dict[str, str]] = None,
+                  expression_attribute_values: Optional[Dict[str, Any]] = None, page_size: Optional[int] = None,
+                  stats: Optional[Dict[str, Any]] = None, max_buffered: int = 1000) -> Iterator[Dict[str, Any]]:
+    """Scan a whole table with `total_segments` concurrent Segment scans, yielding items as they arrive.
+
+    `table` is a table name or Table resource. Each segment is paginated to the end;
+    items are handed over through a bounded buffer, so memory stays flat however large
+    the table is. When `stats` is given it is filled with `consumed_capacity` (RCU),
+    `scanned_count` and `count` while the scan runs. Stopping iteration early stops the
+    segment workers. An error in any segment is re-raised to the consumer.
+
+    Segments call the table's low-level client, which is thread-safe (a Table resource
+    is not); it is the resource's client, so items come back deserialized.
+    """
+    client, name = _table_client(table)
+    total_segments = total_segments or SCAN_SEGMENTS
+    buffer: queue.Queue = queue.Queue(maxsize=max_buffered)
+    stop = threading.Event()
+    stats_lock = threading.Lock()
+    if stats is not None:
+        stats.update({'consumed_capacity': 0.0, 'scanned_count': 0, 'count': 0})
+
+    def put(obj: Any) -> None:
+        while not stop.is_set():
+            try:
+                buffer.put(obj, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def scan_segment(segment: int) -> None:
+        kwargs: Dict[str, Any] = {'TableName': name, 'Segment': segment, 'TotalSegments': total_segments,
+                                  'ReturnConsumedCapacity': 'INDEXES'}
+        if projection:
+            kwargs['ProjectionExpression'] = projection
+        if filter_expression is not None:
+            kwargs['FilterExpression'] = filter_expression
+        if expression_attribute_names:
+            kwargs['ExpressionAttributeNames'] = expression_attribute_names
+        if expression_attribute_values:
+            kwargs['ExpressionAttributeValues'] = expression_attribute_values
+        if page_size:
+            kwargs['Limit'] = page_size
+        try:
+            while not stop.is_set():
+                resp = client.scan(**kwargs)
+                if stats is not None:
+                    with stats_lock:
+                        stats['consumed_capacity'] += float(resp.get('ConsumedCapacity', {}).get('CapacityUnits', 0))
+                        stats['scanned_count'] += resp.get('ScannedCount', 0)
+                        stats['count'] += resp.get('Count', len(resp.get('Items', [])))
+                for item in resp.get('Items', []):
+                    put(item)
+                last = resp.get('LastEvaluatedKey')
+                if not last:
+                    break
+                kwargs['ExclusiveStartKey'] = last
+        except Exception as e:
+            put(_SegmentError(e))
+        finally:
+            put(_SEGMENT_DONE)
+
+    workers = [threading.Thread(target=scan_segment, args=(s,), name=f'autowar-scan-{s}', daemon=True)
+               for s in range(total_segments)]
+    for w in workers:
+        w.start()
+    try:
+        done = 0
+        while done < total_segments:
+            obj = buffer.get()
+            if obj is _SEGMENT_DONE:
+                done += 1
+            elif isinstance(obj, _SegmentError):
+                raise obj.error
+            else:
+                yield obj
+    finally:
+        stop.set()
+
+
+def _table_client(table) -> Tuple[Any, str]:
+    # The resource's client accepts plain Python values (the resource registers the
+    # type (de)serializers on it), so batch calls need no manual marshalling.
+    if isinstance(table, str):
+        return _get_resource().meta.client, table
+    return table.meta.client, table.name
+
+
+def _key_value(v: Any) -> Any:
+    # DynamoDB returns numbers as Decimal and binaries as Binary: normalize both so a
+    # returned key matches the requested one (int 1, Decimal('1') and 1.0 alike)
+    if isinstance(v, (int, float, Decimal)) and not isinstance(v, bool):
+        return 'N:' + str(Decimal(str(v)).normalize())
+    if isinstance(v, Binary):
+        v = v.value
+    if isinstance(v, (bytes, bytearray)):
+        return 'B:' + bytes(v).hex()
+    return v
+
+
+def _key_id(key: Dict[str, Any]) -> str:
+    return json.dumps({k: _key_value(v) for k, v in key.items()}, sort_keys=True, default=str)
+
+
+def _backoff(attempt: int) -> None:
+    # full jitter: sleep uniformly in [0, 50ms * 2^attempt], capped at 2s
+    time.sleep(random.uniform(0, min(2.0, 0.05 * (2 ** attempt))))
+
+
+def _chunks(seq: Sequence[Any], size: int) -> List[Sequence[Any]]:
+    return [seq[i:i + size] for i in range(0, len(seq), size)]
+
+
+def batch_get_items(table, keys: Sequence[Dict[str, Any]], projection: Optional[str] = None,
+                    expression_attribute_names: Optional[Dict[str, str]] = None,
+                    consistent_read: bool = False) -> List[Optional[Dict[str, Any]]]:
+    """Fetch many items by key with BatchGetItem.
+
+    Keys are deduplicated and sent 100 per request, requests run concurrently and
+    `UnprocessedKeys` are retried with jittered exponential backoff. Returns one entry
+    per requested key, in request order (None where the item does not exist). With a
+    `projection`, it must include the key attributes so results can be matched to keys.
+    """
+    if not keys:
+        return []
+    client, name = _table_client(table)
+    unique: Dict[str, Dict[str, Any]] = {}
+    for key in keys:
+        unique.setdefault(_key_id(key), key)
+    key_attrs = list(keys[0].keys())
+
+    def fetch(chunk: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        request: Dict[str, Any] = {'Keys': list(chunk), 'ConsistentRead': consistent_read}
+        if projection:
+            request['ProjectionExpression'] = projection
+        if expression_attribute_names:
+            request['ExpressionAttributeNames'] = expression_attribute_names
+        found: List[Dict[str, Any]] = []
+        pending = {name: request}
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            resp = client.batch_get_item(RequestItems=pending)
+            found.extend(resp.get('Responses', {}).get(name, []))
+            pending = resp.get('UnprocessedKeys') or {}
+            if not pending:
+                return found
+            _backoff(attempt)
+        raise RuntimeError(f'BatchGetItem on {name}: keys still unprocessed after {BATCH_MAX_RETRIES} retries')
+
+    chunks = _chunks(list(unique.values()), BATCH_GET_LIMIT)
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, len(chunks)))) as pool:
+        results = list(pool.map(fetch, chunks))
+    by_key = {}
+    for items in results:
+        for item in items:
+            by_key[_key_id({k: item.get(k) for k in key_attrs})] = item
+    return [by_key.get(_key_id(key)) for key in keys]
+
+
+def batch_write_items(table, items: Sequence[Dict[str, Any]], key_attrs: Sequence[str] = ('id',)) -> int:
+    """Put many items with BatchWriteItem. Returns the number of items written.
+
+    Items sharing the same key (`key_attrs`) are deduplicated, last one wins, because a
+    single request may not contain the same key twice. Items are sent 25 per request,
+    requests run concurrently and `UnprocessedItems` are retried with jittered backoff.
+    """
+    if not items:
+        return 0
+    client, name = _table_client(table)
+    unique: Dict[str, Dict[str, Any]] = {}
+    for item in items:
+        unique[_key_id({k: item.get(k) for k in key_attrs})] = item
+
+    def write(chunk: Sequence[Dict[str, Any]]) -> None:
+        pending = {name: [{'PutRequest': {'Item': item}} for item in chunk]}
+        for attempt in range(BATCH_MAX_RETRIES + 1):
+            resp = client.batch_write_item(RequestItems=pending)
+            pending = resp.get('UnprocessedItems') or {}
+            if not pending:
+                return
+            _backoff(attempt)
+        raise RuntimeError(f'BatchWriteItem on {name}: items still unprocessed after {BATCH_MAX_RETRIES} retries')
+
+    chunks = _chunks(list(unique.values()), BATCH_WRITE_LIMIT)
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_CONCURRENCY, len(chunks)))) as pool:
+        list(pool.map(write, chunks))
+    return len(unique)
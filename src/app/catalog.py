@@ -0,0 +1,161 @@
+"""Versioned WAF catalog: pillars, questions, best practices and validator mapping.
+
+The catalog is loaded once per process, from the bundled `catalog_data/waf-catalog.json`
+or from the `autowar-waf-questions` / `autowar-best-practices` tables
+(`AUTOWAR_CATALOG_SOURCE=dynamodb`), and compiled into read-only lookup tables and
+the scoring matrices. The worker, the scorer and the report pipeline share that
+compiled instance instead of reading question/BP metadata per result. The scoring
+matrices (and numpy) are only built when scores are first needed, so lookups used
+by the report path stay cheap to import.
+
+Validators the catalog does not map take the best practices declared by their
+`ValidatorSpec` (built-in or from a plugin pack), so out-of-tree checks count
+toward the scores without editing the catalog.
+"""
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Optional, Tuple
+from boto3.dynamodb.conditions import Attr
+
+logger = logging.getLogger('catalog')
+
+CATALOG_SOURCE = os.getenv('AUTOWAR_CATALOG_SOURCE', 'bundled')
+# catalog version to load from DynamoDB (the bundled file carries its own)
+CATALOG_VERSION = os.getenv('AUTOWAR_CATALOG_VERSION')
+CATALOG_PATH = os.getenv('AUTOWAR_CATALOG_PATH',
+                         os.path.join(os.path.dirname(__file__), 'catalog_data', 'waf-catalog.json'))
+QUESTIONS_TABLE = os.getenv('AUTOWAR_WAF_QUESTIONS_TABLE', 'autowar-waf-questions')
+BEST_PRACTICES_TABLE = os.getenv('AUTOWAR_BEST_PRACTICES_TABLE', 'autowar-best-practices')
+
+
+@dataclass(frozen=True)
+class BestPracticeInfo:
+    bp_id: str
+    question_id: str
+    pillar: str
+    weight: float
+    title: Optional[str] = None
+    severity: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class Catalog:
+    version: str
+    pillars: Mapping[str, float]
+    questions: Mapping[str, Mapping[str, Any]]
+    best_practices: Mapping[str, BestPracticeInfo]
+    validator_bps: Mapping[str, Tuple[str, ...]]
+    bp_validators: Mapping[str, Tuple[str, ...]]
+    _model: Any = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def scoring_model(self):
+        """`scoring.ScoringModel` of this catalog, built on first use."""
+        if self._model is None:
+            from .scoring import BestPractice, ScoringModel
+
+            with _lock:
+                if self._model is None:
+                    object.__setattr__(self, '_model', ScoringModel(
+                        [BestPractice(b.bp_id, b.question_id, b.pillar, b.weight) for b in self.best_practices.values()],
+                        question_weights={qid: float(q.get('weight', 1)) for qid, q in self.questions.items()},
+                        pillar_weights=self.pillars,
+                    ))
+        return self._model
+
+    def pillars_for_validator(self, validator: str) -> Tuple[str, ...]:
+        return tuple(dict.fromkeys(self.best_practices[b].pillar for b in self.validator_bps.get(validator, ())))
+
+
+def compile_catalog(raw: Mapping[str, Any]) -> Catalog:
+    """Validate a raw catalog document and build its lookup tables."""
+    pillars = {p: float((v or {}).get('weight', 1)) for p, v in (raw.get('pillars') or {}).items()}
+    questions = {}
+    for qid, q in (raw.get('questions') or {}).items():
+        if q.get('pillar') not in pillars:
+            raise RuntimeError(f"Catalog question {qid} references unknown pillar {q.get('pillar')!r}")
+        questions[qid] = MappingProxyType(dict(q))
+    best_practices = {}
+    for bp_id, bp in (raw.get('best_practices') or {}).items():
+        question = questions.get(bp.get('question'))
+        if question is None:
+            raise RuntimeError(f"Catalog best practice {bp_id} references unknown question {bp.get('question')!r}")
+        best_practices[bp_id] = BestPracticeInfo(bp_id, bp['question'], question['pillar'], float(bp.get('weight', 1)),
+                                                 bp.get('title'), bp.get('severity'))
+    validator_bps: Dict[str, Tuple[str, ...]] = {}
+    bp_validators: Dict[str, Tuple[str, ...]] = {}
+    for validator, bp_ids in (raw.get('validators') or {}).items():
+        unknown = [b for b in bp_ids if b not in best_practices]
+        if unknown:
+            raise RuntimeError(f'Catalog validator {validator} maps to unknown best practices {unknown}')
+        validator_bps[validator] = tuple(bp_ids)
+        for bp_id in bp_ids:
+            bp_validators[bp_id] = bp_validators.get(bp_id, ()) + (validator,)
+    return Catalog(
+        version=str(raw.get('version', 'unversioned')),
+        pillars=MappingProxyType(pillars),
+        questions=MappingProxyType(questions),
+        best_practices=MappingProxyType(best_practices),
+        validator_bps=MappingProxyType(validator_bps),
+        bp_validators=MappingProxyType(bp_validators),
+    )
+
+
+def _from_file(path: str) -> Dict[str, Any]:
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _from_dynamo(version: Optional[str]) -> Dict[str, Any]:
+    """Raw catalog from the question and best-practice tables (items of `version`, or
+    unversioned items when no version is configured)."""
+    from .aws_connector import parallel_scan
+
+    where = Attr('version').eq(version) if version else None
+    raw: Dict[str, Any] = {'version': version or 'dynamodb', 'pillars': {}, 'questions': {}, 'best_practices': {},
+                           'validators': {}}
+    for q in parallel_scan(QUESTIONS_TABLE, filter_expression=where):
+        qid = q.get('questionId') or q['id']
+        raw['questions'][qid] = {'pillar': q['pillar'], 'weight': q.get('weight', 1), 'title': q.get('question_text')}
+        raw['pillars'].setdefault(q['pillar'], {'weight': q.get('pillar_weight', 1)})
+    for bp in parallel_scan(BEST_PRACTICES_TABLE, filter_expression=where):
+        bp_id = bp.get('bpId') or bp['id']
+        raw['best_practices'][bp_id] = {'question': bp['questionId'], 'weight': bp.get('weight', 1),
+                                        'severity': bp.get('severity'), 'title': bp.get('description')}
+        for validator in bp.get('validators') or []:
+            raw['validators'].setdefault(validator, []).append(bp_id)
+    return raw
+
+
+def _with_validator_specs(raw: Mapping[str, Any]) -> Dict[str, Any]:
+    """`raw` plus the spec-declared mapping of validators it does not map itself."""
+    from .validators.manager import VALIDATOR_MAP
+
+    validators = dict(raw.get('validators') or {})
+    known = raw.get('best_practices') or {}
+    for spec in VALIDATOR_MAP.all_specs():
+        if spec.name in validators or not spec.best_practices:
+            continue
+        unknown = [b for b in spec.best_practices if b not in known]
+        if unknown:
+            logger.warning('Validator %s maps to best practices missing from the catalog: %s', spec.name, unknown)
+            continue
+        validators[spec.name] = list(spec.best_practices)
+    return dict(raw, validators=validators)
+
+
+_catalog: Optional[Catalog] = None
+_lock = threading.RLock()
+def load_catalog() -> Catalog:
+    """The process-wide compiled catalog (loaded on first use)."""
+    global _catalog
+    if _catalog is None:
+        with _lock:
+            if _catalog is None:
+                raw = _from_dynamo(CATALOG_VERSION) if CATALOG_SOURCE == 'dynamodb' else _from_file(CATALOG_PATH)
+                _catalog = compile_catalog(_with_validator_specs(raw))
+    return _catalog
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional, Tuple
+import boto3
+import botocore.session
+from botocore.credentials import RefreshableCredentials
+from . import credentials_manager
+from .aws_connector import get_table
+
+logger = logging.getLogger('credential_broker')
+
+# Cached sessions are refreshed in the background once less than REFRESH_AHEAD_SECONDS
+# remain, and synchronously (blocking the caller) once less than MIN_REMAINING_SECONDS remain.
+REFRESH_AHEAD_SECONDS = int(os.getenv('AUTOWAR_CREDS_REFRESH_AHEAD_SECONDS', '900'))
+MIN_REMAINING_SECONDS = int(os.getenv('AUTOWAR_CREDS_MIN_REMAINING_SECONDS', '600'))
+SESSION_DURATION_SECONDS = int(os.getenv('AUTOWAR_CREDS_SESSION_DURATION_SECONDS', '3600'))
+# Credential records are re-read after this long, so a revoked or expired record stops
+# being used within that window instead of when the warm container recycles
+RECORD_TTL_SECONDS = float(os.getenv('AUTOWAR_CREDS_RECORD_TTL_SECONDS', '60'))
+
+CREDENTIALS_TABLE = os.getenv('AUTOWAR_CREDENTIALS_TABLE', 'autowar-aws-credentials')
+
+CacheKey = Tuple[str, Optional[str], Optional[str]]
+
+
+class _Entry:
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.credentials: Optional[Dict[str, Any]] = None
+        self.identity: Optional[Dict[str, Any]] = None
+        self.refreshing = False
+
+    def remaining(self) -> float:
+        if not self.credentials:
+            return 0
+        return float(self.credentials['expiration']) - time.time()
+
+
+class CredentialScopeError(RuntimeError):
+    """A credential record that cannot be used for the requested evaluation."""
+
+
+class CredentialBroker:
+    """Caches AssumeRole credentials per (role_arn, external_id, region).
+
+    Concurrent callers for the same key share one AssumeRole call, identities are
+    taken from the AssumeRole response instead of a second `GetCallerIdentity`, and
+    credentials close to expiry are renewed on a background thread. Sessions handed
+    out use `RefreshableCredentials` backed by the cache, so long-running validators
+    never hold stale keys.
+    """
+
+    def __init__(self, assume: Optional[Callable[..., Dict[str, Any]]] = None) -> None:
+        self._assume = assume
+        self._lock = threading.Lock()
+        self._entries: Dict[CacheKey, _Entry] = {}
+        # credential_id -> (monotonic time read, record)
+        self._records: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+    def _entry(self, key: CacheKey) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            return entry
+
+    def _refresh(self, key: CacheKey, entry: _Entry) -> None:
+        role_arn, external_id, region = key
+        assume = self._assume or credentials_manager.assume_role
+        resp = assume(
+            role_arn=role_arn,
+            session_name=f"autowar-broker-{int(time.time())}",
+            external_id=external_id,
+            duration_seconds=SESSION_DURATION_SECONDS,
+            region=region,
+            validate=False,
+        )
+        entry.credentials = resp['credentials']
+        entry.identity = resp.get('caller_identity')
+
+    def _refresh_in_background(self, key: CacheKey, entry: _Entry) -> None:
+        def run() -> None:
+            try:
+                with entry.lock:
+                    if entry.remaining() < REFRESH_AHEAD_SECONDS:
+                        self._refresh(key, entry)
+            except Exception:
+                logger.exception('Background credential refresh failed for %s', key[0])
+            finally:
+                entry.refreshing = False
+
+        with self._lock:
+            if entry.refreshing:
+                return
+            entry.refreshing = True
+        threading.Thread(target=run, name='autowar-creds-refresh', daemon=True).start()
+
+    def get_credentials(self, role_arn: str, external_id: Optional[str] = None,
+                        region: Optional[str] = None) -> Dict[str, Any]:
+        """Return cached credentials (`access_key`, `secret_key`, `session_token`, `expiration`)."""
+        key = (role_arn, external_id, region)
+        entry = self._entry(key)
+        remaining = entry.remaining()
+        if remaining < MIN_REMAINING_SECONDS:
+            with entry.lock:
+                # another thread may have refreshed while we waited for the lock
+                if entry.remaining() < MIN_REMAINING_SECONDS:
+                    self._refresh(key, entry)
+        elif remaining < REFRESH_AHEAD_SECONDS:
+            self._refresh_in_background(key, entry)
+        assert entry.credentials is not None
+        return entry.credentials
+
+    def get_identity(self, role_arn: str, external_id: Optional[str] = None,
+                     region: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        self.get_credentials(role_arn, external_id, region)
+        return self._entry((role_arn, external_id, region)).identity
+
+    def get_session(self, role_arn: str, external_id: Optional[str] = None,
+                    region: Optional[str] = None) -> boto3.Session:
+        """Return a boto3 Session whose credentials are served (and renewed) by the broker."""
+        def metadata() -> Dict[str, Any]:
+            creds = self.get_credentials(role_arn, external_id, region)
+            return {
+                'access_key': creds['access_key'],
+                'secret_key': creds['secret_key'],
+                'token': creds['session_token'],
+                'expiry_time': datetime.fromtimestamp(int(creds['expiration']), tz=timezone.utc).isoformat(),
+            }
+
+        refreshable = RefreshableCredentials.create_from_metadata(
+            metadata=metadata(), refresh_using=metadata, method='sts-assume-role',
+        )
+        core = botocore.session.get_session()
+        core._credentials = refreshable
+        return boto3.Session(botocore_session=core, region_name=region)
+
+    def session_for_record(self, record: Dict[str, Any], region: Optional[str] = None,
+                           client_id: Optional[str] = None) -> boto3.Session:
+        """Session for a `type=role` record of `autowar-aws-credentials`.
+
+        Raises when the record belongs to another client than `client_id`, is no longer
+        active (revoked or past its `expiry_ts`) or is not a role record: validators must
+        never fall back to the platform's own credentials."""
+        if client_id is not None and record.get('client_id') != client_id:
+            raise CredentialScopeError(f"credential record {record.get('id')} does not belong to client {client_id}")
+        if str(record.get('status', 'active')).lower() != 'active':
+            raise CredentialScopeError(f"credential record {record.get('id')} is {record.get('status')}")
+        if credentials_manager.is_expired(record):
+            raise CredentialScopeError(f"credential record {record.get('id')} expired")
+        if not record.get('role_arn'):
+            raise CredentialScopeError(f"credential record {record.get('id')} is not a role record; "
+                                       'only AssumeRole credentials can run evaluations')
+        return self.get_session(record['role_arn'], record.get('external_id'), region or record.get('region'))
+
+    def session_for_credential(self, credential_id: str, region: Optional[str] = None,
+                               client_id: Optional[str] = None) -> boto3.Session:
+        """Session for the credential record `credential_id`; the record itself is cached
+        for RECORD_TTL_SECONDS."""
+        cached = self._records.get(credential_id)
+        if cached is None or time.monotonic() - cached[0] >= RECORD_TTL_SECONDS:
+            record = get_table(CREDENTIALS_TABLE).get_item(Key={'id': credential_id}).get('Item')
+            if not record:
+                self._records.pop(credential_id, None)
+                raise RuntimeError(f'credential record {credential_id} not found')
+            cached = self._records[credential_id] = (time.monotonic(), record)
+        return self.session_for_record(cached[1], region, client_id=client_id)
+
+    def invalidate(self, role_arn: str, external_id: Optional[str] = None, region: Optional[str] = None) -> None:
+        with self._lock:
+            self._entries.pop((role_arn, external_id, region), None)
+            self._records = {k: c for k, c in self._records.items() if c[1].get('role_arn') != role_arn}
+
+
+broker = CredentialBroker()
@@ -2,31 +2,188 @@ import os
 import uuid
 import time
 import json
+import threading
 import boto3
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timezone, timedelta
 from botocore.exceptions import ClientError
-from .aws_connector import get_table
+from boto3.dynamodb.conditions import Key
+from .aws_connector import batch_write_items, get_table, parallel_scan
 
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 SECRETS_PREFIX = os.getenv('AUTOWAR_SECRETS_PREFIX', 'autowar')
+CREDENTIALS_TABLE = os.getenv('AUTOWAR_CREDENTIALS_TABLE', 'autowar-aws-credentials')
+
+# Sparse GSIs used by the maintenance job. An item is present in an index only while it
+# carries the bucket attribute, so queries read just the records that are due.
+#   expiryIndex:   PK expiry_bucket (YYYY-MM-DD of expiry_ts),  SK expiry_ts
+#   rotationIndex: PK rotation_bucket (YYYY-MM-DD of next rotation), SK next_rotation_ts
+EXPIRY_INDEX = os.getenv('AUTOWAR_CREDENTIALS_EXPIRY_INDEX', 'expiryIndex')
+ROTATION_INDEX = os.getenv('AUTOWAR_CREDENTIALS_ROTATION_INDEX', 'rotationIndex')
+# How many past day-buckets are queried, so items missed by earlier runs are retried
+MAINTENANCE_LOOKBACK_DAYS = int(os.getenv('AUTOWAR_MAINTENANCE_LOOKBACK_DAYS', '7'))
 
 
 def _now_ts() -> int:
     return int(datetime.now(timezone.utc).timestamp())
 
+
+def day_bucket(ts: int) -> str:
+    return datetime.fromtimestamp(int(ts), tz=timezone.utc).strftime('%Y-%m-%d')
+
+
+def due_bucket(due_ts: int, now: Optional[int] = None) -> str:
+    """Day bucket of a due date; overdue items go to today's bucket, so the
+    maintenance query (today plus the lookback days) still reaches them."""
+    return day_bucket(max(int(due_ts), now or _now_ts()))
+
+
+def lifecycle_index_attrs(expiry_ts: Optional[int] = None, last_rotated_ts: Optional[int] = None,
+                          rotation_interval_days: Optional[int] = None, now: Optional[int] = None) -> Dict[str, Any]:
+    """Attributes that place a credential record in the expiry/rotation sparse indexes.
+
+    Only attributes with a value are returned: GSI key attributes must be absent (not
+    null) for the item to stay out of the index.
+    """
+    now = now or _now_ts()
+    attrs: Dict[str, Any] = {}
+    if expiry_ts:
+        attrs['expiry_bucket'] = due_bucket(int(expiry_ts), now)
+    if rotation_interval_days:
+        next_rotation = int(last_rotated_ts or 0) + int(rotation_interval_days) * 24 * 3600
+        attrs['next_rotation_ts'] = next_rotation
+        attrs['rotation_bucket'] = due_bucket(next_rotation, now)
+    return attrs
+
+
+def retry_tomorrow_update(now: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    """UpdateExpression/values flagging a failed rotation for manual attention and
+    moving the item to tomorrow's rotation bucket, so it is retried instead of
+    ageing out of the lookback window."""
+    now = now or _now_ts()
+    return 'SET rotation_due = :r, rotation_bucket = :b', {':r': now, ':b': day_bucket(now + 24 * 3600)}
+
+
+def _set_clause(attrs: Dict[str, Any], values: Dict[str, Any]) -> str:
+    # ', a = :a, b = :b' for an UpdateExpression SET clause; fills `values`
+    clause = ''
+    for k, v in attrs.items():
+        clause += f', {k} = :{k}'
+        values[f':{k}'] = v
+    return clause
+
+
+def _query_all(table, **kwargs: Any):
+    """Yield every item of a Query, following LastEvaluatedKey."""
+    while True:
+        resp = table.query(**kwargs)
+        yield from resp.get('Items', [])
+        last = resp.get('LastEvaluatedKey')
+        if not last:
+            return
+        kwargs['ExclusiveStartKey'] = last
+
+
+def due_credential_items(table, now: Optional[int] = None, lookback_days: Optional[int] = None):
+    """Yield credential records that are expired or due for rotation, each at most once.
+
+    Queries the sparse expiry/rotation indexes for today's bucket and the previous
+    `lookback_days` buckets (items not handled by earlier runs stay in their bucket).
+    """
+    now = now or _now_ts()
+    days = MAINTENANCE_LOOKBACK_DAYS if lookback_days is None else lookback_days
+    seen = set()
+    for index, bucket_attr, ts_attr in ((EXPIRY_INDEX, 'expiry_bucket', 'expiry_ts'),
+                                        (ROTATION_INDEX, 'rotation_bucket', 'next_rotation_ts')):
+        for offset in range(days, -1, -1):
+            bucket = day_bucket(now - offset * 24 * 3600)
+            for item in _query_all(
+                table,
+                IndexName=index,
+                KeyConditionExpression=Key(bucket_attr).eq(bucket) & Key(ts_attr).lte(now),
+            ):
+                if item['id'] in seen:
+                    continue
+                seen.add(item['id'])
+                yield item
+
+# Force the regional STS endpoint (sts.<region>.amazonaws.com) instead of the global one
+STS_REGIONAL_ENDPOINTS = os.getenv('AUTOWAR_STS_REGIONAL_ENDPOINTS', '').lower() in ('1', 'true', 'yes', 'regional')
+
+_clients: Dict[Tuple[str, Optional[str]], Any] = {}
+_clients_lock = threading.Lock()
+_sts_session = None
+
+
+def _get_sts_session():
+    global _sts_session
+    if _sts_session is None:
+        _sts_session = boto3.Session()
+        _sts_session._session.set_config_variable('sts_regional_endpoints', 'regional')
+    return _sts_session
+
+
+def _client(service: str, region_name: Optional[str] = None):
+    """Return a process-wide client for `service` in `region_name` (None for global services like IAM).
+
+    boto3 clients are thread-safe, so one instance per (service, region) is reused across
+    requests instead of paying client construction on every call.
+    """
+    key = (service, region_name)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                factory = _get_sts_session() if service == 'sts' and STS_REGIONAL_ENDPOINTS else boto3
+                kwargs = {'region_name': region_name} if region_name else {}
+                client = _clients[key] = factory.client(service, **kwargs)
+    return client
+
+
+def reset_clients() -> None:
+    """Drop cached clients (tests, or after changing credentials/config at runtime)."""
+    global _sts_session
+    with _clients_lock:
+        _clients.clear()
+        _sts_session = None
+
+
 def _sts_client(region_name: Optional[str] = None, aws_access_key_id: Optional[str] = None,
                 aws_secret_access_key: Optional[str] = None, aws_session_token: Optional[str] = None):
-    return boto3.client(
+    region_name = region_name or AWS_REGION
+    if not aws_access_key_id:
+        return _client('sts', region_name)
+    # Caller-supplied key pairs get their own client that is never cached, so the keys
+    # are discarded with it once the call returns.
+    factory = _get_sts_session() if STS_REGIONAL_ENDPOINTS else boto3
+    return factory.client(
         'sts',
-        region_name=region_name or AWS_REGION,
+        region_name=region_name,
         aws_access_key_id=aws_access_key_id,
         aws_secret_access_key=aws_secret_access_key,
         aws_session_token=aws_session_token,
     )
 
+def _identity_from_assumed_role(resp: Dict[str, Any]) -> Dict[str, Any]:
+    # AssumeRole already tells us who we are; build the GetCallerIdentity shape from it
+    user = resp.get('AssumedRoleUser', {})
+    arn = user.get('Arn', '')
+    parts = arn.split(':')
+    return {
+        'UserId': user.get('AssumedRoleId'),
+        'Account': parts[4] if len(parts) > 4 else None,
+        'Arn': arn,
+    }
+
 def assume_role(role_arn: str, session_name: str, external_id: Optional[str] = None,
-                duration_seconds: int = 3600, region: Optional[str] = None) -> Dict[str, Any]:
+                duration_seconds: int = 3600, region: Optional[str] = None,
+                validate: bool = True) -> Dict[str, Any]:
+    """Assume `role_arn` and return the temporary credentials plus the caller identity.
+
+    With `validate=False` the extra `GetCallerIdentity` round trip is skipped and the
+    identity is taken from the `AssumedRoleUser` of the AssumeRole response.
+    """
     sts = _sts_client(region_name=region)
     params = {
         'RoleArn': role_arn,
@@ -37,16 +194,10 @@ def assume_role(role_arn: str, session_name: str, external_id: Optional[str] = N
         params['ExternalId'] = external_id
     resp = sts.assume_role(**params)
     creds = resp['Credentials']
-    # validate
-    identity = None
-    try:
-        temp_sts = _sts_client(region_name=region,
-                               aws_access_key_id=creds['AccessKeyId'],
-                               aws_secret_access_key=creds['SecretAccessKey'],
-                               aws_session_token=creds['SessionToken'])
-        identity = temp_sts.get_caller_identity()
-    except ClientError as e:
-        raise
+    if not validate:
+        identity = _identity_from_assumed_role(resp)
+    else:
+        identity = _validate_assumed(creds, region)
     return {
         'credentials': {
             'access_key': creds['AccessKeyId'],
@@ -57,9 +208,16 @@ def assume_role(role_arn: str, session_name: str, external_id: Optional[str] = N
         'caller_identity': identity,
     }
 
+def _validate_assumed(creds: Dict[str, Any], region: Optional[str] = None) -> Dict[str, Any]:
+    temp_sts = _sts_client(region_name=region,
+                           aws_access_key_id=creds['AccessKeyId'],
+                           aws_secret_access_key=creds['SecretAccessKey'],
+                           aws_session_token=creds['SessionToken'])
+    return temp_sts.get_caller_identity()
+
 def store_secret_for_keys(client_id: str, access_key: str, secret_key: str, session_token: Optional[str] = None,
                           region: Optional[str] = None) -> str:
-    sm = boto3.client('secretsmanager', region_name=region or AWS_REGION)
+    sm = _client('secretsmanager', region or AWS_REGION)
     cred_id = str(uuid.uuid4())
     secret_name = f"{SECRETS_PREFIX}/{client_id}/{cred_id}"
     secret_value = {
@@ -80,13 +238,18 @@ def store_secret_for_keys(client_id: str, access_key: str, secret_key: str, sess
             return desc['ARN']
         raise
 
+
+def delete_secret(secret_arn: str, region: Optional[str] = None) -> None:
+    """Delete a secret created by `store_secret_for_keys` (e.g. its record could not be registered)."""
+    sm = _client('secretsmanager', region or AWS_REGION)
+    sm.delete_secret(SecretId=secret_arn, ForceDeleteWithoutRecovery=True)
+
 def validate_keys(access_key: str, secret_key: str, session_token: Optional[str] = None, region: Optional[str] = None) -> Dict[str, Any]:
     sts = _sts_client(region_name=region, aws_access_key_id=access_key,
                       aws_secret_access_key=secret_key, aws_session_token=session_token)
     return sts.get_caller_identity()
 
-def register_credential_record(client_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
-    table = get_table('autowar-aws-credentials')
+def _credential_item(client_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
     item_id = str(uuid.uuid4())
     # Attach lifecycle metadata fields if not present
     now_ts = _now_ts()
@@ -101,10 +264,24 @@ def register_credential_record(client_id: str, record: Dict[str, Any]) -> Dict[s
         'last_rotated_ts': record.get('last_rotated_ts', now_ts),
         **record,
     }
+    item.update(lifecycle_index_attrs(item.get('expiry_ts'), item.get('last_rotated_ts'), item.get('rotation_interval_days')))
+    return item
+
+
+def register_credential_record(client_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    table = get_table(CREDENTIALS_TABLE)
+    item = _credential_item(client_id, record)
     table.put_item(Item=item)
     return item
 
 
+def register_credential_records(records: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Register several `(client_id, record)` pairs with BatchWriteItem (25 items per request)."""
+    items = [_credential_item(client_id, record) for client_id, record in records]
+    batch_write_items(get_table(CREDENTIALS_TABLE), items)
+    return items
+
+
 def is_expired(item: Dict[str, Any]) -> bool:
     expiry = item.get('expiry_ts')
     if not expiry:
@@ -124,24 +301,57 @@ def needs_rotation(item: Dict[str, Any]) -> bool:
 
 
 def mark_expired(item_id: str) -> None:
-    table = get_table('autowar-aws-credentials')
+    table = get_table(CREDENTIALS_TABLE)
     table.update_item(
         Key={'id': item_id},
-        UpdateExpression='SET #s = :s, deleted_at = :d',
+        # leaving the sparse indexes: nothing left to maintain
+        UpdateExpression='SET #s = :s, deleted_at = :d REMOVE expiry_bucket, rotation_bucket',
         ExpressionAttributeNames={'#s': 'status'},
         ExpressionAttributeValues={':s': 'expired', ':d': _now_ts()},
     )
 
 
-def mark_rotation_done(item_id: str) -> None:
-    table = get_table('autowar-aws-credentials')
+def rotation_done_update(rotation_interval_days: Optional[int] = None,
+                         expiry_ts: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    """UpdateExpression/values recording a rotation now and scheduling the next one in `rotationIndex`.
+
+    A new `expiry_ts` (refreshed AssumeRole credentials) moves the item to its new expiry bucket.
+    """
+    now = _now_ts()
+    values: Dict[str, Any] = {':t': now}
+    attrs = lifecycle_index_attrs(expiry_ts, now, rotation_interval_days)
+    if expiry_ts:
+        attrs['expiry_ts'] = int(expiry_ts)
+    expr = 'SET last_rotated_ts = :t' + _set_clause(attrs, values)
+    return expr + ' REMOVE rotation_due', values
+
+
+def mark_rotation_done(item_id: str, rotation_interval_days: Optional[int] = None) -> None:
+    table = get_table(CREDENTIALS_TABLE)
+    expr, values = rotation_done_update(rotation_interval_days)
     table.update_item(
         Key={'id': item_id},
-        UpdateExpression='SET last_rotated_ts = :t REMOVE rotation_due',
-        ExpressionAttributeValues={':t': _now_ts()},
+        UpdateExpression=expr,
+        ExpressionAttributeValues=values,
     )
 
 
+def backfill_lifecycle_indexes(table) -> int:
+    """Add the sparse-index attributes to records created before the indexes existed. Returns items updated."""
+    updated = 0
+    for item in parallel_scan(table):
+        if str(item.get('status', '')).lower() == 'expired':
+            continue
+        attrs = lifecycle_index_attrs(item.get('expiry_ts'), item.get('last_rotated_ts'), item.get('rotation_interval_days'))
+        if not attrs or all(item.get(k) == v for k, v in attrs.items()):
+            continue
+        values: Dict[str, Any] = {}
+        table.update_item(Key={'id': item['id']}, UpdateExpression='SET' + _set_clause(attrs, values)[1:],
+                          ExpressionAttributeValues=values)
+        updated += 1
+    return updated
+
+
 def rotate_secret_placeholder(item: Dict[str, Any]) -> Dict[str, Any]:
     """
     Placeholder rotation implementation: real rotation depends on credential type.
@@ -153,13 +363,14 @@ def rotate_secret_placeholder(item: Dict[str, Any]) -> Dict[str, Any]:
     secret_arn = item.get('secret_arn')
     if secret_arn:
         try:
-            return rotate_static_secret(secret_arn, item.get('id'))
+            return rotate_static_secret(secret_arn, item.get('id'), item.get('rotation_interval_days'))
         except Exception as e:
             return {'rotated': False, 'reason': str(e)}
     return {'rotated': False, 'reason': 'no_secret_arn'}
 
 
-def rotate_static_secret(secret_arn: str, item_id: Optional[str] = None) -> Dict[str, Any]:
+def rotate_static_secret(secret_arn: str, item_id: Optional[str] = None,
+                         rotation_interval_days: Optional[int] = None) -> Dict[str, Any]:
     """
     Rotate a Secrets Manager secret that contains credentials for an IAM user when possible.
     Expected secret JSON structure: {"iam_user": "username", "access_key_id": "...", "secret_access_key": "..."}
@@ -172,8 +383,8 @@ def rotate_static_secret(secret_arn: str, item_id: Optional[str] = None) -> Dict
 
     Returns a dict describing the result.
     """
-    sm = boto3.client('secretsmanager', region_name=AWS_REGION)
-    iam = boto3.client('iam')
+    sm = _client('secretsmanager', AWS_REGION)
+    iam = _client('iam')
 
     # Fetch secret
     try:
@@ -200,11 +411,12 @@ def rotate_static_secret(secret_arn: str, item_id: Optional[str] = None) -> Dict
 
     # Update DynamoDB metadata if item_id provided
     if item_id:
-        table = get_table('autowar-aws-credentials')
+        table = get_table(CREDENTIALS_TABLE)
+        expr, values = rotation_done_update(rotation_interval_days)
         table.update_item(
             Key={'id': item_id},
-            UpdateExpression='SET last_rotated_ts = :t REMOVE rotation_due',
-            ExpressionAttributeValues={':t': _now_ts()},
+            UpdateExpression=expr,
+            ExpressionAttributeValues=values,
         )
 
     # Optionally delete old access keys to avoid accumulation (best-effort)
@@ -243,14 +455,8 @@ def refresh_assume_role_item(item: Dict[str, Any]) -> Dict[str, Any]:
     creds = resp.get('credentials', {})
     expires = creds.get('expiration')
 
-    table = get_table('autowar-aws-credentials')
-    update_values: Dict[str, Any] = {
-        ':t': _now_ts(),
-    }
-    update_expr = 'SET last_rotated_ts = :t'
-    if expires:
-        update_expr += ', expiry_ts = :e'
-        update_values[':e'] = int(expires) if isinstance(expires, int) else (int(expires) if isinstance(expires, int) else expires)
+    table = get_table(CREDENTIALS_TABLE)
+    update_expr, update_values = rotation_done_update(item.get('rotation_interval_days'), expires)
 
     table.update_item(
         Key={'id': item['id']},
@@ -0,0 +1,168 @@
+"""Consumed-capacity and latency metrics for DynamoDB calls.
+
+`instrument_resource`/`instrument_client` hook the botocore event system of a
+DynamoDB client, so every Table call made through it asks for
+`ReturnConsumedCapacity=INDEXES` and is recorded per table, index and operation.
+`metrics.flush()` writes the aggregated samples to stdout as CloudWatch Embedded
+Metric Format (EMF) lines, which CloudWatch Logs turns into metrics.
+"""
+import os
+import sys
+import json
+import time
+import functools
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+ENABLED = os.getenv('AUTOWAR_DYNAMO_METRICS', '1') != '0'
+NAMESPACE = os.getenv('AUTOWAR_METRICS_NAMESPACE', 'AutoWAR/DynamoDB')
+# EMF accepts at most 100 values per metric in one document
+MAX_VALUES = 100
+TABLE_DIMENSION = 'table'
+
+READ_OPERATIONS = {'GetItem', 'Query', 'Scan', 'BatchGetItem', 'TransactGetItems'}
+_UNITS = {'Latency': 'Milliseconds', 'ConsumedRCU': 'Count', 'ConsumedWCU': 'Count'}
+
+
+class DynamoMetrics:
+    """Thread-safe aggregator of samples keyed by (table, index, operation)."""
+
+    def __init__(self, namespace: str = NAMESPACE, stream=None) -> None:
+        self.namespace = namespace
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._samples: Dict[Tuple[str, str, str], Dict[str, List[float]]] = {}
+
+    def record(self, table: str, operation: str, index: Optional[str] = None, latency_ms: Optional[float] = None,
+               rcu: float = 0.0, wcu: float = 0.0) -> None:
+        key = (table, index or TABLE_DIMENSION, operation)
+        full = None
+        with self._lock:
+            values = self._samples.setdefault(key, {'Latency': [], 'ConsumedRCU': [], 'ConsumedWCU': []})
+            if latency_ms is not None:
+                values['Latency'].append(round(latency_ms, 3))
+            if rcu:
+                values['ConsumedRCU'].append(float(rcu))
+            if wcu:
+                values['ConsumedWCU'].append(float(wcu))
+            if any(len(v) >= MAX_VALUES for v in values.values()):
+                full = {key: self._samples.pop(key)}
+        if full:
+            self._emit(full)
+
+    def flush(self) -> None:
+        with self._lock:
+            samples, self._samples = self._samples, {}
+        self._emit(samples)
+
+    def _emit(self, samples: Dict[Tuple[str, str, str], Dict[str, List[float]]]) -> None:
+        stream = self.stream or sys.stdout
+        timestamp = int(time.time() * 1000)
+        for (table, index, operation), values in samples.items():
+            names = [name for name, v in values.items() if v]
+            if not names:
+                continue
+            doc: Dict[str, Any] = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': self.namespace,
+                        'Dimensions': [['TableName', 'IndexName', 'Operation']],
+                        'Metrics': [{'Name': name, 'Unit': _UNITS[name]} for name in names],
+                    }],
+                },
+                'TableName': table,
+                'IndexName': index,
+                'Operation': operation,
+            }
+            for name in names:
+                doc[name] = values[name]
+            stream.write(json.dumps(doc) + '\n')
+        stream.flush()
+
+
+metrics = DynamoMetrics()
+
+
+def _capacity_entries(parsed: Dict[str, Any]) -> List[Dict[str, Any]]:
+    consumed = parsed.get('ConsumedCapacity')
+    if not consumed:
+        return []
+    return consumed if isinstance(consumed, list) else [consumed]
+
+
+def _units(capacity: Dict[str, Any], read: bool) -> float:
+    specific = capacity.get('ReadCapacityUnits' if read else 'WriteCapacityUnits')
+    return float(specific if specific is not None else capacity.get('CapacityUnits', 0))
+
+
+def record_response(operation: str, params: Dict[str, Any], parsed: Dict[str, Any], latency_ms: Optional[float],
+                    sink: Optional[DynamoMetrics] = None) -> None:
+    """Record one DynamoDB response: latency against the addressed table/index and
+    consumed capacity split between the base table and each index it touched."""
+    sink = sink or metrics
+    read = operation in READ_OPERATIONS
+    if 'TableName' in params:
+        tables = [params['TableName']]
+    else:
+        tables = list(params.get('RequestItems') or [])
+    for table in tables:
+        sink.record(table, operation, params.get('IndexName'), latency_ms=latency_ms)
+    for capacity in _capacity_entries(parsed):
+        table = capacity.get('TableName', tables[0] if tables else '-')
+        parts = [(None, capacity['Table'])] if capacity.get('Table') else []
+        for kind in ('GlobalSecondaryIndexes', 'LocalSecondaryIndexes'):
+            parts.extend((capacity[kind] or {}).items() if capacity.get(kind) else [])
+        if not parts:
+            # TOTAL mode, or an operation that reports no breakdown
+            parts = [(params.get('IndexName'), capacity)]
+        for index, part in parts:
+            units = _units(part, read)
+            sink.record(table, operation, index, rcu=units if read else 0.0, wcu=0.0 if read else units)
+
+
+def _before(params, model, context, **kwargs):
+    if 'ReturnConsumedCapacity' in model.input_shape.members:
+        params.setdefault('ReturnConsumedCapacity', 'INDEXES')
+    context['autowar_started'] = time.perf_counter()
+    context['autowar_params'] = params
+
+
+def _after(http_response, parsed, model, context, **kwargs):
+    started = context.get('autowar_started')
+    latency_ms = (time.perf_counter() - started) * 1000 if started is not None else None
+    try:
+        record_response(model.name, context.get('autowar_params') or {}, parsed or {}, latency_ms)
+    except Exception:
+        # metrics must never break a data call
+        pass
+
+
+def instrument_client(client):
+    """Register the metric hooks on a DynamoDB client (idempotent)."""
+    if not ENABLED or getattr(client, '_autowar_instrumented', False):
+        return client
+    events = client.meta.events
+    # before-parameter-build sees the params actually sent: the resource layer's
+    # provide-client-params handler replaces them with a copy
+    events.register('before-parameter-build.dynamodb', _before, unique_id='autowar-metrics-before')
+    events.register('after-call.dynamodb', _after, unique_id='autowar-metrics-after')
+    client._autowar_instrumented = True
+    return client
+
+
+def instrument_resource(resource):
+    """Instrument the client behind a DynamoDB service resource and return the resource."""
+    instrument_client(resource.meta.client)
+    return resource
+
+
+def flush_metrics(handler):
+    """Decorator for Lambda handlers: emit the collected metrics when the invocation ends."""
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        try:
+            return handler(event, context)
+        finally:
+            metrics.flush()
+    return wrapper
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from boto3.dynamodb.types import TypeDeserializer
+
+# Statuses after which no more events are expected for an evaluation
+TERMINAL_STATUSES = ('COMPLETED', 'FAILED')
+HEARTBEAT_SECONDS = 15.0
+# a stream ends after this long; EventSource clients reconnect and get the current state
+MAX_STREAM_SECONDS = float(os.getenv('AUTOWAR_SSE_MAX_SECONDS', '900'))
+
+_deserializer = TypeDeserializer()
+
+
+class EvaluationEventBroker:
+    """In-process pub/sub for evaluation progress events.
+
+    Publishers may run on any thread (sync FastAPI endpoints run in a threadpool,
+    stream pollers run in their own thread); each subscriber owns an asyncio queue
+    bound to its event loop and events are handed over with `call_soon_threadsafe`.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]]] = {}
+
+    def subscribe(self, evaluation_id: str) -> asyncio.Queue:
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        with self._lock:
+            self._subscribers.setdefault(evaluation_id, []).append((loop, queue))
+        return queue
+
+    def unsubscribe(self, evaluation_id: str, queue: asyncio.Queue) -> None:
+        with self._lock:
+            subs = self._subscribers.get(evaluation_id, [])
+            self._subscribers[evaluation_id] = [s for s in subs if s[1] is not queue]
+            if not self._subscribers[evaluation_id]:
+                del self._subscribers[evaluation_id]
+
+    def publish(self, evaluation_id: str, event: Dict[str, Any]) -> int:
+        """Deliver `event` to every subscriber of `evaluation_id`. Returns the subscriber count."""
+        with self._lock:
+            subs = list(self._subscribers.get(evaluation_id, []))
+        for loop, queue in subs:
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, event)
+            except RuntimeError:
+                # subscriber loop already closed
+                self.unsubscribe(evaluation_id, queue)
+        return len(subs)
+
+
+broker = EvaluationEventBroker()
+
+
+def status_event(evaluation_id: str, status: str) -> Dict[str, Any]:
+    return {'event': 'status', 'data': {'evaluationId': evaluation_id, 'status': status, 'ts': int(time.time())}}
+
+
+def result_event(evaluation_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+    return {'event': 'result', 'data': {'evaluationId': evaluation_id, 'result': result}}
+
+
+def publish_status(evaluation_id: str, status: str) -> None:
+    broker.publish(evaluation_id, status_event(evaluation_id, status))
+
+
+def publish_result(evaluation_id: str, result: Dict[str, Any]) -> None:
+    broker.publish(evaluation_id, result_event(evaluation_id, result))
+
+
+def _deserialize_image(image: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not image:
+        return {}
+    return {k: _deserializer.deserialize(v) for k, v in image.items()}
+
+
+def events_from_stream_record(record: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Translate one DynamoDB Streams record of `autowar-evaluations` into progress events.
+
+    Requires the stream view type NEW_AND_OLD_IMAGES: a status change produces a
+    `status` event and every entry appended to `results` produces a `result` event.
+    """
+    ddb = record.get('dynamodb', {})
+    new = _deserialize_image(ddb.get('NewImage'))
+    old = _deserialize_image(ddb.get('OldImage'))
+    evaluation_id = new.get('evaluationId') or new.get('id')
+    if not evaluation_id:
+        return []
+    events = []
+    new_results = new.get('results') or []
+    old_results = old.get('results') or []
+    for r in new_results[len(old_results):]:
+        events.append(result_event(evaluation_id, r))
+    if new.get('status') and new.get('status') != old.get('status'):
+        events.append(status_event(evaluation_id, new['status']))
+    return events
+
+
+def handle_stream_records(records: List[Dict[str, Any]]) -> int:
+    """Publish the events contained in a batch of DynamoDB Streams records. Returns events published."""
+    published = 0
+    for record in records:
+        if record.get('eventName') not in ('INSERT', 'MODIFY'):
+            continue
+        for event in events_from_stream_record(record):
+            broker.publish(event['data']['evaluationId'], event)
+            published += 1
+    return published
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+async def stream_evaluation_events(evaluation: Dict[str, Any], heartbeat: float = HEARTBEAT_SECONDS,
+                                   reload: Optional[Callable[[], Optional[Dict[str, Any]]]] = None,
+                                   max_seconds: float = MAX_STREAM_SECONDS) -> AsyncIterator[str]:
+    """Yield SSE frames for an evaluation until it reaches a terminal status.
+
+    The current state is sent first (status plus results already stored), so a
+    client connecting mid-run does not miss earlier progress. Events published in
+    this process arrive through the broker; when a heartbeat passes without one,
+    `reload` (a fresh read of the evaluation) catches progress made elsewhere,
+    e.g. by the worker Lambda. The stream ends after `max_seconds` regardless.
+    """
+    evaluation_id = evaluation.get('evaluationId') or evaluation['id']
+    queue = broker.subscribe(evaluation_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    try:
+        status = evaluation.get('status', 'PENDING')
+        yield format_sse(status_event(evaluation_id, status))
+        sent_results = 0
+        for r in evaluation.get('results') or []:
+            yield format_sse(result_event(evaluation_id, r))
+            sent_results += 1
+        while status not in TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=min(heartbeat, remaining))
+            except asyncio.TimeoutError:
+                current = await loop.run_in_executor(None, reload) if reload else None
+                if current:
+                    for r in (current.get('results') or [])[sent_results:]:
+                        yield format_sse(result_event(evaluation_id, r))
+                        sent_results += 1
+                    if current.get('status') and current['status'] != status:
+                        status = current['status']
+                        yield format_sse(status_event(evaluation_id, status))
+                        continue
+                # comment frame keeps proxies from closing an idle connection
+                yield ': keep-alive\n\n'
+                continue
+            yield format_sse(event)
+            if event['event'] == 'status':
+                status = event['data']['status']
+            else:
+                sent_results += 1
+    finally:
+        broker.unsubscribe(evaluation_id, queue)
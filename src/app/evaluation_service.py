@@ -1,10 +1,16 @@
+import json
 import time
 import uuid
 from typing import List, Optional
-from boto3.dynamodb.conditions import Key
-from .aws_connector import get_table
+from .repository import EvaluationRepository
 from .models import EvaluationIn
-from .validators import run_validators_for_evaluation
+from .incremental import evaluate, find_baseline
+from .inventory import discover_targets
+from .catalog import load_catalog
+from .scoring import bp_scores_from_results, score_evaluations, state_to_dynamo
+from .score_updates import record_result
+from .evaluation_events import publish_result, publish_status
+from .credential_broker import broker
 import boto3
 import os
 
@@ -29,43 +35,63 @@ def create_evaluation(data: EvaluationIn) -> dict:
         'created_at': ts,
         'status': 'PENDING',
     })
-    table = get_table(TABLE_NAME)
-    table.put_item(Item=item)
+    repo = EvaluationRepository(TABLE_NAME)
+    item = repo.put(item)
     # Enqueue evaluation for asynchronous processing if queue URL configured
-    try:
-        if SQS_QUEUE_URL:
+    if SQS_QUEUE_URL:
+        try:
             sqs = _get_sqs()
             payload = {'evaluationId': evaluation_id, 'item': item}
             sqs.send_message(QueueUrl=SQS_QUEUE_URL, MessageBody=json.dumps(payload))
-        else:
-            # fallback to synchronous validators if no queue configured
-            targets = item.get('targets')
-            results = run_validators_for_evaluation(targets or [], region=item.get('region'), account_id=item.get('account_id'))
-            if results:
-                item['results'] = results
-                item['status'] = 'COMPLETED'
-                table.put_item(Item=item)
-    except Exception:
-        # leave as PENDING if enqueue or validators fail
-        pass
+        except Exception:
+            # leave as PENDING if enqueue fails
+            pass
+        return item
+    # fallback to synchronous validators if no queue configured
+    try:
+        publish_status(evaluation_id, 'RUNNING')
+        session = broker.session_for_credential(item['credential_id'], item.get('region'), client_id=item.get('client_id')) \
+            if item.get('credential_id') else None
+        if item.get('discover_targets') and not item.get('targets'):
+            item['targets'], _ = discover_targets(item['client_id'], item.get('account_id'), session=session,
+                                                  region=item.get('region'))
+        previous = find_baseline(repo, item) if item.get('incremental') else None
+        results, _ = evaluate(item, previous, session=session, on_result=lambda r: publish_result(evaluation_id, r))
+    except Exception as e:
+        item.update({'status': 'FAILED', 'error': str(e), 'end_ts': int(time.time())})
+        repo.put(item)
+        publish_status(evaluation_id, 'FAILED')
+        return item
+    if results:
+        item['results'] = results
+        item['status'] = 'COMPLETED'
+        item['end_ts'] = int(time.time())
+        catalog = load_catalog()
+        item.update(state_to_dynamo(catalog.scoring_model.build_state(bp_scores_from_results(results, catalog.validator_bps),
+                                                                      version=1)))
+        item['catalog_version'] = catalog.version
+        repo.put(item)
+        publish_status(evaluation_id, 'COMPLETED')
     return item
 
+def _with_scores(items: List[dict]) -> List[dict]:
+    # stored scores are kept current by delta updates (score_updates); only items
+    # scored before that existed, or against another catalog version, are recomputed
+    # (one batch of matrix products)
+    version = load_catalog().version
+    scored = [i for i in items if i.get('results')
+              and (i.get('score_version') is None or i.get('catalog_version') != version)]
+    for item, scores in zip(scored, score_evaluations(scored)):
+        item.update(scores)
+    return items
+
 def get_evaluation(evaluation_id: str) -> Optional[dict]:
-    table = get_table(TABLE_NAME)
-    resp = table.get_item(Key={'id': evaluation_id})
-    return resp.get('Item')
+    item = EvaluationRepository(TABLE_NAME).get(evaluation_id)
+    return _with_scores([item])[0] if item else item
 
 def list_evaluations_for_client(client_id: str, limit: int = 50) -> List[dict]:
-    table = get_table(TABLE_NAME)
-    try:
-        resp = table.query(
-            IndexName='clientIndex',
-            KeyConditionExpression=Key('client_id').eq(client_id),
-            Limit=limit,
-            ScanIndexForward=False,
-        )
-        return resp.get('Items', [])
-    except Exception:
-        # fallback to scan (less efficient) if index not present
-        resp = table.scan(FilterExpression=Key('client_id').eq(client_id), Limit=limit)
-        return resp.get('Items', [])
+    return _with_scores(EvaluationRepository(TABLE_NAME).for_client(client_id, limit=limit))
+
+def record_evaluation_result(evaluation_id: str, result: dict) -> dict:
+    """Store a re-run validator result and update only the scores it affects."""
+    return record_result(EvaluationRepository(TABLE_NAME), evaluation_id, result)
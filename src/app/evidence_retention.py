@@ -0,0 +1,155 @@
+"""Evidence retention per client plan and archival to S3.
+
+Evidence rows (and the detail blobs they reference) get a DynamoDB `ttl` derived
+from the client's plan, so `autowar-evidence-technical` only keeps recent evidence.
+Before rows expire, the evidence of each evaluation is exported to one gzip JSON
+Lines object in S3; `load_evidence` reads the hot rows and falls back to the
+archive (optionally re-hydrating the table) for historical regeneration.
+"""
+import os
+import gzip
+import json
+import time
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+import boto3
+from botocore.exceptions import ClientError
+from .repository import ClientRepository, EvaluationRepository
+from .evidence_store import EvidenceStore
+
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+ARCHIVE_BUCKET = os.getenv('AUTOWAR_EVIDENCE_ARCHIVE_BUCKET') or os.getenv('AUTOWAR_EVIDENCE_BUCKET')
+DEFAULT_PLAN = os.getenv('AUTOWAR_DEFAULT_PLAN', 'standard')
+# days evidence stays in the hot table, per client plan (0 = never expires)
+PLAN_RETENTION_DAYS: Dict[str, int] = {'basic': 30, 'standard': 90, 'premium': 365}
+PLAN_RETENTION_DAYS.update(json.loads(os.getenv('AUTOWAR_PLAN_RETENTION_DAYS', '{}')))
+# rows restored from the archive stay hot for this long
+RESTORE_TTL_DAYS = int(os.getenv('AUTOWAR_RESTORE_TTL_DAYS', '7'))
+PLAN_CACHE_SECONDS = 300
+
+_s3 = None
+def _get_s3():
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client('s3', region_name=AWS_REGION)
+    return _s3
+
+
+def retention_days(plan: Optional[str]) -> int:
+    return PLAN_RETENTION_DAYS.get(plan or DEFAULT_PLAN, PLAN_RETENTION_DAYS.get(DEFAULT_PLAN, 90))
+
+
+def ttl_for(plan: Optional[str], ts: int) -> Optional[int]:
+    days = retention_days(plan)
+    return ts + days * 24 * 3600 if days else None
+
+
+def archive_key(client_id: Optional[str], evaluation_id: str) -> str:
+    return f"evidence/archive/{client_id or '_'}/{evaluation_id}.jsonl.gz"
+
+
+def _archive_line(client_id: Optional[str], evaluation_id: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'client_id': client_id,
+        'evaluation_id': evaluation_id,
+        'validator': row.get('validator', row.get('name')),
+        'resource': row.get('resource'),
+        'status': row.get('status'),
+        'details': row.get('details'),
+        'captured_at': row.get('captured_at'),
+    }
+
+
+class PlanResolver:
+    """Client plan lookups with a short in-process cache (plans rarely change)."""
+
+    def __init__(self, clients: Optional[ClientRepository] = None) -> None:
+        self._clients = clients
+        self._cache: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def plan(self, client_id: Optional[str]) -> Optional[str]:
+        if not client_id:
+            return None
+        now = time.time()
+        with self._lock:
+            hit = self._cache.get(client_id)
+            if hit and hit[1] > now:
+                return hit[0]
+        try:
+            clients = self._clients or ClientRepository()
+            plan = (clients.get(client_id) or {}).get('plan')
+        except Exception:
+            plan = None
+        with self._lock:
+            self._cache[client_id] = (plan, now + PLAN_CACHE_SECONDS)
+        return plan
+
+    def ttl(self, client_id: Optional[str], ts: int) -> Optional[int]:
+        return ttl_for(self.plan(client_id), ts)
+
+
+class EvidenceArchive:
+    def __init__(self, store: Optional[EvidenceStore] = None, bucket: Optional[str] = None, s3=None) -> None:
+        self.store = store or EvidenceStore()
+        self.bucket = bucket if bucket is not None else ARCHIVE_BUCKET
+        self._s3 = s3
+
+    @property
+    def s3(self):
+        return self._s3 or _get_s3()
+
+    def archive_rows(self, client_id: Optional[str], evaluation_id: str, rows: Iterable[Dict[str, Any]]) -> Optional[str]:
+        """Write rows (with `details` resolved) as one gzip JSONL object; returns its key."""
+        if not self.bucket:
+            return None
+        lines = [json.dumps(_archive_line(client_id, evaluation_id, r), separators=(',', ':'), default=str)
+                 for r in rows]
+        key = archive_key(client_id, evaluation_id)
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=gzip.compress(('\n'.join(lines) + '\n').encode('utf-8'), 6),
+                           ContentType='application/x-ndjson', ContentEncoding='gzip',
+                           Metadata={'rows': str(len(lines))})
+        return key
+
+    def archive_evaluation(self, client_id: Optional[str], evaluation_id: str) -> Optional[str]:
+        """Export the evaluation's evidence still in the hot table (for rows written
+        before archival existed or when the archive was not taken at completion)."""
+        rows = self.store.resolve_many(self.store.repository.for_evaluation(evaluation_id, client_id))
+        return self.archive_rows(client_id, evaluation_id, rows) if rows else None
+
+    def restore(self, client_id: Optional[str], evaluation_id: str, rehydrate: bool = False) -> List[Dict[str, Any]]:
+        """Read an evaluation's archived evidence. With `rehydrate`, the rows are written
+        back to the hot table for `AUTOWAR_RESTORE_TTL_DAYS`."""
+        if not self.bucket:
+            return []
+        try:
+            body = self.s3.get_object(Bucket=self.bucket, Key=archive_key(client_id, evaluation_id))['Body'].read()
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+                return []
+            raise
+        rows = [json.loads(line) for line in gzip.decompress(body).decode('utf-8').splitlines() if line]
+        if rehydrate and rows:
+            now = int(time.time())
+            results = [{'name': r['validator'], 'resource': r['resource'], 'status': r['status'], 'details': r['details']}
+                       for r in rows]
+            self.store.write_results(client_id, evaluation_id, results, now, ttl=now + RESTORE_TTL_DAYS * 24 * 3600)
+        return rows
+
+
+def load_evidence(client_id: Optional[str], evaluation_id: str, archive: Optional[EvidenceArchive] = None,
+                  rehydrate: bool = False) -> List[Dict[str, Any]]:
+    """Evidence of an evaluation from the hot table, or from the S3 archive once expired."""
+    archive = archive or EvidenceArchive()
+    now = int(time.time())
+    # TTL deletion lags expiry by up to a couple of days: skip rows already past it
+    rows = [r for r in archive.store.repository.for_evaluation(evaluation_id, client_id)
+            if not r.get('ttl') or int(r['ttl']) > now]
+    if rows:
+        return [_archive_line(client_id, evaluation_id, r) for r in archive.store.resolve_many(rows)]
+    return archive.restore(client_id, evaluation_id, rehydrate=rehydrate)
+
+
+def mark_archived(evaluations: EvaluationRepository, evaluation_id: str, key: str, client_id: Optional[str] = None) -> None:
+    evaluations.update(evaluation_id, 'SET evidence_archive_key = :k, evidence_archived_at = :t',
+                       {':k': key, ':t': int(time.time())}, client_id=client_id)
@@ -0,0 +1,177 @@
+"""Content-addressed storage for evidence `details` payloads.
+
+Each payload is serialized canonically and hashed (SHA-256); the bytes are stored
+once per hash in a blob item of the evidence table (`BLOB#<hash>`): zlib-compressed
+inline as a Binary attribute when small, or gzip-compressed in S3 when larger than
+`AUTOWAR_EVIDENCE_INLINE_MAX_BYTES`. Per-evaluation evidence rows only keep
+`details_hash`. Re-evaluating an unchanged account writes no new blobs.
+"""
+import os
+import gzip
+import json
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import boto3
+from .repository import EvidenceRepository
+
+AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
+EVIDENCE_BUCKET = os.getenv('AUTOWAR_EVIDENCE_BUCKET')
+# compressed payloads above this go to S3 (DynamoDB items are capped at 400 KB)
+INLINE_MAX_BYTES = int(os.getenv('AUTOWAR_EVIDENCE_INLINE_MAX_BYTES', str(16 * 1024)))
+ITEM_HARD_LIMIT = 350 * 1024
+CACHE_SIZE = int(os.getenv('AUTOWAR_EVIDENCE_CACHE_SIZE', '256'))
+
+_s3 = None
+def _get_s3():
+    global _s3
+    if _s3 is None:
+        _s3 = boto3.client('s3', region_name=AWS_REGION)
+    return _s3
+
+
+def canonical_bytes(details: Any) -> bytes:
+    """Stable serialization: equal payloads always give equal bytes (and hash)."""
+    return json.dumps(details, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def s3_key_for(digest: str) -> str:
+    return f'evidence/blobs/{digest[:2]}/{digest}.json.gz'
+
+
+def _binary_value(data: Any) -> bytes:
+    # boto3 returns Binary attributes wrapped in boto3.dynamodb.types.Binary
+    return data.value if hasattr(data, 'value') else bytes(data)
+
+
+class EvidenceStore:
+    def __init__(self, repository: Optional[EvidenceRepository] = None, bucket: Optional[str] = None, s3=None) -> None:
+        self.repository = repository or EvidenceRepository()
+        self.bucket = bucket if bucket is not None else EVIDENCE_BUCKET
+        self._s3 = s3
+        # blobs are immutable, so decoded payloads can be cached by hash
+        self._cache: 'OrderedDict[str, Any]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def s3(self):
+        return self._s3 or _get_s3()
+
+    def _blob_item(self, digest: str, raw: bytes, ts: int) -> Dict[str, Any]:
+        item: Dict[str, Any] = dict(self.repository.blob_key(digest), kind='evidence-blob', size=len(raw), created_at=ts)
+        compressed = zlib.compress(raw, 6)
+        if len(compressed) <= INLINE_MAX_BYTES or (not self.bucket and len(compressed) <= ITEM_HARD_LIMIT):
+            item.update(encoding='zlib', data=compressed)
+            return item
+        if not self.bucket:
+            raise RuntimeError(f'Evidence payload {digest} is {len(compressed)} bytes compressed and AUTOWAR_EVIDENCE_BUCKET is not set')
+        key = s3_key_for(digest)
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=gzip.compress(raw, 6),
+                           ContentType='application/json', ContentEncoding='gzip')
+        item.update(encoding='s3-gzip', s3_bucket=self.bucket, s3_key=key)
+        return item
+
+    def store_payloads(self, payloads: List[Any], ts: int, ttl: Optional[int] = None) -> List[Optional[str]]:
+        """Store each distinct payload once and return its hash (None for missing payloads).
+
+        With `ttl`, new blobs expire then and reused blobs are extended to it, so a blob
+        lives as long as the longest-lived row referencing it. Without `ttl` the rows
+        never expire, so reused blobs lose theirs.
+        """
+        hashes: List[Optional[str]] = []
+        raw_by_hash: Dict[str, bytes] = {}
+        for details in payloads:
+            if details is None:
+                hashes.append(None)
+                continue
+            raw = canonical_bytes(details)
+            digest = content_hash(raw)
+            raw_by_hash.setdefault(digest, raw)
+            hashes.append(digest)
+        if raw_by_hash:
+            digests = list(raw_by_hash)
+            projection = ', '.join(self.repository.key_attrs) + ', #ttl'
+            existing = self.repository.get_blobs(digests, projection=projection, names={'#ttl': 'ttl'})
+            missing = [d for d, found in zip(digests, existing) if found is None]
+            if missing:
+                blobs = [self._blob_item(d, raw_by_hash[d], ts) for d in missing]
+                if ttl:
+                    for blob in blobs:
+                        blob['ttl'] = ttl
+                self.repository.put_many(blobs)
+            for digest, found in zip(digests, existing):
+                if found is None or found.get('ttl') is None:
+                    continue
+                if not ttl:
+                    self.repository.clear_blob_ttl(digest)
+                elif int(found['ttl']) < ttl:
+                    self.repository.extend_blob_ttl(digest, ttl)
+        return hashes
+
+    def write_results(self, client_id: str, evaluation_id: str, results: List[Dict[str, Any]], ts: int,
+                      ttl: Optional[int] = None) -> int:
+        """Write one evidence row per validator result, details stored by reference."""
+        if not results:
+            return 0
+        # rows are built first so an invalid one fails before any payload is stored
+        rows = [EvidenceRepository.item_for_result(client_id, evaluation_id, result, ts, seq=seq)
+                for seq, result in enumerate(results)]
+        hashes = self.store_payloads([r.get('details') for r in results], ts, ttl)
+        for row, digest in zip(rows, hashes):
+            del row['details']
+            if digest:
+                row['details_hash'] = digest
+            if ttl:
+                row['ttl'] = ttl
+        return self.repository.put_many(rows)
+
+    def load(self, digest: str) -> Any:
+        """Return the payload stored under `digest`."""
+        with self._lock:
+            if digest in self._cache:
+                self._cache.move_to_end(digest)
+                return self._cache[digest]
+        blob = self.repository.get_blobs([digest])[0]
+        if blob is None:
+            raise KeyError(digest)
+        return self._remember(digest, json.loads(self._decode(blob)))
+
+    def _remember(self, digest: str, details: Any) -> Any:
+        with self._lock:
+            self._cache[digest] = details
+            while len(self._cache) > CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return details
+
+    def _decode(self, blob: Dict[str, Any]) -> bytes:
+        if blob.get('encoding') == 'zlib':
+            return zlib.decompress(_binary_value(blob['data']))
+        if blob.get('encoding') == 's3-gzip':
+            body = self.s3.get_object(Bucket=blob['s3_bucket'], Key=blob['s3_key'])['Body'].read()
+            return gzip.decompress(body)
+        raise RuntimeError(f"Unknown evidence blob encoding {blob.get('encoding')!r}")
+
+    def resolve(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """Return an evidence row with `details` filled in (rows written before
+        deduplication already carry `details` inline)."""
+        if 'details' in row or not row.get('details_hash'):
+            return row
+        return dict(row, details=self.load(row['details_hash']))
+
+    def resolve_many(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Like `resolve`, fetching all referenced blobs with one batch read."""
+        with self._lock:
+            wanted = [r['details_hash'] for r in rows
+                      if 'details' not in r and r.get('details_hash') and r['details_hash'] not in self._cache]
+        wanted = list(dict.fromkeys(wanted))
+        if wanted:
+            for digest, blob in zip(wanted, self.repository.get_blobs(wanted)):
+                if blob is not None:
+                    self._remember(digest, json.loads(self._decode(blob)))
+        return [self.resolve(r) for r in rows]
@@ -0,0 +1,190 @@
+"""Incremental re-evaluation driven by AWS Config change history.
+
+Given the previous evaluation of the same account, one paginated Config advanced
+query (`select_resource_config`, or `select_aggregate_resource_config` through an
+aggregator) lists the resources whose configuration items were captured since then.
+Validators re-run only for targets touched by those changes (and for account-level
+checks Config does not record); the other targets carry their previous results
+forward. When the change set cannot be determined, everything is re-run.
+"""
+import os
+import re
+import json
+import time
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+import boto3
+from .validators import manager
+from .validators.registry import RESOURCE_SCOPE
+
+logger = logging.getLogger('incremental')
+
+CONFIG_AGGREGATOR = os.getenv('AUTOWAR_CONFIG_AGGREGATOR')
+# evaluations older than this are never used as a baseline: forces a periodic full run
+MAX_BASELINE_AGE_DAYS = int(os.getenv('AUTOWAR_INCREMENTAL_MAX_AGE_DAYS', '30'))
+# look back before the baseline started: covers changes made while it was running
+# and Config's recording delay
+CHANGE_WINDOW_SLACK_SECONDS = int(os.getenv('AUTOWAR_INCREMENTAL_SLACK_SECONDS', '900'))
+
+# target type -> Config resource types whose changes invalidate its results.
+# 'resource': only changes to the target's own resource (matched by id or name);
+# 'any': any change of that type (account-wide checks such as "a trail is logging").
+# Target types absent here (iam, config) are not recorded by Config and always re-run.
+CHANGE_TRACKING: Dict[str, Dict[str, str]] = {
+    's3': {'AWS::S3::Bucket': 'resource'},
+    'vpc': {'AWS::EC2::VPC': 'resource', 'AWS::EC2::FlowLog': 'any'},
+    'cloudtrail': {'AWS::CloudTrail::Trail': 'any'},
+    'waf': {'AWS::WAFv2::WebACL': 'any'},
+}
+
+ACCOUNT_ID_RE = re.compile(r'\d{12}')
+
+
+@dataclass
+class IncrementalPlan:
+    run_targets: List[Dict[str, Any]] = field(default_factory=list)
+    carried: List[Dict[str, Any]] = field(default_factory=list)
+    # None when the change set was unknown and everything is re-run
+    changed: Optional[Set[Tuple[str, str]]] = None
+
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def baseline_ts(previous: Dict[str, Any]) -> Optional[int]:
+    """When the previous evaluation started looking at the account."""
+    ts = previous.get('start_ts') or previous.get('created_at')
+    return int(ts) if ts is not None else None
+
+
+def changed_resources(since_ts: int, resource_types: List[str], session=None, region: Optional[str] = None,
+                      account_id: Optional[str] = None, aggregator: Optional[str] = None) -> Set[Tuple[str, str]]:
+    """(resourceType, id-or-name) pairs with configuration items captured after `since_ts`."""
+    if not resource_types:
+        return set()
+    types = ', '.join(f"'{t}'" for t in sorted(resource_types))
+    expression = ('SELECT resourceId, resourceName, resourceType '
+                  f"WHERE resourceType IN ({types}) AND configurationItemCaptureTime > '{_iso(since_ts)}'")
+    aggregator = aggregator if aggregator is not None else CONFIG_AGGREGATOR
+    if account_id and not ACCOUNT_ID_RE.fullmatch(str(account_id)):
+        # interpolated into the query below: only a 12-digit account id may get there
+        raise ValueError(f'Invalid AWS account id {account_id!r}')
+    config = (session or boto3).client('config', region_name=region)
+    kwargs: Dict[str, Any] = {'Expression': expression, 'Limit': 100}
+    if aggregator:
+        if account_id:
+            kwargs['Expression'] += f" AND accountId = '{account_id}'"
+        kwargs['ConfigurationAggregatorName'] = aggregator
+        select = config.select_aggregate_resource_config
+    else:
+        select = config.select_resource_config
+    changed: Set[Tuple[str, str]] = set()
+    while True:
+        resp = select(**kwargs)
+        for raw in resp.get('Results', []):
+            row = json.loads(raw)
+            for ident in (row.get('resourceId'), row.get('resourceName')):
+                if ident:
+                    changed.add((row['resourceType'], ident))
+        token = resp.get('NextToken')
+        if not token:
+            return changed
+        kwargs['NextToken'] = token
+
+
+def _target_changed(target: Dict[str, Any], changed: Set[Tuple[str, str]]) -> bool:
+    tracking = CHANGE_TRACKING.get(target.get('type'))
+    if tracking is None:
+        return True
+    changed_types = {t for t, _ in changed}
+    for resource_type, scope in tracking.items():
+        if scope == 'any' and resource_type in changed_types:
+            return True
+        if scope == 'resource' and (resource_type, target.get('name')) in changed:
+            return True
+    return False
+
+
+def _previous_results(target: Dict[str, Any], previous: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+    """Results the previous evaluation produced for this target, or None if any is missing or failed."""
+    by_key = {(r.get('name'), r.get('resource')): r for r in previous.get('results') or []}
+    found = []
+    for name, scope in manager.VALIDATOR_MAP.scopes(target.get('type')):
+        # validators checking a named resource report it; account-level ones do not
+        if scope is None:
+            r = by_key.get((name, target.get('name'))) or by_key.get((name, None))
+        else:
+            r = by_key.get((name, target.get('name') if scope == RESOURCE_SCOPE else None))
+        if r is None or r.get('status') == 'ERROR':
+            return None
+        found.append(r)
+    return found
+
+
+def plan_incremental(targets: List[Dict[str, Any]], previous: Optional[Dict[str, Any]], session=None,
+                     region: Optional[str] = None, account_id: Optional[str] = None,
+                     now: Optional[float] = None) -> IncrementalPlan:
+    """Split targets into those to re-run and results carried forward from `previous`."""
+    now = now if now is not None else time.time()
+    since = baseline_ts(previous) if previous else None
+    if since is None or now - since > MAX_BASELINE_AGE_DAYS * 24 * 3600:
+        return IncrementalPlan(run_targets=list(targets))
+    resource_types = sorted({t for target in targets for t in CHANGE_TRACKING.get(target.get('type'), {})})
+    try:
+        changed = changed_resources(since - CHANGE_WINDOW_SLACK_SECONDS, resource_types, session=session,
+                                    region=region, account_id=account_id)
+    except Exception:
+        # Config not recording / advanced query not available: full evaluation
+        return IncrementalPlan(run_targets=list(targets))
+    plan = IncrementalPlan(changed=changed)
+    for target in targets:
+        carried = None if _target_changed(target, changed) else _previous_results(target, previous)
+        if carried is None:
+            plan.run_targets.append(target)
+        else:
+            plan.carried.extend(dict(r, carried_from=previous.get('evaluationId') or previous.get('id')) for r in carried)
+    return plan
+
+
+def evaluate(item: Dict[str, Any], previous: Optional[Dict[str, Any]] = None, session=None,
+             on_result: Optional[Callable[[Dict[str, Any]], None]] = None) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """Run an evaluation item's validators, incrementally when `previous` is given.
+
+    Returns the results and counters (`rerun_targets`, `carried_results`).
+    """
+    targets = item.get('targets') or []
+    plan = plan_incremental(targets, previous, session=session, region=item.get('region'),
+                            account_id=item.get('account_id')) if previous else IncrementalPlan(run_targets=list(targets))
+    for r in plan.carried:
+        if on_result:
+            on_result(r)
+    results = manager.run_validators_for_evaluation(plan.run_targets, region=item.get('region'),
+                                                    account_id=item.get('account_id'), on_result=on_result, session=session)
+    return plan.carried + results, {'rerun_targets': len(plan.run_targets), 'carried_results': len(plan.carried)}
+
+
+def _same_scope(candidate: Dict[str, Any], item: Dict[str, Any]) -> bool:
+    # results only carry over between completed evaluations of the same client, account and region
+    return (candidate.get('status') == 'COMPLETED'
+            and all(candidate.get(k) == item.get(k) for k in ('client_id', 'account_id', 'region')))
+
+
+def find_baseline(evaluations, item: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """The evaluation to compare against: `previous_evaluation_id` when given, otherwise the
+    latest COMPLETED evaluation of the same client, account and region. A requested
+    baseline of another scope is rejected (None: full evaluation)."""
+    if item.get('previous_evaluation_id'):
+        previous = evaluations.get(item['previous_evaluation_id'], client_id=item.get('client_id'))
+        if previous is not None and not _same_scope(previous, item):
+            logger.warning('Baseline %s does not match the client, account and region of evaluation %s; running a full evaluation',
+                           item['previous_evaluation_id'], item.get('evaluationId') or item.get('id'))
+            return None
+        return previous
+    own_id = item.get('evaluationId') or item.get('id')
+    for candidate in evaluations.for_client(item['client_id'], limit=20):
+        if _same_scope(candidate, item) and (candidate.get('evaluationId') or candidate.get('id')) != own_id:
+            return candidate
+    return None
@@ -0,0 +1,188 @@
+"""Resource inventory discovery for `autowar-aws-resources`.
+
+Resources of an account/region are enumerated in bulk, either with one paginated
+AWS Config advanced query (`select_resource_config`) or with the Resource Groups
+Tagging API (`get_resources`), instead of service-by-service describe calls. Each
+resource gets a fingerprint; `sync_inventory` compares it with the stored inventory
+and batch-writes only new, changed and disappeared resources. `targets_from_inventory`
+turns the inventory into validator targets for `EvaluationIn.targets`.
+"""
+import os
+import json
+import time
+import hashlib
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import boto3
+from .repository import InventoryRepository
+
+# 'config' (falls back to 'tagging' when Config cannot answer) or 'tagging'
+DISCOVERY_SOURCE = os.getenv('AUTOWAR_DISCOVERY_SOURCE', 'config')
+
+# ARN (service, resource kind) -> Config resource type, for Tagging API results
+ARN_TYPES = {
+    ('s3', ''): 'AWS::S3::Bucket',
+    ('ec2', 'vpc'): 'AWS::EC2::VPC',
+    ('ec2', 'instance'): 'AWS::EC2::Instance',
+    ('ec2', 'security-group'): 'AWS::EC2::SecurityGroup',
+    ('cloudtrail', 'trail'): 'AWS::CloudTrail::Trail',
+    ('lambda', 'function'): 'AWS::Lambda::Function',
+    ('rds', 'db'): 'AWS::RDS::DBInstance',
+    ('dynamodb', 'table'): 'AWS::DynamoDB::Table',
+}
+
+# Config resource type -> validator target type
+TARGET_TYPES = {
+    'AWS::S3::Bucket': 's3',
+    'AWS::EC2::VPC': 'vpc',
+}
+# account-level checks added once per account
+ACCOUNT_TARGETS = [
+    {'type': 'iam', 'name': 'account'},
+    {'type': 'cloudtrail', 'name': 'account'},
+    {'type': 'config', 'name': 'account'},
+    {'type': 'waf', 'name': 'account'},
+]
+
+
+def parse_arn(arn: str) -> Tuple[str, str, str]:
+    """(service, resource kind, resource id) of an ARN."""
+    parts = arn.split(':', 5)
+    service, resource = parts[2], parts[5] if len(parts) > 5 else ''
+    for sep in ('/', ':'):
+        if sep in resource:
+            kind, _, ident = resource.partition(sep)
+            return service, kind, ident
+    return service, '', resource
+
+
+def fingerprint(resource: Dict[str, Any]) -> str:
+    """Hash of the attributes whose change should count as a change of the resource."""
+    material = {k: resource.get(k) for k in ('resourceType', 'resourceName', 'tags', 'configuration_captured_at')}
+    return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _from_config(session, region: Optional[str], resource_types: Optional[List[str]]) -> Iterator[Dict[str, Any]]:
+    config = (session or boto3).client('config', region_name=region)
+    expression = ('SELECT resourceId, resourceName, resourceType, arn, awsRegion, tags, configurationItemCaptureTime')
+    if resource_types:
+        expression += ' WHERE resourceType IN (' + ', '.join(f"'{t}'" for t in resource_types) + ')'
+    kwargs: Dict[str, Any] = {'Expression': expression, 'Limit': 100}
+    while True:
+        resp = config.select_resource_config(**kwargs)
+        for raw in resp.get('Results', []):
+            row = json.loads(raw)
+            yield {
+                'resourceArn': row.get('arn') or f"{row['resourceType']}:{row['resourceId']}",
+                'resourceType': row['resourceType'],
+                'resourceId': row['resourceId'],
+                'resourceName': row.get('resourceName'),
+                'region': row.get('awsRegion') or region,
+                'tags': {t['key']: t.get('value') for t in row.get('tags') or []},
+                'configuration_captured_at': row.get('configurationItemCaptureTime'),
+            }
+        if not resp.get('NextToken'):
+            return
+        kwargs['NextToken'] = resp['NextToken']
+
+
+def _from_tagging(session, region: Optional[str], resource_types: Optional[List[str]]) -> Iterator[Dict[str, Any]]:
+    tagging = (session or boto3).client('resourcegroupstaggingapi', region_name=region)
+    kwargs: Dict[str, Any] = {'ResourcesPerPage': 100}
+    while True:
+        resp = tagging.get_resources(**kwargs)
+        for r in resp.get('ResourceTagMappingList', []):
+            arn = r['ResourceARN']
+            service, kind, ident = parse_arn(arn)
+            resource_type = ARN_TYPES.get((service, kind), f'{service}:{kind}' if kind else service)
+            if resource_types and resource_type not in resource_types:
+                continue
+            yield {
+                'resourceArn': arn,
+                'resourceType': resource_type,
+                'resourceId': ident,
+                'resourceName': ident,
+                'region': region,
+                'tags': {t['Key']: t.get('Value') for t in r.get('Tags') or []},
+            }
+        if not resp.get('PaginationToken'):
+            return
+        kwargs['PaginationToken'] = resp['PaginationToken']
+
+
+def discover_resources(session=None, region: Optional[str] = None, resource_types: Optional[List[str]] = None,
+                       source: Optional[str] = None) -> Tuple[str, List[Dict[str, Any]]]:
+    """Enumerate the resources visible to `session` in `region`. Returns (source used, resources)."""
+    source = source or DISCOVERY_SOURCE
+    if source == 'config':
+        try:
+            return 'config', list(_from_config(session, region, resource_types))
+        except Exception:
+            # Config not recording or advanced query not allowed: the Tagging API still
+            # lists every resource that has (or had) tags
+            pass
+    return 'tagging', list(_from_tagging(session, region, resource_types))
+
+
+def sync_inventory(client_id: str, account_id: Optional[str], discovered: List[Dict[str, Any]],
+                   repository: Optional[InventoryRepository] = None, now: Optional[int] = None,
+                   region: Optional[str] = None) -> Dict[str, Any]:
+    """Upsert discovered resources, writing only what changed.
+
+    New and changed resources are written (keeping `discovered_at` of known ones);
+    stored resources of the discovered account and region that were not discovered
+    again are marked `status=DELETED`. Unchanged resources cost no write. Without
+    `region`, the regions of the discovered resources are the scope.
+    """
+    repository = repository or InventoryRepository()
+    now = now or int(time.time())
+    regions = {region} if region else {r.get('region') for r in discovered}
+    # discovery only saw one account and region: resources elsewhere are not touched
+    existing = {i['resourceArn']: i for i in repository.for_client(client_id, account_id)
+                if i.get('account_id') == account_id and i.get('region') in regions}
+    writes: List[Dict[str, Any]] = []
+    counts = {'discovered': len(discovered), 'new': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+    seen = set()
+    for resource in discovered:
+        seen.add(resource['resourceArn'])
+        digest = fingerprint(resource)
+        previous = existing.get(resource['resourceArn'])
+        if previous and previous.get('fingerprint') == digest and previous.get('status') == 'ACTIVE':
+            counts['unchanged'] += 1
+            continue
+        counts['changed' if previous else 'new'] += 1
+        writes.append(dict(resource, client_id=client_id, account_id=account_id, fingerprint=digest, status='ACTIVE',
+                           discovered_at=(previous or {}).get('discovered_at', now), updated_at=now))
+    for arn, previous in existing.items():
+        if arn not in seen and previous.get('status') != 'DELETED':
+            counts['removed'] += 1
+            writes.append(dict(previous, status='DELETED', deleted_at=now, updated_at=now))
+    if writes:
+        repository.put_many(writes)
+    return counts
+
+
+def targets_from_inventory(items: List[Dict[str, Any]], include_account_checks: bool = True) -> List[Dict[str, Any]]:
+    """Validator targets for the active resources of an inventory."""
+    targets = []
+    seen = set()
+    for item in items:
+        target_type = TARGET_TYPES.get(item.get('resourceType'))
+        if not target_type or item.get('status') == 'DELETED':
+            continue
+        name = item.get('resourceName') if target_type == 's3' else item.get('resourceId')
+        if (target_type, name) not in seen:
+            seen.add((target_type, name))
+            targets.append({'type': target_type, 'name': name})
+    if include_account_checks:
+        targets.extend(dict(t) for t in ACCOUNT_TARGETS)
+    return targets
+
+
+def discover_targets(client_id: str, account_id: Optional[str], session=None, region: Optional[str] = None,
+                     repository: Optional[InventoryRepository] = None) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """Refresh the inventory of an account and derive evaluation targets from it."""
+    repository = repository or InventoryRepository()
+    source, discovered = discover_resources(session, region)
+    counts = sync_inventory(client_id, account_id, discovered, repository, region=region)
+    counts['source'] = source
+    return targets_from_inventory(discovered), counts
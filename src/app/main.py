@@ -1,37 +1,60 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import os
-from .aws_connector import get_table
+from .aws_connector import parallel_scan
 from .models import EvaluationIn, EvaluationOut
 from .evaluation_service import (
     create_evaluation,
     get_evaluation,
     list_evaluations_for_client,
+    record_evaluation_result,
 )
 from .credentials_manager import (
     assume_role,
+    delete_secret,
     store_secret_for_keys,
     validate_keys,
     register_credential_record,
+    register_credential_records,
 )
+from .evaluation_events import stream_evaluation_events
+from .evidence_retention import load_evidence
+from .repository import ClientRepository, InventoryRepository
+from .responses import FastJSONResponse
+from .dynamo_metrics import metrics as dynamo_metrics
 from .auth import require_api_key
 from .cognito_auth import require_cognito_auth
 from pydantic import BaseModel
-from typing import Optional
+from typing import Optional, List, Dict, Any
+from concurrent.futures import ThreadPoolExecutor
 import uuid
+import logging
+
+logger = logging.getLogger('api')
 
 APP_TABLES = {
     'clients': 'autowar-clients',
     'evaluations': 'autowar-evaluations',
 }
 
-app = FastAPI(title='AutoWAR API')
+app = FastAPI(title='AutoWAR API', default_response_class=FastJSONResponse)
+
+
+@app.middleware('http')
+async def flush_dynamo_metrics(request: Request, call_next):
+    try:
+        return await call_next(request)
+    finally:
+        dynamo_metrics.flush()
 
 
 class ClientIn(BaseModel):
     id: str
     name: str
     industry: str | None = None
+    # retention plan (basic|standard|premium): how long evidence stays in DynamoDB
+    plan: str | None = None
 
 
 @app.get('/health')
@@ -40,19 +63,16 @@ async def health():
 
 
 @app.get('/clients')
-def list_clients():
-    table = get_table(APP_TABLES['clients'])
-    resp = table.scan()
-    items = resp.get('Items', [])
-    return {'count': len(items), 'items': items}
+def list_clients(request: Request):
+    # full read (the old single scan stopped at the first 1 MB page)
+    items = list(parallel_scan(APP_TABLES['clients']))
+    return FastJSONResponse({'count': len(items), 'items': items}, accept_encoding=request.headers.get('accept-encoding'))
 
 
 @app.post('/clients', status_code=201)
 def create_client(client: ClientIn, claims: dict = Depends(require_cognito_auth)):
-    table = get_table(APP_TABLES['clients'])
-    item = client.dict()
     try:
-        table.put_item(Item=item)
+        item = ClientRepository(APP_TABLES['clients']).put(client.dict())
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     return {'ok': True, 'item': item}
@@ -69,17 +89,74 @@ def api_create_evaluation(evaluation: EvaluationIn, claims: dict = Depends(requi
 
 
 @app.get('/evaluations/{evaluation_id}')
-def api_get_evaluation(evaluation_id: str):
+def api_get_evaluation(evaluation_id: str, request: Request):
     item = get_evaluation(evaluation_id)
     if not item:
         raise HTTPException(status_code=404, detail='Evaluation not found')
-    return item
+    # returned directly: skips jsonable_encoder on large result structures
+    return FastJSONResponse(item, accept_encoding=request.headers.get('accept-encoding'))
+
+
+class ResultIn(BaseModel):
+    name: str
+    status: str
+    resource: Optional[str] = None
+    details: Optional[Any] = None
+
+
+@app.post('/evaluations/{evaluation_id}/results')
+def api_record_result(evaluation_id: str, result: ResultIn, claims: dict = Depends(require_cognito_auth)):
+    """Record a re-run validator result (e.g. after a remediation); returns the updated scores."""
+    try:
+        return record_evaluation_result(evaluation_id, result.dict(exclude_none=True))
+    except KeyError:
+        raise HTTPException(status_code=404, detail='Evaluation not found')
+
+
+@app.get('/evaluations/{evaluation_id}/events')
+def api_evaluation_events(evaluation_id: str):
+    """Server-sent events: status transitions and validator results until the evaluation finishes."""
+    item = get_evaluation(evaluation_id)
+    if not item:
+        raise HTTPException(status_code=404, detail='Evaluation not found')
+    return StreamingResponse(
+        stream_evaluation_events(item, reload=lambda: get_evaluation(evaluation_id)),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def _evidence_response(evaluation_id: str, request: Request, rehydrate: bool) -> FastJSONResponse:
+    item = get_evaluation(evaluation_id)
+    if not item:
+        raise HTTPException(status_code=404, detail='Evaluation not found')
+    rows = load_evidence(item.get('client_id'), evaluation_id, rehydrate=rehydrate)
+    return FastJSONResponse({'count': len(rows), 'items': rows}, accept_encoding=request.headers.get('accept-encoding'))
+
+
+@app.get('/evaluations/{evaluation_id}/evidence')
+def api_evaluation_evidence(evaluation_id: str, request: Request):
+    """Evidence rows of an evaluation; expired evidence is read back from the S3 archive (read-only)."""
+    return _evidence_response(evaluation_id, request, rehydrate=False)
+
+
+@app.post('/evaluations/{evaluation_id}/evidence:rehydrate')
+def api_rehydrate_evidence(evaluation_id: str, request: Request, claims: dict = Depends(require_cognito_auth)):
+    """Like GET .../evidence, but archived evidence is also written back to the table for a few days."""
+    return _evidence_response(evaluation_id, request, rehydrate=True)
 
 
 @app.get('/clients/{client_id}/evaluations')
-def api_list_evaluations_for_client(client_id: str, limit: int = 50):
+def api_list_evaluations_for_client(client_id: str, request: Request, limit: int = 50):
     items = list_evaluations_for_client(client_id, limit=limit)
-    return {'count': len(items), 'items': items}
+    return FastJSONResponse({'count': len(items), 'items': items}, accept_encoding=request.headers.get('accept-encoding'))
+
+
+@app.get('/clients/{client_id}/resources')
+def api_list_client_resources(client_id: str, request: Request, account_id: Optional[str] = None):
+    """Discovered resource inventory of a client (refreshed by evaluations with `discover_targets`)."""
+    items = InventoryRepository().for_client(client_id, account_id)
+    return FastJSONResponse({'count': len(items), 'items': items}, accept_encoding=request.headers.get('accept-encoding'))
 
 
 # Credentials management
@@ -94,44 +171,115 @@ class CredentialsIn(BaseModel):
     save_secret: Optional[bool] = True
 
 
+class CredentialsBatchIn(BaseModel):
+    entries: List[CredentialsIn]
+
+
+# Bounded parallelism for batch onboarding (STS throttles bursts per account)
+CREDENTIALS_BATCH_CONCURRENCY = int(os.getenv('AUTOWAR_CREDENTIALS_BATCH_CONCURRENCY', '10'))
+CREDENTIALS_BATCH_MAX_ENTRIES = int(os.getenv('AUTOWAR_CREDENTIALS_BATCH_MAX_ENTRIES', '500'))
+
+
 @app.post('/credentials', status_code=201, dependencies=[Depends(require_api_key)])
 def api_create_credentials(payload: CredentialsIn):
+    try:
+        # a single registration also confirms the assumed identity with GetCallerIdentity
+        rec = _validate_credentials_entry(payload, verify_identity=True)
+    except _SecretStoreError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        saved = register_credential_record(payload.client_id, rec)
+    except Exception as e:
+        _discard_secret(rec, payload.region)
+        raise HTTPException(status_code=500, detail=f"Failed to register credentials: {e}")
+    return {'ok': True, 'record': saved}
+
+
+def _discard_secret(rec: Dict[str, Any], region: Optional[str]) -> None:
+    if rec.get('secret_arn'):
+        try:
+            delete_secret(rec['secret_arn'], region)
+        except Exception:
+            logger.exception('Could not delete orphaned secret %s', rec['secret_arn'])
+
+
+class _SecretStoreError(ValueError):
+    """The credentials are valid but could not be stored in Secrets Manager."""
+
+
+def _validate_credentials_entry(entry: CredentialsIn, verify_identity: bool = False) -> Dict[str, Any]:
+    """Validate one credentials entry and return the record to register (no secrets in it);
+    raises ValueError with the reason."""
     # Prefer AssumeRole when role_arn is provided
-    if payload.role_arn:
-        session_name = f"autowar-{uuid.uuid4()}"
+    if entry.role_arn:
         try:
-            resp = assume_role(payload.role_arn, session_name, external_id=payload.external_id, region=payload.region)
+            # AssumeRole succeeding is the validation; unless `verify_identity`, the
+            # identity comes from its response
+            resp = assume_role(entry.role_arn, f"autowar-{uuid.uuid4()}", external_id=entry.external_id,
+                               region=entry.region, validate=verify_identity)
         except Exception as e:
-            raise HTTPException(status_code=400, detail=f"AssumeRole failed: {e}")
-        # register metadata (do not store secrets)
-        rec = {
+            raise ValueError(f"AssumeRole failed: {e}")
+        return {
             'type': 'role',
-            'role_arn': payload.role_arn,
+            'role_arn': entry.role_arn,
+            'external_id': entry.external_id,
+            'region': entry.region,
             'caller_identity': resp.get('caller_identity'),
             'status': 'ACTIVE',
         }
-        saved = register_credential_record(payload.client_id, rec)
-        return {'ok': True, 'record': saved}
-
     # Fallback: keys provided
-    if payload.access_key_id and payload.secret_access_key:
+    if entry.access_key_id and entry.secret_access_key:
         try:
-            identity = validate_keys(payload.access_key_id, payload.secret_access_key, payload.session_token, payload.region)
+            identity = validate_keys(entry.access_key_id, entry.secret_access_key, entry.session_token, entry.region)
         except Exception as e:
-            raise HTTPException(status_code=400, detail=f"Credential validation failed: {e}")
+            raise ValueError(f"Credential validation failed: {e}")
         secret_arn = None
-        if payload.save_secret:
+        if entry.save_secret:
             try:
-                secret_arn = store_secret_for_keys(payload.client_id, payload.access_key_id, payload.secret_access_key, payload.session_token, payload.region)
+                secret_arn = store_secret_for_keys(entry.client_id, entry.access_key_id, entry.secret_access_key, entry.session_token, entry.region)
             except Exception as e:
-                raise HTTPException(status_code=500, detail=f"Secrets Manager error: {e}")
-        rec = {
+                raise _SecretStoreError(f"Secrets Manager error: {e}")
+        return {
             'type': 'keys',
             'caller_identity': identity,
             'secret_arn': secret_arn,
             'status': 'ACTIVE',
         }
-        saved = register_credential_record(payload.client_id, rec)
-        return {'ok': True, 'record': saved}
+    raise ValueError('Provide either role_arn or access_key_id+secret_access_key')
+
 
-    raise HTTPException(status_code=400, detail='Provide either role_arn or access_key_id+secret_access_key')
+@app.post('/credentials:batch', dependencies=[Depends(require_api_key)])
+def api_create_credentials_batch(payload: CredentialsBatchIn):
+    """Validate and register many credentials at once; returns one result per entry, in order."""
+    entries = payload.entries
+    if not entries:
+        raise HTTPException(status_code=400, detail='entries must not be empty')
+    if len(entries) > CREDENTIALS_BATCH_MAX_ENTRIES:
+        raise HTTPException(status_code=400, detail=f'At most {CREDENTIALS_BATCH_MAX_ENTRIES} entries per batch')
+
+    def validate(entry: CredentialsIn) -> Dict[str, Any]:
+        try:
+            return {'record': _validate_credentials_entry(entry)}
+        except ValueError as e:
+            return {'error': str(e)}
+
+    with ThreadPoolExecutor(max_workers=min(CREDENTIALS_BATCH_CONCURRENCY, len(entries))) as pool:
+        outcomes = list(pool.map(validate, entries))
+
+    valid = [(i, entries[i].client_id, o['record']) for i, o in enumerate(outcomes) if 'record' in o]
+    results: List[Dict[str, Any]] = [{'index': i, 'ok': False, 'error': o.get('error')} for i, o in enumerate(outcomes)]
+    if valid:
+        try:
+            saved = register_credential_records([(client_id, rec) for _, client_id, rec in valid])
+        except Exception as e:
+            # nothing references the secrets just stored for these entries: remove them
+            for i, _, rec in valid:
+                _discard_secret(rec, entries[i].region)
+                results[i] = {'index': i, 'ok': False, 'error': f"Failed to register credentials: {e}"}
+            valid, saved = [], []
+        for (i, _, _), item in zip(valid, saved):
+            results[i] = {'index': i, 'ok': True, 'record': item}
+    succeeded = len(valid)
+    return {'ok': succeeded == len(entries), 'succeeded': succeeded, 'failed': len(entries) - succeeded, 'results': results}
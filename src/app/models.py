@@ -17,10 +17,21 @@ class EvaluationIn(BaseModel):
     pillar_scores: Optional[Dict[str, float]] = None
     summary: Optional[str] = None
     targets: Optional[List[ResourceTarget]] = None
+    # id of a record in autowar-aws-credentials used to access the evaluated account
+    credential_id: Optional[str] = None
+    # re-check only resources AWS Config reports as changed since the previous evaluation
+    incremental: Optional[bool] = None
+    # baseline for incremental mode; defaults to the latest completed evaluation of the account
+    previous_evaluation_id: Optional[str] = None
+    # without targets: refresh the account inventory and evaluate what it contains
+    discover_targets: Optional[bool] = None
 
 
 class EvaluationOut(EvaluationIn):
     evaluationId: str
     created_at: int
     score_total: Optional[float] = None
+    question_scores: Optional[Dict[str, float]] = None
     status: str = 'PENDING'
+    # why a FAILED evaluation failed
+    error: Optional[str] = None
@@ -0,0 +1,168 @@
+"""Client for the external report renderer (`RENDERER_URL`).
+
+One pooled `httpx.Client` (HTTP/2 when `h2` is installed) is kept per process and
+reused across warm Lambda invocations. Concurrent renders are capped, transient
+failures (connection errors, 429/5xx before any byte was received) are retried
+with jittered backoff, and a circuit breaker stops calling a failing renderer for
+a cool-down window so report jobs fall back immediately instead of each waiting
+for its own timeout. Only 5xx responses, timeouts and connection errors count as
+renderer failures; a 4xx is the request's fault and shows the renderer is up.
+"""
+import os
+import time
+import random
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional
+
+try:
+    import httpx
+except Exception:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 - only enables HTTP/2 in httpx
+    HTTP2 = True
+except ImportError:
+    HTTP2 = False
+
+TIMEOUT_SECONDS = float(os.getenv('AUTOWAR_RENDERER_TIMEOUT', '30'))
+CONNECT_TIMEOUT_SECONDS = float(os.getenv('AUTOWAR_RENDERER_CONNECT_TIMEOUT', '3'))
+CONCURRENCY = int(os.getenv('AUTOWAR_RENDERER_CONCURRENCY', '4'))
+MAX_RETRIES = int(os.getenv('AUTOWAR_RENDERER_RETRIES', '2'))
+# consecutive failures that open the circuit, and how long it stays open
+BREAKER_THRESHOLD = int(os.getenv('AUTOWAR_RENDERER_BREAKER_THRESHOLD', '3'))
+BREAKER_COOLDOWN_SECONDS = float(os.getenv('AUTOWAR_RENDERER_BREAKER_COOLDOWN', '60'))
+RETRY_STATUSES = (429, 502, 503, 504)
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures; after `cooldown` seconds
+    a single trial call is let through (half-open) and its outcome decides."""
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN_SECONDS,
+                 clock: Callable[[], float] = time.monotonic) -> None:
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            return 'half-open' if self._clock() - self._opened_at >= self.cooldown else 'open'
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if self._clock() - self._opened_at < self.cooldown or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial = False
+
+    def release(self) -> None:
+        """End a call that says nothing about the renderer's health (lets the next
+        half-open trial through)."""
+        with self._lock:
+            self._trial = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial or self._failures >= self.threshold:
+                self._opened_at = self._clock()
+            self._trial = False
+
+
+breaker = CircuitBreaker()
+_slots = threading.BoundedSemaphore(CONCURRENCY)
+
+_client = None
+_client_lock = threading.Lock()
+def _get_client():
+    global _client
+    if _client is None:
+        if httpx is None:
+            raise RuntimeError('httpx not available in this lambda package')
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(
+                    http2=HTTP2,
+                    timeout=httpx.Timeout(TIMEOUT_SECONDS, connect=CONNECT_TIMEOUT_SECONDS),
+                    limits=httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY),
+                )
+    return _client
+
+
+def _backoff(attempt: int) -> None:
+    # full jitter: sleep uniformly in [0, 250ms * 2^attempt], capped at 4s
+    time.sleep(random.uniform(0, min(4.0, 0.25 * (2 ** attempt))))
+
+
+def _retryable(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code in RETRY_STATUSES
+    return isinstance(exc, httpx.TransportError)
+
+
+def _renderer_failed(exc: Exception) -> bool:
+    if isinstance(exc, httpx.HTTPStatusError):
+        return exc.response.status_code >= 500
+    return isinstance(exc, httpx.TransportError)
+
+
+def stream_render(url: str, payload: Dict[str, Any], chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """POST `payload` to the renderer and yield the response body in chunks.
+
+    Raises `CircuitOpenError` without calling the renderer while the circuit is open.
+    Retries only happen before the first chunk is yielded, so callers never see a
+    partial body repeated. The breaker records the outcome however the call ends,
+    including when the caller stops reading early.
+    """
+    if not breaker.allow():
+        raise CircuitOpenError(f'renderer circuit open, skipping call to {url}')
+    record = breaker.release
+    try:
+        client = _get_client()
+        with _slots:
+            attempt = 0
+            while True:
+                started = False
+                try:
+                    with client.stream('POST', url, json=payload) as resp:
+                        resp.raise_for_status()
+                        for chunk in resp.iter_bytes(chunk_size):
+                            started = True
+                            yield chunk
+                    record = breaker.record_success
+                    return
+                except GeneratorExit:
+                    # the caller stopped reading: the renderer was answering
+                    record = breaker.record_success
+                    raise
+                except Exception as e:
+                    if started or attempt >= MAX_RETRIES or httpx is None or not _retryable(e):
+                        if httpx is not None and _renderer_failed(e):
+                            record = breaker.record_failure
+                        elif httpx is not None and isinstance(e, httpx.HTTPStatusError):
+                            record = breaker.record_success
+                        raise
+                    attempt += 1
+                    _backoff(attempt)
+    finally:
+        record()
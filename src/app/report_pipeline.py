@@ -0,0 +1,276 @@
+"""Multi-format report rendering from one normalized model.
+
+The evaluation is read once and normalized into a `ReportModel`; every requested
+format is rendered from that model as a chunk stream and uploaded to S3 in
+parallel (`report_stream.upload_chunks`). JSON and CSV are rendered natively,
+XLSX and Parquet with `openpyxl` / `pyarrow` (imported on first use: pyarrow pulls
+in numpy, which the report Lambda's cold start does not pay for otherwise), and PDF
+by the external renderer (`RENDERER_URL`), with its default, `executive` or
+`technical` template. XLSX and Parquet are written to a spooled temporary file
+(spilling to disk past `AUTOWAR_REPORT_SPOOL_BYTES`) and streamed from it, so they
+stay within the same memory bound as the other formats.
+
+Report objects are content addressed: their key embeds a hash of the normalized
+report and `AUTOWAR_REPORT_TEMPLATE_VERSION`, so a job for unchanged results (SQS
+redelivery, "regenerate") finds the existing objects and renders nothing.
+"""
+import io
+import os
+import csv
+import tempfile
+import json
+import hashlib
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from botocore.exceptions import ClientError
+from .report_stream import json_report_chunks, upload_chunks
+from . import renderer_client
+from .catalog import load_catalog
+
+logger = logging.getLogger('report_pipeline')
+
+GZIP_REPORTS = os.getenv('AUTOWAR_REPORT_GZIP', '').lower() in ('1', 'true', 'yes')
+RENDER_CHUNK_SIZE = 1024 * 1024
+CSV_ROWS_PER_CHUNK = 500
+PARQUET_ROWS_PER_GROUP = 5000
+# XLSX/Parquet files are kept in memory up to this size, then spilled to /tmp
+SPOOL_MAX_BYTES = int(os.getenv('AUTOWAR_REPORT_SPOOL_BYTES', str(8 * 1024 * 1024)))
+# bump when renderers or the PDF template change: cached reports are then regenerated
+TEMPLATE_VERSION = os.getenv('AUTOWAR_REPORT_TEMPLATE_VERSION', '1')
+# columns of the tabular formats (details serialized as JSON text, lists joined with ';')
+COLUMNS = ['validator', 'resource', 'status', 'pillars', 'best_practices', 'details']
+
+
+@dataclass
+class ReportModel:
+    evaluation_id: Optional[str]
+    client_id: Optional[str] = None
+    account_id: Optional[str] = None
+    created_at: Optional[int] = None
+    catalog_version: Optional[str] = None
+    rows: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def summary(self) -> Dict[str, int]:
+        return dict(Counter(r['status'] for r in self.rows if r.get('status')))
+
+    def content(self) -> Dict[str, Any]:
+        """JSON document of the report (the `results` key keeps the original JSON layout)."""
+        return {
+            'evaluationId': self.evaluation_id,
+            'clientId': self.client_id,
+            'accountId': self.account_id,
+            'created_at': self.created_at,
+            'catalogVersion': self.catalog_version,
+            'summary': self.summary,
+            'results': [{'name': r['validator'], 'resource': r['resource'], 'status': r['status'],
+                         'pillars': r['pillars'], 'best_practices': r['best_practices'],
+                         'details': r['details']} for r in self.rows],
+        }
+
+    def digest(self) -> str:
+        """Hash of the report content and template version (the cache key)."""
+        material = json.dumps({'template': TEMPLATE_VERSION, 'content': self.content()},
+                              sort_keys=True, separators=(',', ':'), default=str)
+        return hashlib.sha256(material.encode('utf-8')).hexdigest()
+
+    def table(self) -> Iterator[List[Any]]:
+        """Tabular rows (without header) in `COLUMNS` order."""
+        for r in self.rows:
+            details = r['details']
+            yield [r['validator'], r['resource'], r['status'], ';'.join(r['pillars']), ';'.join(r['best_practices']),
+                   details if details is None or isinstance(details, str) else json.dumps(details, default=str)]
+
+
+def build_model(evaluation: Dict[str, Any]) -> ReportModel:
+    """Normalize an evaluation item into the model every format renders from."""
+    catalog = load_catalog()
+    rows = []
+    for r in evaluation.get('results') or []:
+        validator = r.get('name') or r.get('validator')
+        rows.append({
+            'validator': validator,
+            'resource': r.get('resource') or r.get('resourceArn'),
+            'status': r.get('status'),
+            'pillars': list(catalog.pillars_for_validator(validator)),
+            'best_practices': list(catalog.validator_bps.get(validator, ())),
+            'details': r.get('details'),
+        })
+    return ReportModel(
+        evaluation_id=evaluation.get('evaluationId') or evaluation.get('id'),
+        client_id=evaluation.get('client_id'),
+        account_id=evaluation.get('account_id'),
+        created_at=evaluation.get('created_at'),
+        catalog_version=catalog.version,
+        rows=rows,
+    )
+
+
+def _json_chunks(model: ReportModel) -> Iterator[bytes]:
+    return json_report_chunks(model.content())
+
+
+def _csv_chunks(model: ReportModel) -> Iterator[bytes]:
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(COLUMNS)
+    for n, row in enumerate(model.table(), 1):
+        writer.writerow(row)
+        if n % CSV_ROWS_PER_CHUNK == 0:
+            yield buf.getvalue().encode('utf-8')
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode('utf-8')
+
+
+def _spooled_chunks(write: Callable[[Any], None]) -> Iterator[bytes]:
+    """Run `write(file)` against a spooled temporary file, then stream the file out."""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES) as f:
+        write(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(RENDER_CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _xlsx_chunks(model: ReportModel) -> Iterator[bytes]:
+    try:
+        import openpyxl
+    except ImportError:
+        raise RuntimeError('openpyxl is not installed') from None
+    return _spooled_chunks(lambda f: _write_xlsx(openpyxl, model, f))
+
+
+def _write_xlsx(openpyxl, model: ReportModel, f) -> None:
+    # write-only workbooks keep the rows in their own temporary files, not in memory
+    workbook = openpyxl.Workbook(write_only=True)
+    summary = workbook.create_sheet('Summary')
+    summary.append(['evaluationId', model.evaluation_id])
+    summary.append(['accountId', model.account_id])
+    for status, count in sorted(model.summary.items()):
+        summary.append([status, count])
+    results = workbook.create_sheet('Results')
+    results.append(COLUMNS)
+    for row in model.table():
+        results.append(row)
+    workbook.save(f)
+
+
+def _parquet_chunks(model: ReportModel) -> Iterator[bytes]:
+    try:
+        import pyarrow
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError('pyarrow is not installed') from None
+    schema = pyarrow.schema([(name, pyarrow.string()) for name in COLUMNS])
+
+    def write(f) -> None:
+        # one row group per PARQUET_ROWS_PER_GROUP rows: only that batch is held as arrays
+        with pq.ParquetWriter(f, schema, compression='zstd') as writer:
+            batch: List[List[Any]] = []
+            for row in model.table():
+                batch.append(row)
+                if len(batch) == PARQUET_ROWS_PER_GROUP:
+                    writer.write_table(_arrow_table(pyarrow, schema, batch))
+                    batch = []
+            if batch or not model.rows:
+                writer.write_table(_arrow_table(pyarrow, schema, batch))
+
+    return _spooled_chunks(write)
+
+
+def _arrow_table(pyarrow, schema, rows: List[List[Any]]):
+    columns = list(zip(*rows)) or [()] * len(COLUMNS)
+    return pyarrow.table([pyarrow.array(list(values), type=pyarrow.string()) for values in columns], schema=schema)
+
+
+def _pdf_chunks(model: ReportModel, template: Optional[str] = None) -> Iterator[bytes]:
+    """Stream the external renderer's response body without buffering it."""
+    renderer = os.getenv('RENDERER_URL')
+    if not renderer:
+        raise RuntimeError('RENDERER_URL is not configured')
+    payload: Dict[str, Any] = {'payload': model.content(), 'format': 'pdf'}
+    if template:
+        payload['template'] = template
+    return renderer_client.stream_render(renderer, payload, RENDER_CHUNK_SIZE)
+
+
+@dataclass(frozen=True)
+class ReportFormat:
+    extension: str
+    content_type: str
+    render: Callable[[ReportModel], Iterator[bytes]]
+    # gzip-compressed when AUTOWAR_REPORT_GZIP is set (binary formats are compressed already)
+    compressible: bool = False
+
+
+FORMATS: Dict[str, ReportFormat] = {
+    'json': ReportFormat('json', 'application/json', _json_chunks, compressible=True),
+    'csv': ReportFormat('csv', 'text/csv', _csv_chunks, compressible=True),
+    'xlsx': ReportFormat('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', _xlsx_chunks),
+    'parquet': ReportFormat('parquet', 'application/vnd.apache.parquet', _parquet_chunks),
+    'pdf': ReportFormat('pdf', 'application/pdf', _pdf_chunks),
+    # audience-specific PDFs: the renderer picks the layout from the payload's `template`
+    'pdf-executive': ReportFormat('executive.pdf', 'application/pdf', lambda m: _pdf_chunks(m, 'executive')),
+    'pdf-technical': ReportFormat('technical.pdf', 'application/pdf', lambda m: _pdf_chunks(m, 'technical')),
+}
+
+
+def requested_formats() -> List[str]:
+    """`AUTOWAR_REPORT_FORMATS` (comma separated); defaults to PDF when a renderer is
+    configured and JSON otherwise."""
+    configured = os.getenv('AUTOWAR_REPORT_FORMATS')
+    if configured:
+        return [f.strip() for f in configured.split(',') if f.strip()]
+    return ['pdf'] if os.getenv('RENDERER_URL') else ['json']
+
+
+def key_prefix(model: ReportModel) -> str:
+    return f'reports/{model.evaluation_id}/{model.digest()}'
+
+
+def _exists(s3, bucket: str, key: str) -> bool:
+    try:
+        s3.head_object(Bucket=bucket, Key=key)
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+
+def upload_format(model: ReportModel, name: str, s3, bucket: str, key_prefix: str) -> str:
+    """Upload one format unless an object with the same content key already exists."""
+    fmt = FORMATS.get(name)
+    if fmt is None:
+        raise RuntimeError(f'Unknown report format {name!r}')
+    compress = fmt.compressible and GZIP_REPORTS
+    key = f'{key_prefix}.{fmt.extension}' + ('.gz' if compress else '')
+    if _exists(s3, bucket, key):
+        logger.info('Report %s is up to date, skipping rendering', key)
+        return key
+    upload_chunks(fmt.render(model), s3, bucket, key, fmt.content_type, compress=compress)
+    return key
+
+
+def render_formats(model: ReportModel, formats: List[str], s3, bucket: str, key_prefix: str) -> Dict[str, str]:
+    """Render and upload every format in parallel; returns {format: key} of those that
+    succeeded (or were already there). When all of them fail, the JSON report is
+    written instead."""
+    keys: Dict[str, str] = {}
+    if formats:
+        with ThreadPoolExecutor(max_workers=len(formats)) as pool:
+            futures = {name: pool.submit(upload_format, model, name, s3, bucket, key_prefix) for name in formats}
+        for name, future in futures.items():
+            try:
+                keys[name] = future.result()
+            except Exception:
+                logger.exception('Rendering %s report failed for evaluation %s', name, model.evaluation_id)
+    if not keys and 'json' not in formats:
+        keys['json'] = upload_format(model, 'json', s3, bucket, key_prefix)
+    return keys
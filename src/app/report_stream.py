@@ -0,0 +1,107 @@
+"""Bounded-memory report upload to S3.
+
+Report renderers yield byte chunks; `upload_chunks` pipes them (optionally through
+gzip) into an S3 multipart upload, so at most one part is held in memory whatever
+the report size. Reports smaller than one part are sent with a single `put_object`.
+"""
+import os
+import json
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+# S3 requires parts of at least 5 MiB (except the last one)
+MIN_PART_SIZE = 5 * 1024 * 1024
+PART_SIZE = max(MIN_PART_SIZE, int(os.getenv('AUTOWAR_REPORT_PART_SIZE', str(8 * 1024 * 1024))))
+# results serialized per chunk by `json_report_chunks`
+RESULTS_PER_CHUNK = 100
+
+
+class S3StreamWriter:
+    """File-like writer that uploads to S3 in parts of `part_size` bytes."""
+
+    def __init__(self, s3, bucket: str, key: str, part_size: int = PART_SIZE, **put_args: Any) -> None:
+        self.s3 = s3
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.put_args = put_args
+        self.size = 0
+        self._buffer = bytearray()
+        self._upload_id: Optional[str] = None
+        self._parts = []
+
+    def write(self, data: bytes) -> None:
+        self._buffer += data
+        self.size += len(data)
+        while len(self._buffer) >= self.part_size:
+            self._upload_part(bytes(self._buffer[:self.part_size]))
+            del self._buffer[:self.part_size]
+
+    def _upload_part(self, body: bytes) -> None:
+        if self._upload_id is None:
+            resp = self.s3.create_multipart_upload(Bucket=self.bucket, Key=self.key, **self.put_args)
+            self._upload_id = resp['UploadId']
+        number = len(self._parts) + 1
+        resp = self.s3.upload_part(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                   PartNumber=number, Body=body)
+        self._parts.append({'ETag': resp['ETag'], 'PartNumber': number})
+
+    def close(self) -> None:
+        if self._upload_id is None:
+            self.s3.put_object(Bucket=self.bucket, Key=self.key, Body=bytes(self._buffer), **self.put_args)
+        else:
+            if self._buffer:
+                self._upload_part(bytes(self._buffer))
+            self.s3.complete_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+                                              MultipartUpload={'Parts': self._parts})
+        self._buffer = bytearray()
+
+    def abort(self) -> None:
+        """Drop uploaded parts (they are billed until the upload is aborted)."""
+        if self._upload_id is not None:
+            self.s3.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+            self._upload_id = None
+        self._buffer = bytearray()
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a chunk stream incrementally."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        out = compressor.compress(chunk)
+        if out:
+            yield out
+    yield compressor.flush()
+
+
+def upload_chunks(chunks: Iterable[bytes], s3, bucket: str, key: str, content_type: str,
+                  compress: bool = False, part_size: int = PART_SIZE) -> int:
+    """Stream chunks to s3://bucket/key; returns the stored size. A failure while
+    producing or uploading chunks aborts the upload and re-raises."""
+    put_args: Dict[str, Any] = {'ContentType': content_type}
+    if compress:
+        put_args['ContentEncoding'] = 'gzip'
+        chunks = gzip_chunks(chunks)
+    writer = S3StreamWriter(s3, bucket, key, part_size=part_size, **put_args)
+    try:
+        for chunk in chunks:
+            writer.write(chunk)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    return writer.size
+
+
+def json_report_chunks(content: Dict[str, Any], results_key: str = 'results') -> Iterator[bytes]:
+    """Serialize a report dict as JSON, emitting `results` a slice at a time instead of
+    building the whole document in memory."""
+    head = {k: v for k, v in content.items() if k != results_key}
+    results = content.get(results_key) or []
+    opening = json.dumps(head, default=str)[:-1]
+    yield (opening + (', ' if head else '') + json.dumps(results_key) + ': [').encode('utf-8')
+    for start in range(0, len(results), RESULTS_PER_CHUNK):
+        batch = results[start:start + RESULTS_PER_CHUNK]
+        text = ', '.join(json.dumps(r, default=str) for r in batch)
+        yield ((', ' if start else '') + text).encode('utf-8')
+    yield b']}'
@@ -0,0 +1,457 @@
+"""Typed access layer for the tables described in docs/dynamodb-schema.md.
+
+Key construction and the query for each access pattern live here, so the API and
+the Lambdas never build `Key={...}` by hand. Two key layouts are supported:
+
+- `composite`: the documented single-table keys (`pk=CLIENT#<clientId>`,
+  `sk=EVAL#<evaluationId>`, ...) and GSIs (`evaluationByIdIndex`,
+  `accountEvaluationsIndex`, `statusIndex`, `resourceArnIndex`).
+- `id`: the layout deployed today (hash key `id`, `clientIndex`/`accountIndex`).
+  Patterns without an index in this layout fall back to a filtered parallel scan.
+
+Items are always written with both the `id` and the `pk`/`sk` attributes, so a table
+can be copied from one layout to the other without rewriting items.
+`autowar-reports` is deployed with pk/sk keys and always uses the documented layout.
+"""
+import os
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from .aws_connector import batch_get_items, batch_write_items, get_table, parallel_scan
+
+logger = logging.getLogger('repository')
+
+ID_SCHEMA = 'id'
+COMPOSITE_SCHEMA = 'composite'
+KEY_SCHEMA = os.getenv('AUTOWAR_KEY_SCHEMA', ID_SCHEMA)
+
+CLIENTS_TABLE = os.getenv('AUTOWAR_CLIENTS_TABLE', 'autowar-clients')
+EVALUATIONS_TABLE = os.getenv('AUTOWAR_EVALUATIONS_TABLE', 'autowar-evaluations')
+EVIDENCE_TABLE = os.getenv('AUTOWAR_EVIDENCE_TABLE', 'autowar-evidence-technical')
+REPORTS_TABLE = os.getenv('AUTOWAR_REPORTS_TABLE', 'autowar-reports')
+RESOURCES_TABLE = os.getenv('AUTOWAR_RESOURCES_TABLE', 'autowar-aws-resources')
+
+
+def client_pk(client_id: str) -> str:
+    return f'CLIENT#{client_id}'
+
+
+def evaluation_sk(evaluation_id: str) -> str:
+    return f'EVAL#{evaluation_id}'
+
+
+def account_pk(account_id: str) -> str:
+    return f'ACCOUNT#{account_id}'
+
+
+def evidence_sk(evidence_id: str) -> str:
+    return f'EVID#{evidence_id}'
+
+
+def report_sk(report_id: str) -> str:
+    return f'REPORT#{report_id}'
+
+
+def resource_sk(resource_type: str, resource_id: str) -> str:
+    return f'RESOURCE#{resource_type}#{resource_id}'
+
+
+def blob_pk(content_hash: str) -> str:
+    return f'BLOB#{content_hash}'
+
+
+@dataclass(frozen=True)
+class IndexSpec:
+    """A GSI serving one access pattern: its name, partition attribute and how a
+    lookup value is encoded into that attribute."""
+    name: str
+    attribute: str
+    prefix: str = ''
+
+    def condition(self, value: str):
+        return Key(self.attribute).eq(f'{self.prefix}{value}')
+
+
+def _missing_index(e: ClientError) -> bool:
+    error = e.response.get('Error', {})
+    return error.get('Code') == 'ValidationException' and 'specified index' in error.get('Message', '')
+
+
+class _Repository:
+    # access pattern -> IndexSpec, per key layout
+    INDEXES: Dict[str, Dict[str, IndexSpec]] = {}
+
+    def __init__(self, table, schema: Optional[str] = None) -> None:
+        self.table = get_table(table) if isinstance(table, str) else table
+        self.schema = schema or KEY_SCHEMA
+        if self.schema not in (ID_SCHEMA, COMPOSITE_SCHEMA):
+            raise RuntimeError(f'Unknown key schema {self.schema!r}')
+
+    @property
+    def key_attrs(self) -> Tuple[str, ...]:
+        """Primary key attributes of the table in this layout."""
+        return ('id',) if self.schema == ID_SCHEMA else ('pk', 'sk')
+
+    def query_args(self, pattern: str, value: str) -> Optional[Dict[str, Any]]:
+        """Query kwargs for an access pattern, or None when no index serves it in this layout."""
+        spec = self.INDEXES.get(self.schema, {}).get(pattern)
+        if spec is None:
+            return None
+        return {'IndexName': spec.name, 'KeyConditionExpression': spec.condition(value)}
+
+    def _query(self, kwargs: Dict[str, Any], limit: Optional[int] = None, newest_first: bool = True) -> List[Dict[str, Any]]:
+        kwargs = dict(kwargs, ScanIndexForward=not newest_first)
+        if limit:
+            kwargs['Limit'] = limit
+        items: List[Dict[str, Any]] = []
+        while True:
+            resp = self.table.query(**kwargs)
+            items.extend(resp.get('Items', []))
+            last = resp.get('LastEvaluatedKey')
+            if not last or (limit and len(items) >= limit):
+                return items[:limit] if limit else items
+            kwargs['ExclusiveStartKey'] = last
+
+    def _scan_where(self, attribute: str, value: Any, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        # no index for this pattern in the current layout; Limit on a filtered scan caps
+        # items read, not matches, so stop once `limit` matches arrive
+        items = []
+        for item in parallel_scan(self.table, filter_expression=Attr(attribute).eq(value)):
+            items.append(item)
+            if limit and len(items) >= limit:
+                break
+        return items
+
+    def _find(self, pattern: str, value: str, attribute: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        args = self.query_args(pattern, value)
+        if args is not None:
+            try:
+                return self._query(args, limit)
+            except ClientError as e:
+                # only a GSI not created yet on this table falls back to the scan;
+                # throttling, permissions or a bad condition must surface
+                if not _missing_index(e):
+                    raise
+                logger.warning('Index %s missing on %s, scanning instead', args['IndexName'], self.table.name)
+        return self._scan_where(attribute, value, limit)
+
+
+class ClientRepository(_Repository):
+    def __init__(self, table=CLIENTS_TABLE, schema: Optional[str] = None) -> None:
+        super().__init__(table, schema)
+
+    def key(self, client_id: str) -> Dict[str, str]:
+        if self.schema == ID_SCHEMA:
+            return {'id': client_id}
+        return {'pk': client_pk(client_id), 'sk': 'META#profile'}
+
+    def put(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        item = dict(item, pk=client_pk(item['id']), sk='META#profile')
+        self.table.put_item(Item=item)
+        return item
+
+    def get(self, client_id: str) -> Optional[Dict[str, Any]]:
+        return self.table.get_item(Key=self.key(client_id)).get('Item')
+
+
+class EvaluationRepository(_Repository):
+    INDEXES = {
+        ID_SCHEMA: {
+            'client': IndexSpec('clientIndex', 'client_id'),
+            'account': IndexSpec('accountIndex', 'account_id'),
+        },
+        COMPOSITE_SCHEMA: {
+            'id': IndexSpec('evaluationByIdIndex', 'evaluationId'),
+            'account': IndexSpec('accountEvaluationsIndex', 'account_pk', 'ACCOUNT#'),
+            'status': IndexSpec('statusIndex', 'status'),
+        },
+    }
+
+    def __init__(self, table=EVALUATIONS_TABLE, schema: Optional[str] = None) -> None:
+        super().__init__(table, schema)
+
+    @staticmethod
+    def with_keys(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Return a copy of an evaluation item carrying the key and GSI attributes of both layouts.
+
+        None-valued attributes are dropped: a GSI key attribute (`end_ts`) may be absent
+        but not NULL. `created_at`, the sort key of `evaluationByIdIndex`, is always set
+        so evaluations still in flight resolve by id."""
+        item = {k: v for k, v in item.items() if v is not None}
+        evaluation_id = item.get('evaluationId') or item['id']
+        item.setdefault('id', evaluation_id)
+        item.setdefault('evaluationId', evaluation_id)
+        item.setdefault('created_at', int(time.time()))
+        item['pk'] = client_pk(item['client_id'])
+        item['sk'] = evaluation_sk(evaluation_id)
+        if item.get('account_id'):
+            item['account_pk'] = account_pk(item['account_id'])
+        return item
+
+    def key(self, evaluation_id: str, client_id: Optional[str] = None) -> Dict[str, str]:
+        if self.schema == ID_SCHEMA:
+            return {'id': evaluation_id}
+        if client_id is None:
+            found = self._query(self.query_args('id', evaluation_id), limit=1)
+            if not found:
+                raise KeyError(evaluation_id)
+            client_id = found[0]['client_id']
+        return {'pk': client_pk(client_id), 'sk': evaluation_sk(evaluation_id)}
+
+    def put(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        item = self.with_keys(item)
+        self.table.put_item(Item=item)
+        return item
+
+    def get(self, evaluation_id: str, client_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if self.schema == COMPOSITE_SCHEMA and client_id is None:
+            # one Query on the id index instead of a key lookup + get_item
+            found = self._query(self.query_args('id', evaluation_id), limit=1)
+            return found[0] if found else None
+        return self.table.get_item(Key=self.key(evaluation_id, client_id)).get('Item')
+
+    def get_many(self, refs: List[Tuple[str, Optional[str]]]) -> List[Optional[Dict[str, Any]]]:
+        """Fetch many evaluations with BatchGetItem; `refs` are (evaluation_id, client_id)
+        pairs and the result is aligned with them (None where missing). In the composite
+        layout, refs without a client_id are resolved one by one through the id index."""
+        if self.schema == ID_SCHEMA:
+            return batch_get_items(self.table, [{'id': eid} for eid, _ in refs])
+        keyed = [(i, self.key(eid, cid)) for i, (eid, cid) in enumerate(refs) if cid]
+        found: List[Optional[Dict[str, Any]]] = [None] * len(refs)
+        for (i, _), item in zip(keyed, batch_get_items(self.table, [k for _, k in keyed])):
+            found[i] = item
+        for i, (eid, cid) in enumerate(refs):
+            if not cid:
+                found[i] = self.get(eid)
+        return found
+
+    def update(self, evaluation_id: str, update_expression: str, values: Dict[str, Any],
+               names: Optional[Dict[str, str]] = None, client_id: Optional[str] = None,
+               condition: Optional[str] = None) -> None:
+        kwargs: Dict[str, Any] = {
+            'Key': self.key(evaluation_id, client_id),
+            'UpdateExpression': update_expression,
+            'ExpressionAttributeValues': values,
+        }
+        if names:
+            kwargs['ExpressionAttributeNames'] = names
+        if condition:
+            kwargs['ConditionExpression'] = condition
+        self.table.update_item(**kwargs)
+
+    def for_client(self, client_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Newest evaluations of a client first."""
+        if self.schema == COMPOSITE_SCHEMA:
+            condition = Key('pk').eq(client_pk(client_id)) & Key('sk').begins_with('EVAL#')
+            return self._query({'KeyConditionExpression': condition}, limit)
+        return self._find('client', client_id, 'client_id', limit)
+
+    def for_account(self, account_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return self._find('account', account_id, 'account_id', limit)
+
+    def with_status(self, status: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return self._find('status', status, 'status', limit)
+
+
+class EvidenceRepository(_Repository):
+    INDEXES = {
+        ID_SCHEMA: {
+            'evaluation': IndexSpec('evaluationIdIndex', 'evaluation_id'),
+        },
+        COMPOSITE_SCHEMA: {
+            'resource': IndexSpec('resourceArnIndex', 'resourceArn'),
+            'evaluation': IndexSpec('evaluationIdIndex', 'evaluation_id'),
+        },
+    }
+
+    def __init__(self, table=EVIDENCE_TABLE, schema: Optional[str] = None) -> None:
+        super().__init__(table, schema)
+
+    @staticmethod
+    def item_for_result(client_id: str, evaluation_id: str, result: Dict[str, Any],
+                        ts: Optional[int] = None, seq: Optional[int] = None) -> Dict[str, Any]:
+        """Evidence item for one validator result (`seq` tells apart results of the same
+        validator captured in the same second)."""
+        if not client_id:
+            # pk/sk derive from the client: such a row could not be written in the composite layout
+            raise ValueError(f'Evidence of evaluation {evaluation_id} has no client_id')
+        ts = ts or int(time.time())
+        evidence_id = f"{evaluation_id}#{result.get('name')}#{ts}"
+        if seq is not None:
+            evidence_id = f'{evidence_id}#{seq}'
+        item = {
+            'id': evidence_id,
+            'evaluation_id': evaluation_id,
+            'validator': result.get('name'),
+            'resource': result.get('resource'),
+            'status': result.get('status'),
+            'details': result.get('details'),
+            'created_at': ts,
+            'captured_at': ts,
+            'client_id': client_id,
+            'pk': client_pk(client_id),
+            'sk': evidence_sk(evidence_id),
+        }
+        if result.get('resource'):
+            item['resourceArn'] = result['resource']
+        return item
+
+    def blob_key(self, content_hash: str) -> Dict[str, str]:
+        """Key of the content-addressed item holding a details payload."""
+        if self.schema == ID_SCHEMA:
+            return {'id': blob_pk(content_hash)}
+        return {'pk': blob_pk(content_hash), 'sk': 'BLOB'}
+
+    def put(self, item: Dict[str, Any]) -> None:
+        self.table.put_item(Item=item)
+
+    def put_many(self, items: List[Dict[str, Any]]) -> int:
+        return batch_write_items(self.table, items, key_attrs=self.key_attrs)
+
+    def get_blobs(self, hashes: List[str], projection: Optional[str] = None,
+                  names: Optional[Dict[str, str]] = None) -> List[Optional[Dict[str, Any]]]:
+        return batch_get_items(self.table, [self.blob_key(h) for h in hashes], projection=projection,
+                               expression_attribute_names=names)
+
+    def extend_blob_ttl(self, content_hash: str, ttl: int) -> None:
+        """Push a blob's expiry out to `ttl`; never shortens it."""
+        try:
+            self.table.update_item(
+                Key=self.blob_key(content_hash),
+                UpdateExpression='SET #ttl = :t',
+                ConditionExpression='attribute_exists(#ttl) AND #ttl < :t',
+                ExpressionAttributeNames={'#ttl': 'ttl'},
+                ExpressionAttributeValues={':t': ttl},
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+
+    def clear_blob_ttl(self, content_hash: str) -> None:
+        """Make a blob permanent (a row that never expires references it)."""
+        try:
+            self.table.update_item(
+                Key=self.blob_key(content_hash),
+                UpdateExpression='REMOVE #ttl',
+                ConditionExpression='attribute_exists(#ttl)',
+                ExpressionAttributeNames={'#ttl': 'ttl'},
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ConditionalCheckFailedException':
+                raise
+
+    def for_evaluation(self, evaluation_id: str, client_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Evidence rows of one evaluation (evidence ids start with the evaluation id)."""
+        if self.schema == COMPOSITE_SCHEMA and client_id:
+            condition = Key('pk').eq(client_pk(client_id)) & Key('sk').begins_with(evidence_sk(f'{evaluation_id}#'))
+            return self._query({'KeyConditionExpression': condition}, newest_first=False)
+        return self._find('evaluation', evaluation_id, 'evaluation_id')
+
+    def for_resource(self, resource_arn: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._find('resource', resource_arn, 'resourceArn', limit)
+
+
+class InventoryRepository(_Repository):
+    INDEXES = {
+        COMPOSITE_SCHEMA: {
+            'arn': IndexSpec('resourceArnIndex', 'resourceArn'),
+            'type': IndexSpec('typeIndex', 'resourceType'),
+        },
+    }
+
+    def __init__(self, table=RESOURCES_TABLE, schema: Optional[str] = None) -> None:
+        super().__init__(table, schema)
+
+    @staticmethod
+    def with_keys(item: Dict[str, Any]) -> Dict[str, Any]:
+        """Copy of an inventory item carrying the key attributes of both layouts."""
+        item = dict(item)
+        item['id'] = f"{item['client_id']}#{item['resourceArn']}"
+        item['pk'] = client_pk(item['client_id'])
+        item['sk'] = resource_sk(item['resourceType'], item['resourceId'])
+        return item
+
+    def put_many(self, items: List[Dict[str, Any]]) -> int:
+        return batch_write_items(self.table, [self.with_keys(i) for i in items], key_attrs=self.key_attrs)
+
+    def for_client(self, client_id: str, account_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if self.schema == COMPOSITE_SCHEMA:
+            condition = Key('pk').eq(client_pk(client_id)) & Key('sk').begins_with('RESOURCE#')
+            items = self._query({'KeyConditionExpression': condition}, newest_first=False)
+        else:
+            items = self._scan_where('client_id', client_id)
+        return [i for i in items if account_id is None or i.get('account_id') == account_id]
+
+    def by_arn(self, resource_arn: str) -> List[Dict[str, Any]]:
+        return self._find('arn', resource_arn, 'resourceArn')
+
+
+class ReportRepository(_Repository):
+    INDEXES = {
+        ID_SCHEMA: {'evaluation': IndexSpec('evaluationIndex', 'evaluationId')},
+        COMPOSITE_SCHEMA: {'evaluation': IndexSpec('evaluationIndex', 'evaluationId')},
+    }
+
+    def __init__(self, table=REPORTS_TABLE, schema: Optional[str] = None) -> None:
+        super().__init__(table, schema)
+
+    @property
+    def key_attrs(self) -> Tuple[str, ...]:
+        # autowar-reports is keyed pk/sk in both layouts
+        return ('pk', 'sk')
+
+    @staticmethod
+    def key(client_id: str, report_id: str) -> Dict[str, str]:
+        return {'pk': client_pk(client_id), 'sk': report_sk(report_id)}
+
+    def put_pending(self, client_id: str, evaluation_id: str, ts: Optional[int] = None) -> Dict[str, Any]:
+        """Report metadata for an evaluation (one report per evaluation: reportId = evaluationId)."""
+        item = dict(self.key(client_id, evaluation_id), **{
+            'id': evaluation_id,
+            'client_id': client_id,
+            'evaluationId': evaluation_id,
+            'status': 'PENDING',
+            'created_at': ts or int(time.time()),
+        })
+        self.table.put_item(Item=item)
+        return item
+
+    def mark_completed(self, client_id: str, evaluation_id: str, s3_key: str, ts: Optional[int] = None, **extra: Any) -> None:
+        # generated_at is the evaluationIndex sort key: the item enters the index here
+        values: Dict[str, Any] = {':s': 'COMPLETED', ':k': s3_key, ':g': ts or int(time.time()), ':e': evaluation_id}
+        names = {'#s': 'status'}
+        sets = ['#s = :s', 's3_key = :k', 'generated_at = :g', 'evaluationId = :e']
+        for i, (name, value) in enumerate(sorted(extra.items())):
+            sets.append(f'#x{i} = :x{i}')
+            names[f'#x{i}'] = name
+            values[f':x{i}'] = value
+        self.table.update_item(
+            Key=self.key(client_id, evaluation_id),
+            UpdateExpression='SET ' + ', '.join(sets),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+    def completed_item(self, client_id: str, evaluation_id: str, s3_key: str, ts: Optional[int] = None,
+                       created_at: Optional[int] = None, **extra: Any) -> Dict[str, Any]:
+        """Full COMPLETED report item, for writing many reports with `put_many`
+        (replaces the PENDING item instead of updating it)."""
+        ts = ts or int(time.time())
+        return dict(extra, **self.key(client_id, evaluation_id), **{
+            'id': evaluation_id,
+            'client_id': client_id,
+            'evaluationId': evaluation_id,
+            'status': 'COMPLETED',
+            's3_key': s3_key,
+            'created_at': created_at or ts,
+            'generated_at': ts,
+        })
+
+    def put_many(self, items: List[Dict[str, Any]]) -> int:
+        return batch_write_items(self.table, items, key_attrs=self.key_attrs)
+
+    def for_evaluation(self, evaluation_id: str) -> List[Dict[str, Any]]:
+        return self._query(self.query_args('evaluation', evaluation_id))
@@ -0,0 +1,77 @@
+import gzip
+import json
+import os
+from decimal import Decimal
+from typing import Any, Mapping, Optional
+from fastapi.responses import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised only without orjson installed
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed (compression overhead outweighs the gain)
+COMPRESS_MIN_BYTES = int(os.getenv('AUTOWAR_COMPRESS_MIN_BYTES', '1024'))
+GZIP_LEVEL = 5
+
+
+def _default(obj: Any) -> Any:
+    """Serialize the types boto3 returns for DynamoDB items."""
+    if isinstance(obj, Decimal):
+        # Dynamo numbers are Decimals; keep integers exact
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (bytes, bytearray)):
+        return obj.decode('utf-8', errors='replace')
+    if hasattr(obj, 'dict'):
+        return obj.dict()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class FastJSONResponse(Response):
+    """JSON response rendered with orjson (stdlib fallback) that understands DynamoDB `Decimal`s.
+
+    Return it directly from an endpoint to bypass FastAPI's `jsonable_encoder`. When
+    `accept_encoding` is given (the request's `Accept-Encoding` header) and the body is
+    at least `COMPRESS_MIN_BYTES`, the body is compressed with br (if the `brotli`
+    package is installed) or gzip.
+    """
+    media_type = 'application/json'
+
+    def __init__(self, content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None,
+                 accept_encoding: Optional[str] = None, **kwargs: Any) -> None:
+        self.accept_encoding = accept_encoding
+        super().__init__(content, status_code=status_code, headers=headers, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        body = dumps(content)
+        if self.accept_encoding is None or len(body) < COMPRESS_MIN_BYTES:
+            return body
+        accepted = {e.split(';')[0].strip() for e in self.accept_encoding.lower().split(',')}
+        if brotli is not None and 'br' in accepted:
+            self._encoding = 'br'
+            return brotli.compress(body, quality=4)
+        if 'gzip' in accepted:
+            self._encoding = 'gzip'
+            return gzip.compress(body, compresslevel=GZIP_LEVEL)
+        return body
+
+    def init_headers(self, headers: Optional[Mapping[str, str]] = None) -> None:
+        super().init_headers(headers)
+        encoding = getattr(self, '_encoding', None)
+        if encoding:
+            self.raw_headers.append((b'content-encoding', encoding.encode('latin-1')))
+        if self.accept_encoding is not None:
+            self.raw_headers.append((b'vary', b'Accept-Encoding'))
@@ -0,0 +1,144 @@
+"""Delta score updates for single result changes.
+
+When one validator is re-run (or a remediation is verified) only the BPs it maps
+to change. Their question, pillar and total scores are moved with the stored
+partial sums (`scoring.ScoreState`) and written back with one conditional
+`update_item` on the evaluation: only the touched map entries are set, guarded by
+`score_version` so concurrent updates retry instead of overwriting each other.
+Sums stored under another catalog version (weights or BP parents changed) are not
+moved: the state is rebuilt from the results and written whole with the new
+`catalog_version`.
+"""
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from botocore.exceptions import ClientError
+from .catalog import load_catalog
+from .scoring import (ScoringModel, ScoreState, bp_scores_from_results, default_model,
+                      state_from_item, state_to_dynamo, to_decimal)
+
+MAX_ATTEMPTS = 3
+
+
+def _conditional_failed(e: ClientError) -> bool:
+    return e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+def _score_update(state: ScoreState, legacy: bool, changes: Mapping[str, Optional[float]],
+                  touched: List[Tuple[str, str]]) -> Tuple[List[str], List[str], Dict[str, Any], Dict[str, str]]:
+    """SET/REMOVE clauses, values and names writing a state after `changes`."""
+    sets: List[str] = []
+    removes: List[str] = []
+    values: Dict[str, Any] = {}
+    names: Dict[str, str] = {}
+    if legacy:
+        # first delta on an evaluation without stored sums: write the whole state
+        for i, (attr, value) in enumerate(state_to_dynamo(state).items()):
+            sets.append(f'#s{i} = :s{i}')
+            names[f'#s{i}'] = attr
+            values[f':s{i}'] = value
+        return sets, removes, values, names
+    scores = state.scores()
+    names.update({'#sums': 'score_sums', '#qs': 'questions', '#ps': 'pillars', '#tot': 'total'})
+    for i, bp_id in enumerate(changes):
+        names[f'#b{i}'] = bp_id
+        if bp_id in state.bp_scores:
+            sets.append(f'bp_scores.#b{i} = :b{i}')
+            values[f':b{i}'] = to_decimal(state.bp_scores[bp_id])
+        else:
+            removes.append(f'bp_scores.#b{i}')
+    for kind, group, short, attr in (('question', state.questions, 'q', 'question_scores'),
+                                     ('pillar', state.pillars, 'p', 'pillar_scores')):
+        keys = list(dict.fromkeys(t[0 if kind == 'question' else 1] for t in touched))
+        for i, key in enumerate(keys):
+            names[f'#{short}{i}'] = key
+            n, d = group[key]
+            sets.append(f'#sums.#{short}s.#{short}{i} = :{short}s{i}')
+            values[f':{short}s{i}'] = [to_decimal(n), to_decimal(d)]
+            score = scores[attr].get(key)
+            if score is None:
+                removes.append(f'{attr}.#{short}{i}')
+            else:
+                sets.append(f'{attr}.#{short}{i} = :{short}v{i}')
+                values[f':{short}v{i}'] = to_decimal(score)
+    sets.append('#sums.#tot = :tot')
+    values[':tot'] = [to_decimal(state.total[0]), to_decimal(state.total[1])]
+    sets.append('score_total = :total')
+    values[':total'] = to_decimal(scores['score_total'])
+    sets.append('score_version = :v1')
+    values[':v1'] = state.version
+    return sets, removes, values, names
+
+
+def _apply(evaluations, evaluation_id: str, client_id: Optional[str], model: ScoringModel, build) -> Dict[str, Any]:
+    """Read-modify-write loop: `build(item)` returns (BP changes, extra SET clauses, values)."""
+    catalog_version = load_catalog().version
+    for _ in range(MAX_ATTEMPTS):
+        item = evaluations.get(evaluation_id, client_id=client_id)
+        if item is None:
+            raise KeyError(evaluation_id)
+        changes, extra_sets, extra_values = build(item)
+        # stored sums are only valid for the catalog they were computed with
+        state = state_from_item(item) if item.get('catalog_version') == catalog_version else None
+        legacy = state is None
+        stored_version = item.get('score_version')
+        if legacy:
+            state = model.build_state(bp_scores_from_results(item.get('results') or []),
+                                      version=int(stored_version or 0))
+        version = state.version
+        touched = [t for t in (model.apply(state, bp_id, score) for bp_id, score in changes.items()) if t]
+        if not touched and not extra_sets and not legacy:
+            return state.scores()
+        state.version = version + 1
+        sets, removes, values, names = _score_update(state, legacy, changes, touched)
+        if legacy:
+            sets.append('catalog_version = :cv')
+            values[':cv'] = catalog_version
+        expression = 'SET ' + ', '.join(sets + extra_sets)
+        if removes:
+            expression += ' REMOVE ' + ', '.join(removes)
+        values.update(extra_values)
+        if stored_version is None:
+            condition = 'attribute_not_exists(score_version)'
+        else:
+            condition = 'score_version = :v0'
+            values[':v0'] = version
+        try:
+            evaluations.update(evaluation_id, expression, values, names, client_id=client_id, condition=condition)
+            return state.scores()
+        except ClientError as e:
+            if not _conditional_failed(e):
+                raise
+    raise RuntimeError(f'Evaluation {evaluation_id} scores changed concurrently {MAX_ATTEMPTS} times, giving up')
+
+
+def update_scores(evaluations, evaluation_id: str, changes: Mapping[str, Optional[float]],
+                  client_id: Optional[str] = None, model: Optional[ScoringModel] = None) -> Dict[str, Any]:
+    """Apply BP score changes ({bp_id: score or None}) to a stored evaluation."""
+    return _apply(evaluations, evaluation_id, client_id, model or default_model(), lambda item: (changes, [], {}))
+
+
+def record_result(evaluations, evaluation_id: str, result: Dict[str, Any], client_id: Optional[str] = None,
+                  model: Optional[ScoringModel] = None,
+                  validator_bps: Optional[Mapping[str, Any]] = None) -> Dict[str, Any]:
+    """Store a re-run validator result (replacing the one for the same validator and
+    resource) and move only the scores of the BPs that validator maps to."""
+    validator_bps = load_catalog().validator_bps if validator_bps is None else validator_bps
+    affected = tuple(validator_bps.get(result.get('name'), ()))
+
+    def build(item):
+        results = list(item.get('results') or [])
+        index = next((i for i, r in enumerate(results)
+                      if r.get('name') == result.get('name') and r.get('resource') == result.get('resource')), None)
+        if index is None:
+            extra = ['results = list_append(if_not_exists(results, :empty), :new)']
+            values = {':new': [result], ':empty': []}
+            results.append(result)
+        else:
+            extra = [f'results[{index}] = :new']
+            values = {':new': result}
+            results[index] = result
+        # only results of validators sharing the affected BPs matter for their scores
+        related = [r for r in results if set(validator_bps.get(r.get('name'), ())) & set(affected)]
+        scores = bp_scores_from_results(related, validator_bps)
+        return {bp_id: scores.get(bp_id) for bp_id in affected}, extra, values
+
+    return _apply(evaluations, evaluation_id, client_id, model or default_model(), build)
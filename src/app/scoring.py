@@ -0,0 +1,247 @@
+"""Multilevel WAF scoring: best practice -> question -> pillar -> total (0-100).
+
+The catalog is compiled once into weight matrices: `bp_to_question` (questions x
+BPs) and `question_to_pillar` (pillars x questions), plus the pillar weights. An
+evaluation becomes a vector of BP scores (NaN where the BP was not evaluated) and
+each level is a weighted mean of the level below, computed for a whole batch of
+evaluations with two matrix products per level. Unevaluated BPs/questions/pillars
+drop out of the weights instead of counting as zero.
+
+For single-result changes (a re-run validator, a verified remediation) the
+weighted sums behind each score are kept in a `ScoreState`; `ScoringModel.apply`
+moves one BP score and updates only its question, pillar and the total.
+
+The catalog (best practices, weights and the validator mapping) lives in
+`app.catalog`; `default_model` returns the model compiled from it.
+"""
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+import numpy as np
+
+# validator status -> BP score; other statuses (ERROR, SKIPPED...) are not scored
+STATUS_SCORES = {'PASS': 100.0, 'WARN': 50.0, 'PARTIAL': 50.0, 'FAIL': 0.0}
+
+
+@dataclass(frozen=True)
+class BestPractice:
+    bp_id: str
+    question_id: str
+    pillar: str
+    weight: float = 1.0
+
+
+@dataclass
+class ScoreState:
+    """Partial sums behind an evaluation's scores: [weighted sum, weight sum] of the
+    evaluated children of each question, pillar and of the total."""
+    bp_scores: Dict[str, float] = field(default_factory=dict)
+    questions: Dict[str, List[float]] = field(default_factory=dict)
+    pillars: Dict[str, List[float]] = field(default_factory=dict)
+    total: List[float] = field(default_factory=lambda: [0.0, 0.0])
+    version: int = 0
+
+    @staticmethod
+    def mean(sums: Optional[Sequence[float]]) -> Optional[float]:
+        return sums[0] / sums[1] if sums and sums[1] > 0 else None
+
+    def scores(self) -> Dict[str, Any]:
+        def present(groups):
+            return {k: round(v, 2) for k, v in ((k, self.mean(s)) for k, s in groups.items()) if v is not None}
+        total = self.mean(self.total)
+        return {
+            'score_total': None if total is None else round(total, 2),
+            'pillar_scores': present(self.pillars),
+            'question_scores': present(self.questions),
+        }
+
+
+def _shift(sums: List[float], weight: float, old: Optional[float], new: Optional[float]) -> None:
+    if old is not None:
+        sums[0] -= weight * old
+        sums[1] -= weight
+    if new is not None:
+        sums[0] += weight * new
+        sums[1] += weight
+    if abs(sums[1]) < 1e-9:
+        # nothing evaluated any more: drop float residue
+        sums[0] = sums[1] = 0.0
+
+
+def _weighted_mean(values: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """Row-wise weighted means of `values` (n x k, NaN = missing) under each row of
+    `weights` (m x k); returns n x m, NaN where no weighted value is present."""
+    present = ~np.isnan(values)
+    numerator = np.where(present, values, 0.0) @ weights.T
+    denominator = present.astype(float) @ weights.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        out = numerator / denominator
+    out[denominator == 0] = np.nan
+    return out
+
+
+class ScoringModel:
+    """Weight matrices of a catalog; immutable once built."""
+
+    def __init__(self, best_practices: Sequence[BestPractice], question_weights: Optional[Mapping[str, float]] = None,
+                 pillar_weights: Optional[Mapping[str, float]] = None) -> None:
+        question_weights = question_weights or {}
+        pillar_weights = pillar_weights or {}
+        self.bp_ids = tuple(dict.fromkeys(bp.bp_id for bp in best_practices))
+        self.question_ids = tuple(dict.fromkeys(bp.question_id for bp in best_practices))
+        self.pillars = tuple(dict.fromkeys(bp.pillar for bp in best_practices))
+        self.bp_index = {b: i for i, b in enumerate(self.bp_ids)}
+        question_index = {q: i for i, q in enumerate(self.question_ids)}
+        pillar_index = {p: i for i, p in enumerate(self.pillars)}
+
+        self.bp_to_question = np.zeros((len(self.question_ids), len(self.bp_ids)))
+        self.question_to_pillar = np.zeros((len(self.pillars), len(self.question_ids)))
+        for bp in best_practices:
+            q = question_index[bp.question_id]
+            self.bp_to_question[q, self.bp_index[bp.bp_id]] = bp.weight
+            self.question_to_pillar[pillar_index[bp.pillar], q] = question_weights.get(bp.question_id, 1.0)
+        self.pillar_weights = np.array([[pillar_weights.get(p, 1.0) for p in self.pillars]])
+        for matrix in (self.bp_to_question, self.question_to_pillar, self.pillar_weights):
+            matrix.setflags(write=False)
+        # parent and weight of each node, for delta updates
+        self.bp_parent = {bp.bp_id: (bp.question_id, bp.weight) for bp in best_practices}
+        self.question_parent = {bp.question_id: (bp.pillar, question_weights.get(bp.question_id, 1.0))
+                                for bp in best_practices}
+        self.pillar_weight = {p: pillar_weights.get(p, 1.0) for p in self.pillars}
+
+    def build_state(self, bp_scores: Mapping[str, float], version: int = 0) -> ScoreState:
+        """Partial sums for a full set of BP scores."""
+        state = ScoreState(version=version)
+        for bp_id, score in bp_scores.items():
+            self.apply(state, bp_id, score)
+        return state
+
+    def apply(self, state: ScoreState, bp_id: str, score: Optional[float]) -> Optional[Tuple[str, str]]:
+        """Set one BP score (None = not evaluated) and update its question, pillar and
+        the total in O(1). Returns the (question, pillar) touched, None if nothing changed."""
+        if bp_id not in self.bp_parent:
+            return None
+        old = state.bp_scores.get(bp_id)
+        score = None if score is None else float(score)
+        if old == score:
+            return None
+        if score is None:
+            del state.bp_scores[bp_id]
+        else:
+            state.bp_scores[bp_id] = score
+        question, weight = self.bp_parent[bp_id]
+        sums = state.questions.setdefault(question, [0.0, 0.0])
+        before = state.mean(sums)
+        _shift(sums, weight, old, score)
+        pillar, weight = self.question_parent[question]
+        sums_p = state.pillars.setdefault(pillar, [0.0, 0.0])
+        before_p = state.mean(sums_p)
+        _shift(sums_p, weight, before, state.mean(sums))
+        _shift(state.total, self.pillar_weight[pillar], before_p, state.mean(sums_p))
+        return question, pillar
+
+    def vector(self, bp_scores: Mapping[str, float]) -> np.ndarray:
+        """BP score vector in catalog order (NaN for BPs not evaluated)."""
+        v = np.full(len(self.bp_ids), np.nan)
+        for bp_id, score in bp_scores.items():
+            i = self.bp_index.get(bp_id)
+            if i is not None and score is not None:
+                v[i] = float(score)
+        return v
+
+    def score_matrix(self, bp_matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(question, pillar, total) scores for an evaluations x BPs matrix."""
+        questions = _weighted_mean(bp_matrix, self.bp_to_question)
+        pillars = _weighted_mean(questions, self.question_to_pillar)
+        total = _weighted_mean(pillars, self.pillar_weights)[:, 0]
+        return questions, pillars, total
+
+    def score_batch(self, bp_scores: Iterable[Mapping[str, float]]) -> List[Dict[str, Any]]:
+        """Scores of many evaluations (e.g. a backfill) with one pass of matrix products."""
+        rows = [self.vector(s) for s in bp_scores]
+        if not rows:
+            return []
+        questions, pillars, total = self.score_matrix(np.vstack(rows))
+        return [self._as_dict(questions[i], pillars[i], total[i]) for i in range(len(rows))]
+
+    def score(self, bp_scores: Mapping[str, float]) -> Dict[str, Any]:
+        return self.score_batch([bp_scores])[0]
+
+    def _as_dict(self, questions: np.ndarray, pillars: np.ndarray, total: float) -> Dict[str, Any]:
+        def present(ids, values):
+            return {k: round(float(v), 2) for k, v in zip(ids, values) if not np.isnan(v)}
+        return {
+            'score_total': None if np.isnan(total) else round(float(total), 2),
+            'pillar_scores': present(self.pillars, pillars),
+            'question_scores': present(self.question_ids, questions),
+        }
+
+
+def bp_scores_from_results(results: Iterable[Mapping[str, Any]],
+                           validator_bps: Optional[Mapping[str, Sequence[str]]] = None) -> Dict[str, float]:
+    """BP scores of an evaluation: the mean score of the validator results mapped to each BP."""
+    if validator_bps is None:
+        from .catalog import load_catalog
+        validator_bps = load_catalog().validator_bps
+    totals: Dict[str, List[float]] = {}
+    for r in results or []:
+        score = STATUS_SCORES.get(r.get('status'))
+        if score is None:
+            continue
+        for bp_id in validator_bps.get(r.get('name') or r.get('validator'), ()):
+            totals.setdefault(bp_id, []).append(score)
+    return {bp_id: sum(v) / len(v) for bp_id, v in totals.items()}
+
+
+def default_model() -> ScoringModel:
+    """Scoring model of the process-wide WAF catalog (`app.catalog`)."""
+    from .catalog import load_catalog
+    return load_catalog().scoring_model
+
+
+def score_evaluations(evaluations: Sequence[Mapping[str, Any]], model: Optional[ScoringModel] = None) -> List[Dict[str, Any]]:
+    """Scores of evaluation items computed from their stored results."""
+    model = model or default_model()
+    return model.score_batch([bp_scores_from_results(e.get('results') or []) for e in evaluations])
+
+
+def to_decimal(v: Optional[float]) -> Optional[Decimal]:
+    return None if v is None else Decimal(repr(float(v)))
+
+
+def to_dynamo(scores: Dict[str, Any]) -> Dict[str, Any]:
+    """Scores with floats as Decimal, as boto3 requires for DynamoDB numbers."""
+    return {
+        'score_total': to_decimal(scores['score_total']),
+        'pillar_scores': {k: to_decimal(v) for k, v in scores['pillar_scores'].items()},
+        'question_scores': {k: to_decimal(v) for k, v in scores['question_scores'].items()},
+    }
+
+
+def state_to_dynamo(state: ScoreState) -> Dict[str, Any]:
+    """Evaluation attributes for a score state: the scores plus the sums and BP scores
+    that delta updates start from."""
+    item = to_dynamo(state.scores())
+    item['bp_scores'] = {k: to_decimal(v) for k, v in state.bp_scores.items()}
+    item['score_sums'] = {
+        'questions': {k: [to_decimal(n), to_decimal(d)] for k, (n, d) in state.questions.items()},
+        'pillars': {k: [to_decimal(n), to_decimal(d)] for k, (n, d) in state.pillars.items()},
+        'total': [to_decimal(state.total[0]), to_decimal(state.total[1])],
+    }
+    item['score_version'] = state.version
+    return item
+
+
+def state_from_item(item: Mapping[str, Any]) -> Optional[ScoreState]:
+    """The stored score state of an evaluation, None when it has none (scored before
+    delta updates existed, or never scored)."""
+    sums = item.get('score_sums')
+    if not sums:
+        return None
+    return ScoreState(
+        bp_scores={k: float(v) for k, v in (item.get('bp_scores') or {}).items()},
+        questions={k: [float(n), float(d)] for k, (n, d) in (sums.get('questions') or {}).items()},
+        pillars={k: [float(n), float(d)] for k, (n, d) in (sums.get('pillars') or {}).items()},
+        total=[float(x) for x in sums.get('total') or (0, 0)],
+        version=int(item.get('score_version') or 0),
+    )
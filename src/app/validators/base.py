@@ -4,5 +4,7 @@ from typing import Optional, Dict, Any
 class ValidatorBase:
     name: str = 'base'
 
-    def run(self, name: str, region: Optional[str] = None, account_id: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def run(self, name: str, region: Optional[str] = None, account_id: Optional[str] = None, extra: Optional[Dict[str, Any]] = None, session: Optional[Any] = None) -> Dict[str, Any]:
+        """Run the check. `session` is a boto3 Session for the evaluated account; when
+        omitted the default credential chain is used."""
         raise NotImplementedError()
@@ -6,8 +6,8 @@ from .base import ValidatorBase
 class ConfigRecorderValidator(ValidatorBase):
     name = 'config-recorder'
 
-    def run(self, name: str = None, region: str = None, account_id: str = None, extra=None):
-        cfg = boto3.client('config', region_name=region)
+    def run(self, name: str = None, region: str = None, account_id: str = None, extra=None, session=None):
+        cfg = (session or boto3).client('config', region_name=region)
         result = {'name': self.name}
         try:
             recs = cfg.describe_configuration_recorders().get('ConfigurationRecorders', [])
@@ -6,8 +6,8 @@ from .base import ValidatorBase
 class IAMPasswordPolicyValidator(ValidatorBase):
     name = 'iam-password-policy'
 
-    def run(self, name: str = None, region: str = None, account_id: str = None, extra=None):
-        iam = boto3.client('iam')
+    def run(self, name: str = None, region: str = None, account_id: str = None, extra=None, session=None):
+        iam = (session or boto3).client('iam')
         result = {'name': self.name}
         try:
             policy = iam.get_account_password_policy()
@@ -31,8 +31,8 @@ class IAMPasswordPolicyValidator(ValidatorBase):
 class RootMFAValidator(ValidatorBase):
     name = 'iam-root-mfa'
 
-    def run(self, name: str = None, region: str = None, account_id: str = None, extra=None):
-        iam = boto3.client('iam')
+    def run(self, name: str = None, region: str = None, account_id: str = None, extra=None, session=None):
+        iam = (session or boto3).client('iam')
         result = {'name': self.name}
         try:
             summary = iam.get_account_summary()
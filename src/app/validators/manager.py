@@ -1,24 +1,41 @@
+"""Validator execution.
 
-from typing import List, Dict, Any
-from .s3_validators import S3PublicAccessValidator
-from .iam_validators import IAMPasswordPolicyValidator, RootMFAValidator
-from .cloudtrail_validators import CloudTrailLoggingValidator
-from .config_validators import ConfigRecorderValidator
-from .vpc_validators import VPCFlowLogsValidator
-from .waf_validators import WAFWebACLPresenceValidator
+`VALIDATOR_MAP` is a lazy registry: validator modules are imported the first
+time an evaluation targets their type (see `registry`).
+"""
+from typing import List, Dict, Any, Callable, Optional
+from .registry import ACCOUNT_SCOPE, ValidatorRegistry, ValidatorSpec
 
+_P = __package__
 
-VALIDATOR_MAP = {
-    's3': [S3PublicAccessValidator()],
-    'iam': [IAMPasswordPolicyValidator(), RootMFAValidator()],
-    'cloudtrail': [CloudTrailLoggingValidator()],
-    'config': [ConfigRecorderValidator()],
-    'vpc': [VPCFlowLogsValidator()],
-    'waf': [WAFWebACLPresenceValidator()],
-}
+BUILTIN_VALIDATORS = [
+    ValidatorSpec('s3-public-access', 's3', f'{_P}.s3_validators:S3PublicAccessValidator',
+                  best_practices=('SEC08-BP04',)),
+    ValidatorSpec('iam-password-policy', 'iam', f'{_P}.iam_validators:IAMPasswordPolicyValidator', ACCOUNT_SCOPE,
+                  ('SEC02-BP01',)),
+    ValidatorSpec('iam-root-mfa', 'iam', f'{_P}.iam_validators:RootMFAValidator', ACCOUNT_SCOPE, ('SEC01-BP02',)),
+    ValidatorSpec('cloudtrail-logging', 'cloudtrail', f'{_P}.cloudtrail_validators:CloudTrailLoggingValidator',
+                  ACCOUNT_SCOPE, ('SEC04-BP01', 'OPS08-BP01')),
+    ValidatorSpec('config-recorder', 'config', f'{_P}.config_validators:ConfigRecorderValidator', ACCOUNT_SCOPE,
+                  ('SEC04-BP01',)),
+    ValidatorSpec('vpc-flow-logs', 'vpc', f'{_P}.vpc_validators:VPCFlowLogsValidator',
+                  best_practices=('SEC04-BP01',)),
+    ValidatorSpec('waf-web-acl', 'waf', f'{_P}.waf_validators:WAFWebACLPresenceValidator', ACCOUNT_SCOPE,
+                  ('SEC05-BP02',)),
+]
 
+VALIDATOR_MAP = ValidatorRegistry(BUILTIN_VALIDATORS)
 
-def run_validators_for_evaluation(targets: List[Dict[str, Any]], region: str = None, account_id: str = None) -> List[Dict[str, Any]]:
+
+def run_validators_for_evaluation(targets: List[Dict[str, Any]], region: str = None, account_id: str = None,
+                                  on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                                  session: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """Run the validators registered for each target type.
+
+    `on_result`, when given, is called with every result as soon as it is produced
+    (used to stream evaluation progress). `session` is the boto3 Session for the
+    evaluated account, typically obtained from the credential broker.
+    """
     results = []
     if not targets:
         return results
@@ -28,8 +45,10 @@ def run_validators_for_evaluation(targets: List[Dict[str, Any]], region: str = N
         validators = VALIDATOR_MAP.get(ttype, [])
         for v in validators:
             try:
-                res = v.run(name=name, region=region, account_id=account_id, extra=t.get('extra'))
+                res = v.run(name=name, region=region, account_id=account_id, extra=t.get('extra'), session=session)
             except Exception as e:
                 res = {'name': v.name, 'status': 'ERROR', 'details': str(e)}
             results.append(res)
+            if on_result:
+                on_result(res)
     return results
@@ -0,0 +1,163 @@
+"""Lazy validator registry.
+
+Validators are declared by `ValidatorSpec` (name, target type, scope, BP mapping
+and the `module:Class` implementing it); the module is imported and the validator
+instantiated the first time its target type is evaluated, so loading the package
+costs nothing per declared check.
+
+Out-of-tree check packs register through the `autowar.validators` entry point
+group: each entry point resolves to a `ValidatorSpec` or a list of them, e.g.
+
+    [project.entry-points."autowar.validators"]
+    rds-pack = autowar_rds.specs:SPECS
+
+A spec's `best_practices` feed the catalog's validator mapping for validators the
+catalog itself does not map (`catalog.load_catalog`). A validator that fails to
+import or instantiate is replaced by a stand-in whose runs report ERROR, so one
+broken plugin does not abort the evaluations of its target type.
+"""
+import importlib
+import logging
+import threading
+from collections.abc import MutableMapping
+from dataclasses import dataclass
+from importlib.metadata import entry_points
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger('validators')
+
+ENTRY_POINT_GROUP = 'autowar.validators'
+RESOURCE_SCOPE = 'resource'
+ACCOUNT_SCOPE = 'account'
+
+
+@dataclass(frozen=True)
+class ValidatorSpec:
+    name: str
+    target_type: str
+    # 'package.module:ClassName'
+    entry: str
+    # 'resource': checks the target's named resource; 'account': account-wide check
+    scope: str = RESOURCE_SCOPE
+    best_practices: Tuple[str, ...] = ()
+
+    def load(self) -> Any:
+        module_name, _, attr = self.entry.partition(':')
+        validator = getattr(importlib.import_module(module_name), attr)()
+        if validator.name != self.name:
+            raise RuntimeError(f'Validator {self.entry} is named {validator.name!r}, declared as {self.name!r}')
+        return validator
+
+
+class _UnloadableValidator:
+    """Stands in for a validator whose module or class could not be loaded."""
+
+    def __init__(self, spec: ValidatorSpec, error: Exception) -> None:
+        self.name = spec.name
+        self._message = f'Validator {spec.entry} could not be loaded: {error!r}'
+
+    def run(self, **kwargs: Any) -> Dict[str, Any]:
+        raise RuntimeError(self._message)
+
+
+def _load(spec: ValidatorSpec) -> Any:
+    try:
+        return spec.load()
+    except Exception as e:
+        logger.exception('Could not load validator %s (%s)', spec.name, spec.entry)
+        return _UnloadableValidator(spec, e)
+
+
+class ValidatorRegistry(MutableMapping):
+    """target type -> validator instances, loaded on first lookup.
+
+    Assigning a list of instances to a target type replaces its declared
+    validators (used by tests and embedding code)."""
+
+    def __init__(self, specs: Iterable[ValidatorSpec] = (), entry_point_group: str = ENTRY_POINT_GROUP) -> None:
+        self._specs: Dict[str, List[ValidatorSpec]] = {}
+        self._loaded: Dict[str, List[Any]] = {}
+        self._group = entry_point_group
+        self._discovered = entry_point_group is None
+        self._lock = threading.RLock()
+        for spec in specs:
+            self.register(spec)
+
+    def register(self, spec: ValidatorSpec) -> None:
+        with self._lock:
+            specs = self._specs.setdefault(spec.target_type, [])
+            if any(s.name == spec.name for s in specs):
+                raise RuntimeError(f'Validator {spec.name!r} already registered for {spec.target_type!r}')
+            specs.append(spec)
+            self._loaded.pop(spec.target_type, None)
+
+    def _discover(self) -> None:
+        """Read plugin declarations from entry points (once; only their spec modules are imported)."""
+        if self._discovered:
+            return
+        with self._lock:
+            if self._discovered:
+                return
+            self._discovered = True
+            for ep in entry_points(group=self._group):
+                try:
+                    declared = ep.load()
+                    for spec in [declared] if isinstance(declared, ValidatorSpec) else list(declared):
+                        self.register(spec)
+                except Exception:
+                    logger.exception('Could not load validator plugin %s', ep.name)
+
+    def specs(self, target_type: str) -> List[ValidatorSpec]:
+        self._discover()
+        return list(self._specs.get(target_type, []))
+
+    def all_specs(self) -> List[ValidatorSpec]:
+        """Every declared spec, built-in and discovered, without importing the validators."""
+        self._discover()
+        return [spec for specs in list(self._specs.values()) for spec in specs]
+
+    def scopes(self, target_type: str) -> List[Tuple[str, Optional[str]]]:
+        """(name, scope) of a target type's validators; scope is None for validators
+        assigned directly rather than declared."""
+        if target_type in self._loaded and target_type not in self._specs:
+            return [(v.name, None) for v in self._loaded[target_type]]
+        return [(s.name, s.scope) for s in self.specs(target_type)]
+
+    def names(self, target_type: str) -> List[str]:
+        """Validator names for a target type, without importing them."""
+        return [name for name, _ in self.scopes(target_type)]
+
+    def loaded_types(self) -> List[str]:
+        return list(self._loaded)
+
+    def __getitem__(self, target_type: str) -> List[Any]:
+        self._discover()
+        loaded = self._loaded.get(target_type)
+        if loaded is not None:
+            return loaded
+        with self._lock:
+            if target_type not in self._loaded:
+                specs = self._specs.get(target_type)
+                if not specs:
+                    raise KeyError(target_type)
+                self._loaded[target_type] = [_load(s) for s in specs]
+            return self._loaded[target_type]
+
+    def __setitem__(self, target_type: str, validators: List[Any]) -> None:
+        with self._lock:
+            self._specs.pop(target_type, None)
+            self._loaded[target_type] = list(validators)
+
+    def __delitem__(self, target_type: str) -> None:
+        with self._lock:
+            found = self._specs.pop(target_type, None) is not None
+            found = self._loaded.pop(target_type, None) is not None or found
+            if not found:
+                raise KeyError(target_type)
+
+    def __iter__(self) -> Iterator[str]:
+        self._discover()
+        return iter(list(dict.fromkeys(list(self._specs) + list(self._loaded))))
+
+    def __len__(self) -> int:
+        return len(list(iter(self)))
@@ -6,12 +6,12 @@ from .base import ValidatorBase
 class S3PublicAccessValidator(ValidatorBase):
     name = 's3-public-access'
 
-    def run(self, name: str, region: str = None, account_id: str = None, extra=None):
+    def run(self, name: str, region: str = None, account_id: str = None, extra=None, session=None):
         """
         Check whether an S3 bucket has public access allowed.
         Returns {'name': str, 'status': 'PASS'|'FAIL', 'details': {...}}
         """
-        s3 = boto3.client('s3', region_name=region)
+        s3 = (session or boto3).client('s3', region_name=region)
         result = {'name': self.name, 'resource': name}
         try:
             # Check public access block
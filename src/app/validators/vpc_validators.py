@@ -6,9 +6,9 @@ from .base import ValidatorBase
 class VPCFlowLogsValidator(ValidatorBase):
     name = 'vpc-flow-logs'
 
-    def run(self, name: str, region: str = None, account_id: str = None, extra=None):
+    def run(self, name: str, region: str = None, account_id: str = None, extra=None, session=None):
         """Expect `name` to be a VPC id (e.g., vpc-xxxx)."""
-        ec2 = boto3.client('ec2', region_name=region)
+        ec2 = (session or boto3).client('ec2', region_name=region)
         result = {'name': self.name, 'resource': name}
         try:
             resp = ec2.describe_flow_logs(Filters=[{'Name': 'resource-id', 'Values': [name]}])
@@ -1,190 +1,391 @@
 import os
 import json
 import time
+import threading
 import boto3
-from typing import Dict, Any
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from typing import Dict, Any, List, Tuple
 from botocore.exceptions import ClientError
-from app.credentials_manager import assume_role
+from app.dynamo_metrics import flush_metrics, instrument_resource
+from app.credentials_manager import (
+    assume_role,
+    backfill_lifecycle_indexes,
+    due_credential_items,
+    retry_tomorrow_update,
+    rotation_done_update,
+)
 
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 TABLE_NAME = os.getenv('AUTOWAR_CREDENTIALS_TABLE', 'autowar-aws-credentials')
 
-dynamo = boto3.resource('dynamodb', region_name=AWS_REGION)
-secrets = boto3.client('secretsmanager', region_name=AWS_REGION)
+# Items are processed on a bounded pool; at most PER_CLIENT_CONCURRENCY items of the same
+# client run at once so a single customer's IAM API limits are not exceeded.
+MAINTENANCE_CONCURRENCY = int(os.getenv('AUTOWAR_MAINTENANCE_CONCURRENCY', '8'))
+PER_CLIENT_CONCURRENCY = int(os.getenv('AUTOWAR_MAINTENANCE_PER_CLIENT_CONCURRENCY', '2'))
+# Stop starting new items when less than this is left of the Lambda timeout
+TIME_RESERVE_MS = int(os.getenv('AUTOWAR_MAINTENANCE_TIME_RESERVE_MS', '10000'))
+# Optional SQS queue (with this function as consumer) for large backlogs and leftovers
+MAINTENANCE_QUEUE_URL = os.getenv('AUTOWAR_MAINTENANCE_QUEUE_URL')
+FANOUT_THRESHOLD = int(os.getenv('AUTOWAR_MAINTENANCE_FANOUT_THRESHOLD', '200'))
+MAX_CONTINUATIONS = int(os.getenv('AUTOWAR_MAINTENANCE_MAX_CONTINUATIONS', '5'))
+# SendMessageBatch entries failing on the service side are re-sent this many times
+ENQUEUE_RETRIES = int(os.getenv('AUTOWAR_MAINTENANCE_ENQUEUE_RETRIES', '3'))
+
+# AWS clients are created on first use, not at import, to keep cold starts short
+dynamo = None
+secrets = None
 sns_client = None
-if os.getenv('CREDENTIALS_ALERT_TOPIC_ARN'):
-    sns_client = boto3.client('sns', region_name=AWS_REGION)
+_iam = None
+_sqs = None
+_lambda = None
+
+
+def _get_dynamo():
+    global dynamo
+    if dynamo is None:
+        dynamo = instrument_resource(boto3.resource('dynamodb', region_name=AWS_REGION))
+    return dynamo
+
+
+def _get_secrets():
+    global secrets
+    if secrets is None:
+        secrets = boto3.client('secretsmanager', region_name=AWS_REGION)
+    return secrets
+
+
+def _get_sns():
+    global sns_client
+    if sns_client is None:
+        sns_client = boto3.client('sns', region_name=AWS_REGION)
+    return sns_client
+
+
+def _get_iam():
+    global _iam
+    if _iam is None:
+        _iam = boto3.client('iam')
+    return _iam
+
+
+def _get_sqs():
+    global _sqs
+    if _sqs is None:
+        _sqs = boto3.client('sqs', region_name=AWS_REGION)
+    return _sqs
+
+
+def _get_lambda():
+    global _lambda
+    if _lambda is None:
+        _lambda = boto3.client('lambda', region_name=AWS_REGION)
+    return _lambda
 
 
 def _now_ts() -> int:
     return int(time.time())
 
 
-def handler(event, context):
-    table = dynamo.Table(TABLE_NAME)
-    resp = table.scan()
-    items = resp.get('Items', [])
-    deleted = 0
-    rotation_due = 0
+def _mark_rotation_due(table, item: Dict[str, Any]) -> None:
+    # flagged for manual attention and queued again for tomorrow's run
+    try:
+        expr, values = retry_tomorrow_update(int(_now_ts()))
+        table.update_item(
+            Key={'id': item['id']},
+            UpdateExpression=expr,
+            ExpressionAttributeValues=values,
+        )
+    except Exception:
+        pass
+
+
+def _alert(subject: str, item: Dict[str, Any], error: Exception) -> None:
+    topic_arn = os.getenv('CREDENTIALS_ALERT_TOPIC_ARN')
+    if topic_arn:
+        try:
+            _get_sns().publish(
+                TopicArn=topic_arn,
+                Subject=subject,
+                Message=json.dumps({
+                    'id': item.get('id'),
+                    'client_id': item.get('client_id'),
+                    'reason': str(error)
+                })
+            )
+        except Exception:
+            pass
+
+
+def _expire(table, item: Dict[str, Any]) -> None:
+    # delete secret if present
+    secret_arn = item.get('secret_arn')
+    if secret_arn:
+        try:
+            _get_secrets().delete_secret(SecretId=secret_arn, ForceDeleteWithoutRecovery=True)
+        except Exception:
+            pass
+    # mark expired and drop the item from the maintenance indexes
+    try:
+        table.update_item(
+            Key={'id': item['id']},
+            UpdateExpression='SET #s = :s, deleted_at = :d REMOVE expiry_bucket, rotation_bucket',
+            ExpressionAttributeNames={'#s': 'status'},
+            ExpressionAttributeValues={':s': 'expired', ':d': _now_ts()},
+        )
+    except Exception:
+        pass
+
+
+def _rotate_secret(table, item: Dict[str, Any], interval: int) -> bool:
+    """Rotate a Secrets Manager-stored IAM user secret; marks the item for manual attention on failure.
+
+    Returns False when the secret cannot be rotated automatically (no `iam_user`).
+    """
+    secret_arn = item['secret_arn']
+    try:
+        secret_val = _get_secrets().get_secret_value(SecretId=secret_arn)
+        secret_str = secret_val.get('SecretString')
+        if not secret_str:
+            return False
+        data = json.loads(secret_str)
+        iam_user = data.get('iam_user')
+        if not iam_user:
+            return False
+        iam = _get_iam()
+        new_key = iam.create_access_key(UserName=iam_user)
+        access_id = new_key['AccessKey']['AccessKeyId']
+        secret_key = new_key['AccessKey']['SecretAccessKey']
+        new_secret = {**data, 'access_key_id': access_id, 'secret_access_key': secret_key}
+        _get_secrets().put_secret_value(SecretId=secret_arn, SecretString=json.dumps(new_secret))
+        # update Dynamo metadata and schedule the next rotation
+        try:
+            expr, values = rotation_done_update(interval)
+            table.update_item(Key={'id': item['id']}, UpdateExpression=expr, ExpressionAttributeValues=values)
+        except Exception:
+            pass
+        # prune old keys (best-effort)
+        try:
+            keys = iam.list_access_keys(UserName=iam_user)['AccessKeyMetadata']
+            if len(keys) > 2:
+                keys_sorted = sorted(keys, key=lambda k: k['CreateDate'])
+                for old in keys_sorted[:-2]:
+                    try:
+                        iam.delete_access_key(UserName=iam_user, AccessKeyId=old['AccessKeyId'])
+                    except Exception:
+                        pass
+        except Exception:
+            pass
+    except ClientError as e:
+        # if rotation failed, still mark rotation_due for manual attention
+        _mark_rotation_due(table, item)
+        _alert('AutoWAR credential rotation failed', item, e)
+    return True
+
+
+def _refresh_role(table, item: Dict[str, Any], interval: int) -> None:
+    """Refresh an AssumeRole-based session; marks the item for manual attention on failure."""
+    try:
+        # assume_role will validate and return credentials with expiration
+        resp = assume_role(role_arn=item['role_arn'], session_name=f"autowar-{item.get('id')}", external_id=item.get('external_id'), duration_seconds=int(item.get('duration_seconds', 3600)))
+        creds = resp.get('credentials', {})
+        expiry = creds.get('expiration')
+        try:
+            expr, values = rotation_done_update(interval, int(expiry) if expiry else None)
+            table.update_item(Key={'id': item['id']}, UpdateExpression=expr, ExpressionAttributeValues=values)
+        except Exception:
+            pass
+    except Exception as e:
+        _mark_rotation_due(table, item)
+        _alert('AutoWAR credential refresh failed', item, e)
+
+
+def _process_item(table, item: Dict[str, Any]) -> str:
+    """Handle one due credential record. Returns 'expired', 'rotation' or '' when nothing was due."""
+    expiry = item.get('expiry_ts')
+    if expiry and int(expiry) <= _now_ts():
+        _expire(table, item)
+        return 'expired'
+
+    # rotation check and attempt rotation when due
+    interval = item.get('rotation_interval_days')
+    if not interval:
+        return ''
+    interval = int(interval)
+    last = int(item.get('last_rotated_ts') or 0)
+    if _now_ts() < last + interval * 24 * 3600:
+        return ''
+    if item.get('secret_arn'):
+        if not _rotate_secret(table, item, interval):
+            # cannot be rotated automatically: keep it visible for manual action
+            _mark_rotation_due(table, item)
+            return ''
+    elif item.get('role_arn'):
+        _refresh_role(table, item, interval)
+    else:
+        # no secret or role to act on; mark for manual action
+        _mark_rotation_due(table, item)
+    return 'rotation'
+
+
+class _ClientLimiter:
+    """Per-client semaphores capping concurrent work for one customer."""
 
+    def __init__(self, limit: int) -> None:
+        self._limit = limit
+        self._lock = threading.Lock()
+        self._sems: Dict[str, threading.Semaphore] = {}
+
+    def get(self, client_id: str) -> threading.Semaphore:
+        with self._lock:
+            if client_id not in self._sems:
+                self._sems[client_id] = threading.Semaphore(self._limit)
+            return self._sems[client_id]
+
+
+def _remaining_ms(context) -> float:
+    getter = getattr(context, 'get_remaining_time_in_millis', None)
+    return getter() if getter else float('inf')
+
+
+def _interleave_by_client(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    # round-robin across clients so pool threads don't all queue on one client's semaphore
+    by_client: Dict[str, List[Dict[str, Any]]] = {}
     for item in items:
-        expiry = item.get('expiry_ts')
-        if expiry and int(expiry) <= _now_ts():
-            # delete secret if present
-            secret_arn = item.get('secret_arn')
-            if secret_arn:
-                try:
-                    secrets.delete_secret(SecretId=secret_arn, ForceDeleteWithoutRecovery=True)
-                except Exception:
-                    pass
-            # mark expired
-            try:
-                table.update_item(
-                    Key={'id': item['id']},
-                    UpdateExpression='SET #s = :s, deleted_at = :d',
-                    ExpressionAttributeNames={'#s': 'status'},
-                    ExpressionAttributeValues={':s': 'expired', ':d': _now_ts()},
-                )
-            except Exception:
-                pass
-            deleted += 1
-            continue
-
-        # rotation check and attempt rotation when due
-        interval = item.get('rotation_interval_days')
-        last = item.get('last_rotated_ts')
-        if interval:
+        by_client.setdefault(str(item.get('client_id')), []).append(item)
+    queues = list(by_client.values())
+    ordered = []
+    while queues:
+        for q in queues:
+            ordered.append(q.pop(0))
+        queues = [q for q in queues if q]
+    return ordered
+
+
+def _process_items(table, items: List[Dict[str, Any]], context) -> Tuple[Dict[str, int], List[Dict[str, Any]]]:
+    """Process items in parallel until the time budget runs low.
+
+    Returns outcome counts and the items that were not started (to be checkpointed).
+    """
+    limiter = _ClientLimiter(PER_CLIENT_CONCURRENCY)
+    counts = {'expired': 0, 'rotation': 0}
+    counts_lock = threading.Lock()
+    leftover: List[Dict[str, Any]] = []
+
+    def work(item: Dict[str, Any]) -> None:
+        with limiter.get(str(item.get('client_id'))):
+            if _remaining_ms(context) < TIME_RESERVE_MS:
+                with counts_lock:
+                    leftover.append(item)
+                return
             try:
-                interval = int(interval)
-                last = int(last) if last else 0
-                if _now_ts() >= last + interval * 24 * 3600:
-                    secret_arn = item.get('secret_arn')
-                    if secret_arn:
-                        # try to rotate a Secrets Manager-stored IAM user secret
-                        try:
-                            secret_val = secrets.get_secret_value(SecretId=secret_arn)
-                            secret_str = secret_val.get('SecretString')
-                            if secret_str:
-                                data = json.loads(secret_str)
-                                iam_user = data.get('iam_user')
-                                if iam_user:
-                                    iam = boto3.client('iam')
-                                    new_key = iam.create_access_key(UserName=iam_user)
-                                    access_id = new_key['AccessKey']['AccessKeyId']
-                                    secret_key = new_key['AccessKey']['SecretAccessKey']
-                                    new_secret = {**data, 'access_key_id': access_id, 'secret_access_key': secret_key}
-                                    secrets.put_secret_value(SecretId=secret_arn, SecretString=json.dumps(new_secret))
-                                    # update Dynamo metadata
-                                    try:
-                                        table.update_item(
-                                            Key={'id': item['id']},
-                                            UpdateExpression='SET last_rotated_ts = :t REMOVE rotation_due',
-                                            ExpressionAttributeValues={':t': int(_now_ts())},
-                                        )
-                                    except Exception:
-                                        pass
-                                    # prune old keys (best-effort)
-                                    try:
-                                        keys = iam.list_access_keys(UserName=iam_user)['AccessKeyMetadata']
-                                        if len(keys) > 2:
-                                            keys_sorted = sorted(keys, key=lambda k: k['CreateDate'])
-                                            for old in keys_sorted[:-2]:
-                                                try:
-                                                    iam.delete_access_key(UserName=iam_user, AccessKeyId=old['AccessKeyId'])
-                                                except Exception:
-                                                    pass
-                                    except Exception:
-                                        pass
-                                    rotation_due += 1
-                                    continue
-                        except ClientError as e:
-                            # if rotation failed, still mark rotation_due for manual attention
-                            try:
-                                table.update_item(
-                                    Key={'id': item['id']},
-                                    UpdateExpression='SET rotation_due = :r',
-                                    ExpressionAttributeValues={':r': int(_now_ts())},
-                                )
-                            except Exception:
-                                pass
-                            # publish alert if SNS configured
-                            topic_arn = os.getenv('CREDENTIALS_ALERT_TOPIC_ARN')
-                            if topic_arn and sns_client:
-                                try:
-                                    sns_client.publish(
-                                        TopicArn=topic_arn,
-                                        Subject='AutoWAR credential rotation failed',
-                                        Message=json.dumps({
-                                            'id': item.get('id'),
-                                            'client_id': item.get('client_id'),
-                                            'reason': str(e)
-                                        })
-                                    )
-                                except Exception:
-                                    pass
-                            rotation_due += 1
-                            continue
-                    else:
-                        # try to refresh AssumeRole-based session if role_arn present
-                        role_arn = item.get('role_arn')
-                        if role_arn:
-                            try:
-                                # assume_role will validate and return credentials with expiration
-                                resp = assume_role(role_arn=role_arn, session_name=f"autowar-{item.get('id')}", external_id=item.get('external_id'), duration_seconds=int(item.get('duration_seconds', 3600)))
-                                creds = resp.get('credentials', {})
-                                expiry = creds.get('expiration')
-                                # update table metadata
-                                try:
-                                    table.update_item(
-                                        Key={'id': item['id']},
-                                        UpdateExpression='SET expiry_ts = :e, last_rotated_ts = :t REMOVE rotation_due',
-                                        ExpressionAttributeValues={':e': int(expiry) if isinstance(expiry, int) else int(expiry) if hasattr(expiry, 'timestamp') else expiry, ':t': int(_now_ts())},
-                                    )
-                                except Exception:
-                                    pass
-                                rotation_due += 1
-                                continue
-                            except Exception as e:
-                                # mark rotation_due and publish alert
-                                try:
-                                    table.update_item(
-                                        Key={'id': item['id']},
-                                        UpdateExpression='SET rotation_due = :r',
-                                        ExpressionAttributeValues={':r': int(_now_ts())},
-                                    )
-                                except Exception:
-                                    pass
-                                topic_arn = os.getenv('CREDENTIALS_ALERT_TOPIC_ARN')
-                                if topic_arn and sns_client:
-                                    try:
-                                        sns_client.publish(
-                                            TopicArn=topic_arn,
-                                            Subject='AutoWAR credential refresh failed',
-                                            Message=json.dumps({
-                                                'id': item.get('id'),
-                                                'client_id': item.get('client_id'),
-                                                'reason': str(e)
-                                            })
-                                        )
-                                    except Exception:
-                                        pass
-                                rotation_due += 1
-                                continue
-                        else:
-                            # no secret or role to act on; mark for manual action
-                            try:
-                                table.update_item(
-                                    Key={'id': item['id']},
-                                    UpdateExpression='SET rotation_due = :r',
-                                    ExpressionAttributeValues={':r': int(_now_ts())},
-                                )
-                            except Exception:
-                                pass
-                            rotation_due += 1
+                outcome = _process_item(table, item)
             except Exception:
-                continue
+                return
+        if outcome:
+            with counts_lock:
+                counts[outcome] += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, MAINTENANCE_CONCURRENCY)) as pool:
+        list(pool.map(work, _interleave_by_client(items)))
+    return counts, leftover
+
+
+def _json_default(obj: Any) -> Any:
+    if isinstance(obj, Decimal):
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _enqueue(items: List[Dict[str, Any]]) -> int:
+    """Send items to the maintenance queue, 10 per SendMessageBatch call.
+
+    Entries SQS rejects on its side are re-sent (up to ENQUEUE_RETRIES times); returns
+    the number actually queued. Items left out stay due in the maintenance indexes and
+    are picked up by the next scheduled run.
+    """
+    sqs = _get_sqs()
+    sent = 0
+    for start in range(0, len(items), 10):
+        chunk = items[start:start + 10]
+        entries = [{'Id': str(i), 'MessageBody': json.dumps({'item': item}, default=_json_default)}
+                   for i, item in enumerate(chunk)]
+        for attempt in range(ENQUEUE_RETRIES + 1):
+            resp = sqs.send_message_batch(QueueUrl=MAINTENANCE_QUEUE_URL, Entries=entries)
+            sent += len(resp.get('Successful', []))
+            # sender faults (e.g. an oversized body) fail the same way again
+            retry_ids = {f['Id'] for f in resp.get('Failed', []) if not f.get('SenderFault')}
+            entries = [e for e in entries if e['Id'] in retry_ids]
+            if not entries or attempt == ENQUEUE_RETRIES:
+                break
+            time.sleep(0.1 * (2 ** attempt))
+    return sent
+
+
+def _handle_queue_records(table, event, context) -> Dict[str, Any]:
+    # SQS fan-out: each message carries one credential record
+    items_by_msg = {}
+    failures = []
+    for record in event.get('Records', []):
+        try:
+            items_by_msg[record['messageId']] = json.loads(record['body'])['item']
+        except Exception:
+            failures.append({'itemIdentifier': record.get('messageId')})
+    counts, leftover = _process_items(table, list(items_by_msg.values()), context)
+    leftover_ids = {id(i) for i in leftover}
+    # items not started before the deadline go back to the queue
+    failures += [{'itemIdentifier': m} for m, i in items_by_msg.items() if id(i) in leftover_ids]
+    return {'batchItemFailures': failures, 'expired_deleted': counts['expired'], 'rotation_marked': counts['rotation']}
+
+
+def _continue_later(items: List[Dict[str, Any]], event: Dict[str, Any], context, started_at: int) -> str:
+    """Checkpoint unprocessed items: enqueue them, or re-invoke this function asynchronously.
+
+    Items still due stay in the maintenance indexes, so a continuation simply re-queries;
+    `started_at` lets it skip items that already failed (rotation_due set) in this run.
+    """
+    if MAINTENANCE_QUEUE_URL:
+        # items SQS did not take wait for the next scheduled run
+        return 'queued' if _enqueue(items) == len(items) else 'next_run'
+    depth = int(event.get('continuation', 0)) + 1
+    function_name = getattr(context, 'function_name', None)
+    if not function_name or depth > MAX_CONTINUATIONS:
+        return 'next_run'
+    _get_lambda().invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'continuation': depth, 'started_at': started_at}),
+    )
+    return 'reinvoked'
+
+
+@flush_metrics
+def handler(event, context):
+    table = _get_dynamo().Table(TABLE_NAME)
+    event = event if isinstance(event, dict) else {}
+    if event.get('backfill'):
+        # one-off: index records created before the expiry/rotation GSIs existed
+        updated = backfill_lifecycle_indexes(table)
+        return {'statusCode': 200, 'body': json.dumps({'backfilled': updated})}
+    if event.get('Records'):
+        return _handle_queue_records(table, event, context)
+
+    started_at = int(event.get('started_at') or _now_ts())
+    items = [i for i in due_credential_items(table) if int(i.get('rotation_due') or 0) < started_at]
+    if MAINTENANCE_QUEUE_URL and len(items) > FANOUT_THRESHOLD:
+        dispatched = _enqueue(items)
+        body = {'dispatched': dispatched}
+        if dispatched < len(items):
+            body['not_dispatched'] = len(items) - dispatched
+        return {'statusCode': 200, 'body': json.dumps(body)}
+
+    counts, leftover = _process_items(table, items, context)
+    body = {'expired_deleted': counts['expired'], 'rotation_marked': counts['rotation']}
+    if leftover:
+        body['deferred'] = len(leftover)
+        body['continuation'] = _continue_later(leftover, event, context, started_at)
 
     return {
         'statusCode': 200,
-        'body': json.dumps({'expired_deleted': deleted, 'rotation_marked': rotation_due}),
+        'body': json.dumps(body),
     }
@@ -4,7 +4,15 @@ import logging
 import boto3
 from typing import Any, Dict
 
-from app.validators.manager import run_validators_for_evaluation
+from app.incremental import evaluate, find_baseline
+from app.credential_broker import broker
+from app.repository import ClientRepository, EvaluationRepository, EvidenceRepository, InventoryRepository, ReportRepository
+from app.inventory import discover_targets
+from app.evidence_store import EvidenceStore
+from app.evidence_retention import EvidenceArchive, PlanResolver, mark_archived
+from app.dynamo_metrics import flush_metrics, instrument_resource
+from app.catalog import load_catalog
+from app.scoring import bp_scores_from_results, state_to_dynamo
 
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 logging.basicConfig()
@@ -14,7 +22,12 @@ logger.setLevel(LOG_LEVEL)
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 EVAL_TABLE = os.getenv('AUTOWAR_EVALUATIONS_TABLE', 'autowar-evaluations')
 EVIDENCE_TABLE = os.getenv('AUTOWAR_EVIDENCE_TABLE', 'autowar-evidence-technical')
+CLIENTS_TABLE = os.getenv('AUTOWAR_CLIENTS_TABLE', 'autowar-clients')
+RESOURCES_TABLE = os.getenv('AUTOWAR_RESOURCES_TABLE', 'autowar-aws-resources')
 REPORT_QUEUE_URL = os.getenv('AUTOWAR_REPORT_QUEUE_URL')
+# When enabled, each validator result is appended to the evaluation item as it is
+# produced so DynamoDB Streams consumers (the SSE endpoint) see incremental progress.
+PUBLISH_PROGRESS = os.getenv('AUTOWAR_PUBLISH_PROGRESS', '').lower() in ('1', 'true', 'yes')
 
 _sqs = None
 def _get_sqs():
@@ -23,7 +36,21 @@ def _get_sqs():
         _sqs = boto3.client('sqs', region_name=AWS_REGION)
     return _sqs
 
-dynamo = boto3.resource('dynamodb', region_name=AWS_REGION)
+# created on first use, not at import, to keep cold starts short
+dynamo = None
+def _get_dynamo():
+    global dynamo
+    if dynamo is None:
+        dynamo = instrument_resource(boto3.resource('dynamodb', region_name=AWS_REGION))
+    return dynamo
+
+_plans = None
+def _get_plans():
+    # client plan -> evidence TTL; cached across invocations of a warm container
+    global _plans
+    if _plans is None:
+        _plans = PlanResolver(ClientRepository(_get_dynamo().Table(CLIENTS_TABLE)))
+    return _plans
 
 
 def _now_ts():
@@ -32,9 +59,35 @@ def _now_ts():
     return int(time.time())
 
 
+def _progress_writer(evaluations, evaluation_id, client_id=None):
+    def _append(result):
+        try:
+            evaluations.update(
+                evaluation_id,
+                'SET results = list_append(if_not_exists(results, :empty), :r)',
+                {':r': [result], ':empty': []},
+                client_id=client_id,
+            )
+        except Exception:
+            logger.exception('Failed to append progress for evaluation %s', evaluation_id)
+    return _append
+
+
+def _mark_failed(evaluations, evaluation_id, client_id, error):
+    # FAILED is terminal for stream consumers; nothing is scored or reported
+    try:
+        evaluations.update(evaluation_id, 'SET #s = :s, #e = :e, completed_at = :c, end_ts = :c',
+                           {':s': 'FAILED', ':e': str(error), ':c': _now_ts()}, {'#s': 'status', '#e': 'error'},
+                           client_id=client_id)
+    except Exception:
+        logger.exception('Failed to mark evaluation %s as FAILED', evaluation_id)
+
+
+@flush_metrics
 def handler(event, context):
-    eval_table = dynamo.Table(EVAL_TABLE)
-    evidence_table = dynamo.Table(EVIDENCE_TABLE)
+    evaluations = EvaluationRepository(_get_dynamo().Table(EVAL_TABLE))
+    evidence = EvidenceStore(EvidenceRepository(_get_dynamo().Table(EVIDENCE_TABLE)))
+    archive = EvidenceArchive(evidence)
     processed = 0
 
     logger.info('Handler invoked with %d records', len(event.get('Records', [])))
@@ -56,53 +109,75 @@ def handler(event, context):
             if not evaluation_id:
                 logger.warning('Skipping message with no evaluationId: %s', msg)
                 continue
+            client_id = item.get('client_id')
 
-            # run validators
-            targets = item.get('targets') or []
+            # status transition picked up by stream consumers
             try:
-                results = run_validators_for_evaluation(targets, region=item.get('region'), account_id=item.get('account_id'))
+                evaluations.update(evaluation_id, 'SET #s = :s', {':s': 'RUNNING'}, {'#s': 'status'}, client_id=client_id)
             except Exception:
+                logger.exception('Failed to mark evaluation %s as RUNNING', evaluation_id)
+
+            # run validators with the evaluated account's credentials (cached across shards)
+            on_result = _progress_writer(evaluations, evaluation_id, client_id) if PUBLISH_PROGRESS else None
+            try:
+                session = broker.session_for_credential(item['credential_id'], item.get('region'), client_id=client_id) \
+                    if item.get('credential_id') else None
+                if item.get('discover_targets') and not item.get('targets'):
+                    targets, counts = discover_targets(client_id, item.get('account_id'), session=session, region=item.get('region'),
+                                                       repository=InventoryRepository(_get_dynamo().Table(RESOURCES_TABLE)))
+                    item = dict(item, targets=targets)
+                    logger.info('Inventory for evaluation %s: %s, %d targets', evaluation_id, counts, len(targets))
+                previous = find_baseline(evaluations, dict(item, evaluationId=evaluation_id)) if item.get('incremental') else None
+                results, stats = evaluate(item, previous, session=session, on_result=on_result)
+                if previous:
+                    logger.info('Incremental evaluation %s: %d targets re-run, %d results carried from %s', evaluation_id,
+                                stats['rerun_targets'], stats['carried_results'], previous.get('evaluationId'))
+            except Exception as e:
                 logger.exception('Validator execution failed for evaluation %s', evaluation_id)
-                results = []
+                _mark_failed(evaluations, evaluation_id, client_id, e)
+                processed += 1
+                continue
 
-            # persist results into evaluation item
+            # persist results and their BP -> question -> pillar -> total scores
             try:
-                eval_table.update_item(
-                    Key={'id': evaluation_id},
-                    UpdateExpression='SET #s = :s, results = :r, completed_at = :c',
-                    ExpressionAttributeNames={'#s': 'status'},
-                    ExpressionAttributeValues={':s': 'COMPLETED', ':r': results, ':c': _now_ts()},
+                # the partial sums let single result changes update the scores later (score_updates)
+                catalog = load_catalog()
+                state = catalog.scoring_model.build_state(bp_scores_from_results(results, catalog.validator_bps), version=1)
+                scores = state_to_dynamo(state)
+                evaluations.update(
+                    evaluation_id,
+                    'SET #s = :s, results = :r, completed_at = :c, end_ts = :c, '
+                    'score_total = :t, pillar_scores = :p, question_scores = :q, '
+                    'bp_scores = :b, score_sums = :u, score_version = :v, catalog_version = :cv',
+                    {':s': 'COMPLETED', ':r': results, ':c': _now_ts(), ':t': scores['score_total'],
+                     ':p': scores['pillar_scores'], ':q': scores['question_scores'], ':b': scores['bp_scores'],
+                     ':u': scores['score_sums'], ':v': scores['score_version'], ':cv': catalog.version},
+                    {'#s': 'status'},
+                    client_id=client_id,
                 )
             except Exception:
                 logger.exception('Failed to update evaluation item %s', evaluation_id)
 
-            # write per-target evidence entries
-            for r in results:
-                evidence_item = {
-                    'id': f"{evaluation_id}#{r.get('name')}#{_now_ts()}",
-                    'evaluation_id': evaluation_id,
-                    'validator': r.get('name'),
-                    'resource': r.get('resource'),
-                    'status': r.get('status'),
-                    'details': r.get('details'),
-                    'created_at': _now_ts(),
-                }
-                try:
-                    evidence_table.put_item(Item=evidence_item)
-                except Exception:
-                    logger.exception('Failed to write evidence item for %s', evaluation_id)
-
-            # persist a minimal report metadata record (use pk/sk schema)
+            # per-target evidence rows; details payloads are stored once per content hash
+            # rows expire per the client's plan; the archive keeps them afterwards
+            captured_at = _now_ts()
+            try:
+                evidence.write_results(client_id, evaluation_id, results, captured_at,
+                                       ttl=_get_plans().ttl(client_id, captured_at))
+            except Exception:
+                logger.exception('Failed to write evidence items for %s', evaluation_id)
+            try:
+                if archive.bucket and results:
+                    key = archive.archive_rows(client_id, evaluation_id, [dict(r, captured_at=captured_at) for r in results])
+                    mark_archived(evaluations, evaluation_id, key, client_id=client_id)
+            except Exception:
+                logger.exception('Failed to archive evidence for %s', evaluation_id)
+
+            # report metadata record, keyed CLIENT#<clientId> / REPORT#<evaluationId>
             try:
-                reports_table = dynamo.Table(os.getenv('AUTOWAR_REPORTS_TABLE', 'autowar-reports'))
-                report_item = {
-                    'pk': evaluation_id,
-                    'sk': 'meta',
-                    'evaluation_id': evaluation_id,
-                    'status': 'PENDING',
-                    'created_at': _now_ts(),
-                }
-                reports_table.put_item(Item=report_item)
+                if client_id:
+                    reports = ReportRepository(_get_dynamo().Table(os.getenv('AUTOWAR_REPORTS_TABLE', 'autowar-reports')))
+                    reports.put_pending(client_id, evaluation_id, _now_ts())
             except Exception:
                 logger.exception('Failed to write report metadata for %s', evaluation_id)
 
@@ -110,7 +185,7 @@ def handler(event, context):
             try:
                 if REPORT_QUEUE_URL:
                     sqs = _get_sqs()
-                    payload = {'evaluationId': evaluation_id}
+                    payload = {'evaluationId': evaluation_id, 'clientId': client_id}
                     resp = sqs.send_message(QueueUrl=REPORT_QUEUE_URL, MessageBody=json.dumps(payload))
                     logger.info('Enqueued report job %s for evaluation %s', resp.get('MessageId'), evaluation_id)
                 else:
@@ -3,11 +3,11 @@ import json
 import time
 import logging
 import boto3
-try:
-    import httpx
-except Exception:
-    httpx = None
-from typing import Any, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from app.dynamo_metrics import flush_metrics, instrument_resource
+from app.repository import EvaluationRepository, ReportRepository
+from app import report_pipeline
 
 logging.basicConfig()
 logger = logging.getLogger('report_generator')
@@ -16,91 +16,130 @@ logger.setLevel(os.getenv('LOG_LEVEL', 'INFO'))
 AWS_REGION = os.getenv('AWS_REGION', 'us-east-1')
 REPORTS_BUCKET = os.getenv('REPORTS_BUCKET')
 REPORTS_TABLE = os.getenv('AUTOWAR_REPORTS_TABLE', 'autowar-reports')
+# report jobs of one SQS batch rendered at the same time
+REPORT_CONCURRENCY = int(os.getenv('AUTOWAR_REPORT_CONCURRENCY', '4'))
 
-dynamo = boto3.resource('dynamodb', region_name=AWS_REGION)
-s3 = boto3.client('s3', region_name=AWS_REGION)
+# created on first use, not at import, to keep cold starts short
+dynamo = None
+s3 = None
+
+
+def _get_dynamo():
+    global dynamo
+    if dynamo is None:
+        dynamo = instrument_resource(boto3.resource('dynamodb', region_name=AWS_REGION))
+    return dynamo
+
+
+def _get_s3():
+    global s3
+    if s3 is None:
+        s3 = boto3.client('s3', region_name=AWS_REGION)
+    return s3
 
 
 def _now_ts():
     return int(time.time())
 
 
-def render_report(evaluation: Dict[str, Any]) -> bytes:
-    # If a serverless renderer is configured, call it (expects PDF bytes),
-    # otherwise fallback to JSON content.
-    renderer = os.getenv('RENDERER_URL')
-    content = {
-        'evaluationId': evaluation.get('evaluationId'),
-        'created_at': evaluation.get('created_at'),
-        'results': evaluation.get('results'),
-    }
-    if renderer:
+def render_report(evaluation: Dict[str, Any], bucket: str) -> Dict[str, str]:
+    """Render every requested format of a report straight into S3; returns {format: key}.
+    Formats already stored for the same content are not rendered again."""
+    model = report_pipeline.build_model(evaluation)
+    return report_pipeline.render_formats(model, report_pipeline.requested_formats(), _get_s3(), bucket,
+                                          report_pipeline.key_prefix(model))
+
+
+def _parse(record: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    body = record.get('body')
+    msg = json.loads(body) if isinstance(body, str) else body
+    if not msg.get('evaluationId'):
+        raise ValueError('report job without evaluationId')
+    return msg['evaluationId'], msg.get('clientId')
+
+
+def _fetch_evaluations(evaluations: EvaluationRepository, jobs: List[Tuple[str, str, Optional[str]]]) -> List[Optional[Dict[str, Any]]]:
+    refs = [(evaluation_id, client_id) for _, evaluation_id, client_id in jobs]
+    try:
+        return evaluations.get_many(refs)
+    except Exception:
+        logger.exception('BatchGetItem of %d evaluations failed, reading them one by one', len(refs))
+    found = []
+    for evaluation_id, client_id in refs:
         try:
-            # call external renderer service (POST JSON -> returns bytes)
-            if httpx is None:
-                raise RuntimeError('httpx not available in this lambda package')
-            resp = httpx.post(renderer, json={'payload': content, 'format': 'pdf'}, timeout=30.0)
-            resp.raise_for_status()
-            return resp.content
+            found.append(evaluations.get(evaluation_id, client_id=client_id))
         except Exception:
-            logger.exception('Renderer call failed, falling back to JSON')
-            print(f"report_generator: renderer call failed for evaluation {evaluation.get('evaluationId')}")
-    return json.dumps(content, indent=2).encode('utf-8')
+            found.append(None)
+    return found
+
 
+def _process(reports: ReportRepository, job: Tuple[str, str, Optional[str]],
+             evaluation: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Render one report; returns its completed metadata item (None when the job has no client)."""
+    _, evaluation_id, client_id = job
+    logger.info('Processing report job for %s', evaluation_id)
+    evaluation = evaluation or {'evaluationId': evaluation_id, 'created_at': _now_ts(), 'results': []}
+    if REPORTS_BUCKET:
+        keys = render_report(evaluation, REPORTS_BUCKET)
+        urls = {fmt: f"s3://{REPORTS_BUCKET}/{key}" for fmt, key in keys.items()}
+        s3_url = next(iter(urls.values()))
+    else:
+        urls = {}
+        s3_url = report_pipeline.key_prefix(report_pipeline.build_model(evaluation)) + '.json'
+    client_id = client_id or evaluation.get('client_id')
+    if not client_id:
+        logger.error('Evaluation %s has no client_id, report metadata not written', evaluation_id)
+        return None
+    return reports.completed_item(client_id, evaluation_id, s3_url, _now_ts(),
+                                  created_at=evaluation.get('completed_at'), formats=urls)
 
+
+@flush_metrics
 def handler(event, context):
-    table = dynamo.Table(REPORTS_TABLE)
-    eval_table = dynamo.Table(os.getenv('AUTOWAR_EVALUATIONS_TABLE', 'autowar-evaluations'))
-    processed = 0
+    """Render a batch of report jobs concurrently.
+
+    Evaluations are read with one BatchGetItem and report metadata written with
+    batched writes; failed records are returned as `batchItemFailures` so SQS only
+    redelivers those (the event source needs ReportBatchItemFailures enabled).
+    Malformed records are logged and dropped, since redelivering them cannot succeed.
+    """
+    reports = ReportRepository(_get_dynamo().Table(REPORTS_TABLE))
+    evaluations = EvaluationRepository(_get_dynamo().Table(os.getenv('AUTOWAR_EVALUATIONS_TABLE', 'autowar-evaluations')))
+    failures: List[str] = []
+    jobs: List[Tuple[str, str, Optional[str]]] = []
     for record in event.get('Records', []):
         try:
-            body = record.get('body')
-            msg = json.loads(body) if isinstance(body, str) else body
-            evaluation_id = msg.get('evaluationId')
-            logger.info('Processing report job for %s', evaluation_id)
-            # fetch evaluation
-            try:
-                eval_resp = eval_table.get_item(Key={'id': evaluation_id})
-                evaluation = eval_resp.get('Item')
-            except Exception:
-                evaluation = None
-
-            # render report
-            report_bytes = render_report(evaluation or {'evaluationId': evaluation_id, 'created_at': _now_ts(), 'results': []})
-            key = f"reports/{evaluation_id}/{_now_ts()}.json"
-            if REPORTS_BUCKET:
-                s3.put_object(Bucket=REPORTS_BUCKET, Key=key, Body=report_bytes)
-                s3_url = f"s3://{REPORTS_BUCKET}/{key}"
-            else:
-                s3_url = key
-
-            # update reports table (use pk/sk schema)
-            # Try to update the reports table using update_item (tests use this
-            # signature). If update_item is not available, fall back to put_item
-            # using pk/sk schema for real DynamoDB tables.
-            try:
-                # Prefer update_item with Key={'id': evaluation_id} for test doubles
-                try:
-                    table.update_item(
-                        Key={'id': evaluation_id},
-                        UpdateExpression="SET status = :s, s3_key = :k, generated_at = :g",
-                        ExpressionAttributeValues={':s': 'COMPLETED', ':k': s3_url, ':g': _now_ts()},
-                    )
-                except AttributeError:
-                    # table doesn't implement update_item (real boto3 Table supports put_item)
-                    sk_value = str(_now_ts())
-                    table.put_item(Item={
-                        'pk': evaluation_id,
-                        'sk': sk_value,
-                        'status': 'COMPLETED',
-                        's3_key': s3_url,
-                        'generated_at': _now_ts(),
-                    })
-            except Exception:
-                logger.exception('Failed to update reports table for %s', evaluation_id)
-                print(f"report_generator: failed to update reports table for {evaluation_id}")
-
-            processed += 1
+            jobs.append((record.get('messageId'),) + _parse(record))
         except Exception:
-            continue
-    return {'statusCode': 200, 'processed': processed}
+            # redelivery cannot fix the body: acknowledge it instead of retrying until the DLQ
+            logger.exception('Skipping malformed report job: %s', record.get('body'))
+
+    found = _fetch_evaluations(evaluations, jobs) if jobs else []
+
+    def run(args):
+        job, evaluation = args
+        try:
+            return job, _process(reports, job, evaluation), None
+        except Exception as e:
+            logger.exception('Report job for %s failed', job[1])
+            return job, None, e
+
+    with ThreadPoolExecutor(max_workers=max(1, min(REPORT_CONCURRENCY, len(jobs)))) as pool:
+        outcomes = list(pool.map(run, zip(jobs, found)))
+
+    done = [(job, item) for job, item, error in outcomes if error is None]
+    failures.extend(job[0] for job, _, error in outcomes if error is not None)
+    items = [item for _, item in done if item is not None]
+    try:
+        reports.put_many(items)
+    except Exception:
+        # metadata missing: let SQS redeliver (rendering is skipped for unchanged reports)
+        logger.exception('Failed to update reports table for %d reports', len(items))
+        failures.extend(job[0] for job, item in done if item is not None)
+        done = [(job, item) for job, item in done if item is None]
+
+    return {
+        'statusCode': 200,
+        'processed': len(done),
+        'batchItemFailures': [{'itemIdentifier': m} for m in failures if m],
+    }
@@ -8,6 +8,10 @@ class FakeTable:
     def scan(self):
         return {'Items': self.items}
 
+    def query(self, IndexName=None, KeyConditionExpression=None, ExclusiveStartKey=None):
+        # items are due for rotation, so only the rotation index returns them
+        return {'Items': self.items if IndexName == 'rotationIndex' else []}
+
     def update_item(self, Key=None, UpdateExpression=None, ExpressionAttributeValues=None, ExpressionAttributeNames=None):
         self.updated.append({'Key': Key, 'UpdateExpression': UpdateExpression, 'Values': ExpressionAttributeValues})
 
@@ -0,0 +1,166 @@
+import threading
+
+import pytest
+
+
+class SegmentedTable:
+    """Fake table: `pages[segment]` is the list of pages its client returns for that segment."""
+
+    name = 'autowar-test'
+
+    def __init__(self, segments=4, pages_per_segment=3, items_per_page=5):
+        self.meta = type('Meta', (), {'client': self})()
+        self.calls = []
+        self.lock = threading.Lock()
+        self.pages = {
+            s: [[{'id': f'{s}-{p}-{i}'} for i in range(items_per_page)] for p in range(pages_per_segment)]
+            for s in range(segments)
+        }
+
+    def scan(self, TableName, Segment, TotalSegments, ReturnConsumedCapacity=None, ExclusiveStartKey=None, **kwargs):
+        assert TableName == self.name
+        with self.lock:
+            self.calls.append((Segment, ExclusiveStartKey, kwargs))
+        page = ExclusiveStartKey['page'] if ExclusiveStartKey else 0
+        resp = {
+            'Items': self.pages[Segment][page],
+            'Count': len(self.pages[Segment][page]),
+            'ScannedCount': 10,
+            'ConsumedCapacity': {'CapacityUnits': 0.5},
+        }
+        if page + 1 < len(self.pages[Segment]):
+            resp['LastEvaluatedKey'] = {'page': page + 1}
+        return resp
+
+
+def test_parallel_scan_reads_every_segment_and_page():
+    from src.app.aws_connector import parallel_scan
+
+    table = SegmentedTable()
+    stats = {}
+    items = list(parallel_scan(table, total_segments=4, projection='id', stats=stats))
+    assert len(items) == 4 * 3 * 5
+    assert len({i['id'] for i in items}) == len(items)
+    assert stats == {'consumed_capacity': 6.0, 'scanned_count': 120, 'count': 60}
+    assert all(kwargs['ProjectionExpression'] == 'id' for _, _, kwargs in table.calls)
+
+
+def test_parallel_scan_uses_the_thread_safe_client():
+    from src.app.aws_connector import parallel_scan
+
+    class ResourceTable:
+        """Table resource: shared across segment threads it is not thread-safe, so it must not be scanned."""
+
+        name = 'autowar-test'
+
+        def __init__(self):
+            self.meta = type('Meta', (), {'client': SegmentedTable(segments=2, pages_per_segment=2)})()
+
+        def scan(self, **kwargs):
+            raise AssertionError('Table.scan called from a segment thread')
+
+    table = ResourceTable()
+    assert len(list(parallel_scan(table, total_segments=2))) == 2 * 2 * 5
+    assert len(table.meta.client.calls) == 4
+
+
+def test_parallel_scan_stops_early_and_propagates_errors():
+    from src.app.aws_connector import parallel_scan
+
+    gen = parallel_scan(SegmentedTable(segments=2, pages_per_segment=50), total_segments=2, max_buffered=4)
+    first = [next(gen) for _ in range(3)]
+    gen.close()
+    assert len(first) == 3
+
+    class FailingTable(SegmentedTable):
+        def scan(self, **kwargs):
+            raise RuntimeError('throttled')
+
+    with pytest.raises(RuntimeError):
+        list(parallel_scan(FailingTable(), total_segments=2))
+
+
+class BatchClient:
+    """Fake resource client: leaves the first key/item of each first request unprocessed."""
+
+    def __init__(self, stored):
+        self.stored = stored
+        self.get_calls = []
+        self.write_calls = []
+        self.lock = threading.Lock()
+
+    def batch_get_item(self, RequestItems):
+        (name, req), = RequestItems.items()
+        with self.lock:
+            first = len(self.get_calls) == 0
+            self.get_calls.append(list(req['Keys']))
+        keys = req['Keys']
+        done, left = (keys[1:], keys[:1]) if first else (keys, [])
+        resp = {'Responses': {name: [self.stored[k['id']] for k in done if k['id'] in self.stored]}}
+        if left:
+            resp['UnprocessedKeys'] = {name: dict(req, Keys=left)}
+        return resp
+
+    def batch_write_item(self, RequestItems):
+        (name, reqs), = RequestItems.items()
+        with self.lock:
+            first = len(self.write_calls) == 0
+            self.write_calls.append(reqs)
+        if first:
+            return {'UnprocessedItems': {name: reqs[:1]}}
+        return {}
+
+
+class BatchTable:
+    name = 'autowar-test'
+
+    def __init__(self, client):
+        self.meta = type('Meta', (), {'client': client})()
+
+
+def test_batch_get_items_chunks_dedupes_retries_and_keeps_order(monkeypatch):
+    import src.app.aws_connector as ac
+
+    monkeypatch.setattr(ac, '_backoff', lambda attempt: None)
+    stored = {f'k{i}': {'id': f'k{i}', 'v': i} for i in range(250) if i != 7}
+    client = BatchClient(stored)
+    keys = [{'id': f'k{i}'} for i in reversed(range(250))] + [{'id': 'k3'}]
+    items = ac.batch_get_items(BatchTable(client), keys)
+    assert len(items) == len(keys)
+    assert items[0]['v'] == 249 and items[-1]['v'] == 3
+    assert items[keys.index({'id': 'k7'})] is None
+    # 250 unique keys -> 3 chunks, plus one retry of the unprocessed key
+    assert len(client.get_calls) == 4
+    assert max(len(c) for c in client.get_calls) == 100
+
+
+def test_batch_write_items_dedupes_and_retries_unprocessed(monkeypatch):
+    import src.app.aws_connector as ac
+
+    monkeypatch.setattr(ac, '_backoff', lambda attempt: None)
+    client = BatchClient({})
+    items = [{'id': f'i{i % 60}', 'n': i} for i in range(70)]
+    assert ac.batch_write_items(BatchTable(client), items) == 60
+    sizes = sorted(len(c) for c in client.write_calls)
+    assert sizes == [1, 10, 25, 25]
+    written = {r['PutRequest']['Item']['id']: r['PutRequest']['Item']['n']
+               for c in client.write_calls for r in c}
+    # last duplicate wins
+    assert written['i5'] == 65
+
+
+def test_batch_get_items_matches_numeric_keys(monkeypatch):
+    from decimal import Decimal
+    import src.app.aws_connector as ac
+
+    class NumericClient:
+        def batch_get_item(self, RequestItems):
+            (name, req), = RequestItems.items()
+            # DynamoDB hands numbers back as Decimal
+            return {'Responses': {name: [{'pk': 'c1', 'version': Decimal(k['version']), 'v': k['version'] * 10}
+                                         for k in req['Keys'] if k['version'] != 3]}}
+
+    keys = [{'pk': 'c1', 'version': 2}, {'pk': 'c1', 'version': 3}, {'pk': 'c1', 'version': 1}]
+    items = ac.batch_get_items(BatchTable(NumericClient()), keys)
+    assert [i and i['v'] for i in items] == [20, None, 10]
+    assert ac._key_id({'n': 1}) == ac._key_id({'n': Decimal('1.0')}) != ac._key_id({'n': '1'})
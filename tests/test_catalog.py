@@ -0,0 +1,47 @@
+import pytest
+
+RAW = {
+    'version': 'test-1',
+    'pillars': {'security': {'weight': 2}, 'reliability': {}},
+    'questions': {
+        'SEC01': {'pillar': 'security', 'title': 'How do you securely operate your workload?'},
+        'REL09': {'pillar': 'reliability', 'weight': 2},
+    },
+    'best_practices': {
+        'SEC01-BP02': {'question': 'SEC01', 'weight': 3},
+        'REL09-BP01': {'question': 'REL09'},
+    },
+    'validators': {'iam-root-mfa': ['SEC01-BP02'], 'backup-plan': ['REL09-BP01', 'SEC01-BP02']},
+}
+
+
+def test_compiled_lookups_are_read_only():
+    from src.app.catalog import compile_catalog
+
+    catalog = compile_catalog(RAW)
+    assert catalog.version == 'test-1'
+    assert catalog.best_practices['REL09-BP01'].pillar == 'reliability'
+    assert catalog.bp_validators['SEC01-BP02'] == ('iam-root-mfa', 'backup-plan')
+    assert catalog.pillars_for_validator('backup-plan') == ('reliability', 'security')
+    with pytest.raises(TypeError):
+        catalog.validator_bps['new'] = ('X',)
+    assert catalog.scoring_model.score({'SEC01-BP02': 100, 'REL09-BP01': 0})['score_total'] == round(200 / 3, 2)
+
+
+def test_broken_references_are_rejected():
+    from src.app.catalog import compile_catalog
+
+    with pytest.raises(RuntimeError, match='unknown best practices'):
+        compile_catalog(dict(RAW, validators={'x': ['NOPE']}))
+    with pytest.raises(RuntimeError, match='unknown question'):
+        compile_catalog(dict(RAW, best_practices={'A': {'question': 'Q?'}}))
+
+
+def test_bundled_catalog_covers_every_validator():
+    from src.app.catalog import load_catalog
+    from src.app.validators import manager
+
+    catalog = load_catalog()
+    assert load_catalog() is catalog
+    names = {v.name for validators in manager.VALIDATOR_MAP.values() for v in validators}
+    assert names <= set(catalog.validator_bps)
@@ -0,0 +1,97 @@
+"""Import-time budget of the Lambda handlers.
+
+Each handler is imported in a fresh interpreter with `-X importtime`; boto3 is
+imported first so the measured time is what the handler's own import graph adds
+to a cold start. The per-module profile is written to the pytest cache
+(`.pytest_cache/d/import-profile/<handler>.txt`).
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# best of RUNS, in ms, on top of boto3; override with AUTOWAR_IMPORT_BUDGET_MS
+BUDGETS_MS = {
+    'lambdas.evaluation_worker': 200,
+    'lambdas.report_generator': 120,
+    'lambdas.credentials_maintenance': 60,
+}
+RUNS = 3
+PRELOAD = 'import boto3, botocore.session'
+
+
+def parse_importtime(stderr):
+    """(module, self_us, cumulative_us, depth) rows of `-X importtime` output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        depth = (len(name) - len(name.lstrip(' ')) - 1) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def _run(code):
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, 'src'), AWS_REGION='us-east-1')
+    return subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                          capture_output=True, text=True, check=True)
+
+
+def profile(handler):
+    """Best-of-RUNS import profile of a handler, excluding boto3 itself."""
+    best = None
+    for _ in range(RUNS):
+        rows = parse_importtime(_run(f'{PRELOAD}; import {handler}').stderr)
+        # rows after boto3's are the ones the handler import triggered
+        start = max(i for i, r in enumerate(rows) if r[0] in ('boto3', 'botocore.session') and r[3] == 0) + 1
+        rows = rows[start:]
+        if best is None or sum(r[2] for r in rows if r[3] == 0) < sum(r[2] for r in best if r[3] == 0):
+            best = rows
+    return best
+
+
+def report(rows, top=25):
+    total = sum(r[2] for r in rows if r[3] == 0)
+    lines = [f'total {total / 1000:.1f} ms in {len(rows)} modules', '', 'cumulative ms  self ms  module']
+    for name, self_us, cumulative_us, depth in sorted(rows, key=lambda r: -r[2])[:top]:
+        lines.append(f'{cumulative_us / 1000:13.1f}  {self_us / 1000:7.1f}  {"  " * depth}{name}')
+    return '\n'.join(lines) + '\n'
+
+
+def test_parse_importtime():
+    stderr = ('import time: self [us] | cumulative | imported package\n'
+              'import time:       120 |        120 |     app.dynamo_metrics\n'
+              'import time:       300 |        420 |   app.aws_connector\n'
+              'import time:        80 |        500 | lambdas.report_generator\n'
+              'some other warning\n')
+    assert parse_importtime(stderr) == [('app.dynamo_metrics', 120, 120, 2), ('app.aws_connector', 300, 420, 1),
+                                        ('lambdas.report_generator', 80, 500, 0)]
+
+
+@pytest.mark.parametrize('handler', sorted(BUDGETS_MS))
+def test_handler_import_time_within_budget(handler, request):
+    rows = profile(handler)
+    text = report(rows)
+    request.config.cache.mkdir('import-profile').joinpath(f'{handler}.txt').write_text(text)
+    budget = float(os.getenv('AUTOWAR_IMPORT_BUDGET_MS') or BUDGETS_MS[handler])
+    total_ms = sum(r[2] for r in rows if r[3] == 0) / 1000
+    assert total_ms <= budget, f'{handler} import took {total_ms:.1f} ms (budget {budget} ms)\n{text}'
+
+
+@pytest.mark.parametrize('handler', sorted(BUDGETS_MS))
+def test_handler_import_creates_no_aws_clients(handler):
+    # AWS clients are built on first use; constructing one at import costs ~100 ms per cold start
+    code = ('import boto3\n'
+            'def fail(*a, **k): raise SystemExit("AWS client created at import: %s" % (a,))\n'
+            'boto3.client = boto3.resource = fail\n'
+            f'import {handler}')
+    _run(code)
+
+
+def test_report_generator_does_not_import_numpy():
+    # reports only need catalog lookups; the scoring matrices are built on first use
+    out = _run('import sys, lambdas.report_generator; print("numpy" in sys.modules)').stdout
+    assert out.strip() == 'False'
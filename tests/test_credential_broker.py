@@ -0,0 +1,178 @@
+import threading
+import time
+
+
+def _fake_assume(calls, ttl=3600):
+    def assume(role_arn, session_name, external_id=None, duration_seconds=3600, region=None, validate=True):
+        calls.append({'role_arn': role_arn, 'external_id': external_id, 'region': region, 'validate': validate})
+        time.sleep(0.01)
+        return {
+            'credentials': {'access_key': f'AK{len(calls)}', 'secret_key': 'S', 'session_token': 'T',
+                            'expiration': int(time.time()) + ttl},
+            'caller_identity': {'Account': '111122223333'},
+        }
+    return assume
+
+
+def test_broker_caches_per_key_and_single_flights():
+    from src.app.credential_broker import CredentialBroker
+
+    calls = []
+    broker = CredentialBroker(assume=_fake_assume(calls))
+    threads = [threading.Thread(target=broker.get_credentials, args=('arn:role/a', 'ext', 'us-east-1')) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert calls[0]['validate'] is False
+
+    broker.get_credentials('arn:role/a', 'ext', 'eu-west-1')
+    assert len(calls) == 2
+    assert broker.get_identity('arn:role/a', 'ext', 'us-east-1') == {'Account': '111122223333'}
+    assert len(calls) == 2
+
+
+def test_broker_refreshes_ahead_in_background():
+    import src.app.credential_broker as cb
+
+    calls = []
+    # expires in 12 minutes: still usable, but inside the refresh-ahead window
+    broker = cb.CredentialBroker(assume=_fake_assume(calls, ttl=cb.REFRESH_AHEAD_SECONDS - 180))
+    first = broker.get_credentials('arn:role/b')
+    assert first['access_key'] == 'AK1'
+    second = broker.get_credentials('arn:role/b')
+    assert second['access_key'] == 'AK1'  # served from cache while refreshing
+    for _ in range(100):
+        if len(calls) == 2:
+            break
+        time.sleep(0.01)
+    assert len(calls) == 2
+
+
+def test_assume_role_without_validation_skips_get_caller_identity(monkeypatch):
+    import src.app.credentials_manager as cm
+
+    class FakeSTS:
+        def __init__(self):
+            self.identity_calls = 0
+
+        def assume_role(self, **params):
+            return {
+                'Credentials': {'AccessKeyId': 'A', 'SecretAccessKey': 'S', 'SessionToken': 'T', 'Expiration': 9999999999},
+                'AssumedRoleUser': {'AssumedRoleId': 'AROA:s', 'Arn': 'arn:aws:sts::111122223333:assumed-role/r/s'},
+            }
+
+        def get_caller_identity(self):
+            self.identity_calls += 1
+            return {}
+
+    sts = FakeSTS()
+    monkeypatch.setattr(cm, '_sts_client', lambda **kwargs: sts)
+    resp = cm.assume_role('arn:aws:iam::111122223333:role/r', 's', validate=False)
+    assert resp['caller_identity']['Account'] == '111122223333'
+    assert sts.identity_calls == 0
+
+
+def test_validators_use_broker_session(monkeypatch):
+    from src.app.credential_broker import CredentialBroker
+    import src.app.validators.manager as vm
+
+    broker = CredentialBroker(assume=_fake_assume([]))
+    session = broker.get_session('arn:role/c', region='us-east-1')
+    creds = session.get_credentials().get_frozen_credentials()
+    assert creds.access_key == 'AK1' and creds.token == 'T'
+
+    seen = []
+
+    class FakeValidator:
+        name = 'fake'
+
+        def run(self, name=None, region=None, account_id=None, extra=None, session=None):
+            seen.append(session)
+            return {'name': self.name, 'status': 'PASS'}
+
+    monkeypatch.setitem(vm.VALIDATOR_MAP, 'fake', [FakeValidator()])
+    vm.run_validators_for_evaluation([{'type': 'fake', 'name': 'x'}], session=session)
+    assert seen == [session]
+
+
+def test_records_of_other_clients_or_without_role_are_rejected():
+    import pytest
+    from src.app.credential_broker import CredentialBroker, CredentialScopeError
+
+    broker = CredentialBroker(assume=_fake_assume([]))
+    role = {'id': 'cr-1', 'client_id': 'c1', 'type': 'role', 'role_arn': 'arn:role/c1'}
+    assert broker.session_for_record(role, 'us-east-1', client_id='c1') is not None
+    with pytest.raises(CredentialScopeError):
+        broker.session_for_record(role, 'us-east-1', client_id='c2')
+    with pytest.raises(CredentialScopeError):
+        broker.session_for_record({'id': 'cr-2', 'client_id': 'c1', 'type': 'keys', 'secret_arn': 'arn:secret'},
+                                  client_id='c1')
+
+
+def test_worker_marks_evaluation_failed_when_credentials_are_rejected(monkeypatch):
+    import json
+    import src.lambdas.evaluation_worker as worker
+
+    class FakeTable:
+        def __init__(self):
+            self.updates = []
+
+        def update_item(self, Key=None, UpdateExpression=None, ExpressionAttributeNames=None,
+                        ExpressionAttributeValues=None, **kwargs):
+            self.updates.append(ExpressionAttributeValues)
+
+    table = FakeTable()
+    monkeypatch.setattr(worker, 'dynamo', type('D', (), {'Table': lambda name: table}))
+    rejected = []
+
+    class FakeBroker:
+        def session_for_credential(self, credential_id, region=None, client_id=None):
+            rejected.append((credential_id, client_id))
+            raise RuntimeError('credential record cr-9 does not belong to client c1')
+
+    monkeypatch.setattr(worker, 'broker', FakeBroker())
+    monkeypatch.setattr(worker, 'evaluate', lambda *a, **k: (_ for _ in ()).throw(AssertionError('validators ran')))
+
+    item = {'id': 'ev-9', 'client_id': 'c1', 'credential_id': 'cr-9', 'targets': [{'type': 's3', 'name': 'b'}]}
+    res = worker.handler({'Records': [{'body': json.dumps({'evaluationId': 'ev-9', 'item': item})}]}, {})
+    assert res['processed'] == 1
+    assert rejected == [('cr-9', 'c1')]
+    assert [u[':s'] for u in table.updates] == ['RUNNING', 'FAILED']
+    assert 'does not belong' in table.updates[-1][':e']
+
+
+def test_cached_records_expire_and_inactive_records_are_rejected(monkeypatch):
+    import pytest
+    import src.app.credential_broker as cb
+
+    record = {'id': 'cr-1', 'client_id': 'c1', 'type': 'role', 'role_arn': 'arn:role/c1', 'status': 'ACTIVE'}
+    reads = []
+
+    class FakeTable:
+        def get_item(self, Key):
+            reads.append(Key['id'])
+            return {'Item': dict(record)}
+
+    clock = [1000.0]
+    monkeypatch.setattr(cb, 'get_table', lambda name: FakeTable())
+    monkeypatch.setattr(cb.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(cb, 'RECORD_TTL_SECONDS', 60)
+    broker = cb.CredentialBroker(assume=_fake_assume([]))
+
+    broker.session_for_credential('cr-1', client_id='c1')
+    broker.session_for_credential('cr-1', client_id='c1')
+    assert reads == ['cr-1']
+
+    # revoked after it was cached: rejected once the cached copy is re-read
+    record['status'] = 'expired'
+    clock[0] += 61
+    with pytest.raises(cb.CredentialScopeError):
+        broker.session_for_credential('cr-1', client_id='c1')
+    assert reads == ['cr-1', 'cr-1']
+
+    record.update(status='active', expiry_ts=int(time.time()) - 1)
+    clock[0] += 61
+    with pytest.raises(cb.CredentialScopeError):
+        broker.session_for_credential('cr-1', client_id='c1')
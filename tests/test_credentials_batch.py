@@ -0,0 +1,111 @@
+def test_credentials_batch_reports_per_entry(monkeypatch):
+    from fastapi.testclient import TestClient
+    import src.app.main as main
+    import src.app.auth as auth
+
+    monkeypatch.setattr(auth, 'API_KEY', 'k')
+
+    def fake_assume(role_arn, session_name, external_id=None, region=None, validate=True):
+        if 'denied' in role_arn:
+            raise Exception('AccessDenied')
+        return {'caller_identity': {'Account': role_arn.split(':')[4]}}
+
+    written = []
+
+    import threading
+    lock = threading.Lock()
+
+    class FakeClient:
+        def batch_write_item(self, RequestItems):
+            with lock:
+                written.extend(r['PutRequest']['Item'] for r in RequestItems['autowar-credentials'])
+            return {}
+
+    class FakeTable:
+        name = 'autowar-credentials'
+
+        class meta:
+            client = FakeClient()
+
+    import src.app.credentials_manager as cm
+    monkeypatch.setattr(main, 'assume_role', fake_assume)
+    monkeypatch.setattr(cm, 'get_table', lambda name: FakeTable())
+
+    entries = [{'client_id': 'msp-1', 'role_arn': f'arn:aws:iam::{100000000000 + i}:role/AutoWAR'} for i in range(30)]
+    entries.append({'client_id': 'msp-1', 'role_arn': 'arn:aws:iam::999999999999:role/denied'})
+    entries.append({'client_id': 'msp-1'})
+
+    resp = TestClient(main.app).post('/credentials:batch', json={'entries': entries}, headers={'x-api-key': 'k'})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body['succeeded'] == 30 and body['failed'] == 2
+    assert [r['index'] for r in body['results']] == list(range(32))
+    assert body['results'][5]['record']['caller_identity']['Account'] == '100000000005'
+    assert 'AssumeRole failed' in body['results'][30]['error']
+    assert body['results'][31]['ok'] is False
+    assert len(written) == 30
+
+
+def test_single_credentials_endpoint_shares_the_batch_validation(monkeypatch):
+    from fastapi.testclient import TestClient
+    import src.app.main as main
+    import src.app.auth as auth
+
+    monkeypatch.setattr(auth, 'API_KEY', 'k')
+    calls = []
+
+    def fake_assume(role_arn, session_name, external_id=None, region=None, validate=True):
+        calls.append(validate)
+        if 'denied' in role_arn:
+            raise Exception('AccessDenied')
+        return {'caller_identity': {'Account': '123456789012'}}
+
+    def failing_store(*args):
+        raise Exception('throttled')
+
+    monkeypatch.setattr(main, 'assume_role', fake_assume)
+    monkeypatch.setattr(main, 'validate_keys', lambda *args: {'Account': '123456789012'})
+    monkeypatch.setattr(main, 'store_secret_for_keys', failing_store)
+    monkeypatch.setattr(main, 'register_credential_record', lambda client_id, rec: dict(rec, client_id=client_id))
+    client = TestClient(main.app)
+    headers = {'x-api-key': 'k'}
+
+    resp = client.post('/credentials', json={'client_id': 'c1', 'role_arn': 'arn:aws:iam::123456789012:role/A'},
+                       headers=headers)
+    assert resp.status_code == 201 and resp.json()['record']['type'] == 'role'
+    # the single endpoint still confirms the identity; the batch one trusts AssumeRole
+    assert calls == [True]
+
+    resp = client.post('/credentials', json={'client_id': 'c1', 'role_arn': 'arn:aws:iam::1:role/denied'}, headers=headers)
+    assert resp.status_code == 400 and 'AssumeRole failed' in resp.json()['detail']
+    resp = client.post('/credentials', json={'client_id': 'c1'}, headers=headers)
+    assert resp.status_code == 400
+    resp = client.post('/credentials', json={'client_id': 'c1', 'access_key_id': 'AKIA', 'secret_access_key': 's',
+                                             'save_secret': True}, headers=headers)
+    assert resp.status_code == 500 and 'Secrets Manager error' in resp.json()['detail']
+
+
+def test_batch_registration_failure_reports_entries_and_removes_their_secrets(monkeypatch):
+    from fastapi.testclient import TestClient
+    import src.app.main as main
+    import src.app.auth as auth
+
+    monkeypatch.setattr(auth, 'API_KEY', 'k')
+    deleted = []
+
+    def failing_register(records):
+        raise RuntimeError('throttled')
+
+    monkeypatch.setattr(main, 'validate_keys', lambda *args: {'Account': '123456789012'})
+    monkeypatch.setattr(main, 'store_secret_for_keys', lambda client_id, *args: f'arn:secret/{client_id}')
+    monkeypatch.setattr(main, 'delete_secret', lambda arn, region=None: deleted.append(arn))
+    monkeypatch.setattr(main, 'register_credential_records', failing_register)
+
+    entries = [{'client_id': f'c{i}', 'access_key_id': 'AKIA', 'secret_access_key': 's'} for i in range(2)]
+    entries.append({'client_id': 'c9'})
+    resp = TestClient(main.app).post('/credentials:batch', json={'entries': entries}, headers={'x-api-key': 'k'})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body['succeeded'] == 0 and body['failed'] == 3
+    assert all('Failed to register credentials' in r['error'] for r in body['results'][:2])
+    assert sorted(deleted) == ['arn:secret/c0', 'arn:secret/c1']
@@ -0,0 +1,79 @@
+import src.app.credentials_manager as cm
+
+
+def test_register_sets_sparse_index_attributes(monkeypatch):
+    captured = {}
+
+    class FakeTable:
+        def put_item(self, Item):
+            captured['item'] = Item
+
+    monkeypatch.setattr(cm, 'get_table', lambda name: FakeTable())
+    monkeypatch.setattr(cm, '_now_ts', lambda: 0)
+    saved = cm.register_credential_record('c1', {'type': 'keys', 'last_rotated_ts': 0, 'rotation_interval_days': 2})
+    assert saved['next_rotation_ts'] == 2 * 24 * 3600
+    assert saved['rotation_bucket'] == '1970-01-03'
+    # no expiry: the item must stay out of the expiry index
+    assert 'expiry_bucket' not in captured['item']
+
+
+def test_due_credential_items_paginates_and_dedupes():
+    now = 10 * 24 * 3600
+    pages = {
+        ('expiryIndex', cm.day_bucket(now)): [
+            {'Items': [{'id': 'a'}], 'LastEvaluatedKey': {'id': 'a'}},
+            {'Items': [{'id': 'b'}]},
+        ],
+        ('rotationIndex', cm.day_bucket(now - 24 * 3600)): [{'Items': [{'id': 'b'}, {'id': 'c'}]}],
+    }
+    queries = []
+
+    class FakeTable:
+        def query(self, IndexName, KeyConditionExpression, ExclusiveStartKey=None):
+            bucket = KeyConditionExpression.get_expression()['values'][0].get_expression()['values'][1]
+            queries.append((IndexName, bucket, ExclusiveStartKey))
+            key = (IndexName, bucket)
+            if key not in pages:
+                return {'Items': []}
+            return pages[key][1 if ExclusiveStartKey else 0]
+
+    items = list(cm.due_credential_items(FakeTable(), now=now, lookback_days=2))
+    assert [i['id'] for i in items] == ['a', 'b', 'c']
+    # 3 buckets per index, plus one follow-up page
+    assert len(queries) == 7
+    assert ('expiryIndex', cm.day_bucket(now), {'id': 'a'}) in queries
+
+
+def test_rotation_done_update_schedules_next_bucket(monkeypatch):
+    monkeypatch.setattr(cm, '_now_ts', lambda: 0)
+    expr, values = cm.rotation_done_update(1, expiry_ts=3600)
+    assert expr == ('SET last_rotated_ts = :t, expiry_bucket = :expiry_bucket, next_rotation_ts = :next_rotation_ts, '
+                    'rotation_bucket = :rotation_bucket, expiry_ts = :expiry_ts REMOVE rotation_due')
+    assert values[':rotation_bucket'] == '1970-01-02'
+    assert values[':expiry_bucket'] == '1970-01-01'
+
+
+def test_overdue_records_are_bucketed_today_and_failures_retry_tomorrow(monkeypatch):
+    now = 100 * 24 * 3600
+    # backfilled record whose rotation was due 30 days ago and which expired 20 days ago
+    attrs = cm.lifecycle_index_attrs(expiry_ts=now - 20 * 24 * 3600, last_rotated_ts=now - 40 * 24 * 3600,
+                                     rotation_interval_days=10, now=now)
+    assert attrs['expiry_bucket'] == attrs['rotation_bucket'] == cm.day_bucket(now)
+    assert attrs['next_rotation_ts'] == now - 30 * 24 * 3600
+    # not yet due: stays in its own day
+    assert cm.lifecycle_index_attrs(expiry_ts=now + 5 * 24 * 3600, now=now)['expiry_bucket'] == cm.day_bucket(now + 5 * 24 * 3600)
+
+    import src.lambdas.credentials_maintenance as lam
+
+    updates = []
+
+    class FakeTable:
+        def update_item(self, Key, UpdateExpression, ExpressionAttributeValues):
+            updates.append((UpdateExpression, ExpressionAttributeValues))
+
+    monkeypatch.setattr(lam, '_now_ts', lambda: now)
+    # record without a secret or role: nothing can rotate it
+    assert lam._process_item(FakeTable(), {'id': 'k1', 'rotation_interval_days': 1, 'last_rotated_ts': 0}) == 'rotation'
+    [(expr, values)] = updates
+    assert expr == 'SET rotation_due = :r, rotation_bucket = :b'
+    assert values == {':r': now, ':b': cm.day_bucket(now + 24 * 3600)}
@@ -0,0 +1,116 @@
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+
+class FakeTable:
+    def __init__(self, items):
+        self.items = items
+        self.updated = []
+
+    def query(self, IndexName=None, KeyConditionExpression=None, ExclusiveStartKey=None):
+        return {'Items': self.items if IndexName == 'rotationIndex' else []}
+
+    def update_item(self, Key=None, UpdateExpression=None, ExpressionAttributeValues=None, ExpressionAttributeNames=None):
+        self.updated.append(Key['id'])
+
+
+def _items(n, clients=1):
+    # due for rotation, no secret or role: the handler only flags them for manual action
+    return [{'id': f'cred-{i}', 'client_id': f'client-{i % clients}', 'rotation_interval_days': 1, 'last_rotated_ts': 0}
+            for i in range(n)]
+
+
+def test_per_client_concurrency_cap(monkeypatch):
+    import src.lambdas.credentials_maintenance as lam
+
+    active = {}
+    peak = {}
+    lock = threading.Lock()
+
+    def slow_process(table, item):
+        c = item['client_id']
+        with lock:
+            active[c] = active.get(c, 0) + 1
+            peak[c] = max(peak.get(c, 0), active[c])
+        time.sleep(0.02)
+        with lock:
+            active[c] -= 1
+        return 'rotation'
+
+    monkeypatch.setattr(lam, '_process_item', slow_process)
+    monkeypatch.setattr(lam, 'PER_CLIENT_CONCURRENCY', 2)
+    monkeypatch.setattr(lam, 'MAINTENANCE_CONCURRENCY', 8)
+    counts, leftover = lam._process_items(FakeTable([]), _items(24, clients=3), {})
+    assert counts['rotation'] == 24 and leftover == []
+    assert max(peak.values()) <= 2
+
+
+def test_time_budget_checkpoints_by_reinvoking(monkeypatch):
+    import src.lambdas.credentials_maintenance as lam
+
+    fake_table = FakeTable(_items(5))
+    invoked = []
+    monkeypatch.setattr(lam, 'dynamo', SimpleNamespace(Table=lambda name: fake_table))
+    monkeypatch.setattr(lam, 'MAINTENANCE_QUEUE_URL', None)
+    monkeypatch.setattr(lam, 'MAINTENANCE_CONCURRENCY', 1)
+    monkeypatch.setattr(lam, '_get_lambda', lambda: SimpleNamespace(invoke=lambda **kw: invoked.append(kw)))
+
+    budget = iter([60000, 60000] + [1000] * 10)
+    context = SimpleNamespace(function_name='maintenance', get_remaining_time_in_millis=lambda: next(budget))
+
+    body = json.loads(lam.handler({}, context)['body'])
+    assert body['rotation_marked'] == 2
+    assert body['deferred'] == 3
+    assert body['continuation'] == 'reinvoked'
+    assert json.loads(invoked[0]['Payload'])['continuation'] == 1
+
+
+def test_queue_records_report_deferred_items_as_failures(monkeypatch):
+    import src.lambdas.credentials_maintenance as lam
+
+    fake_table = FakeTable([])
+    monkeypatch.setattr(lam, 'dynamo', SimpleNamespace(Table=lambda name: fake_table))
+    monkeypatch.setattr(lam, 'MAINTENANCE_CONCURRENCY', 1)
+    event = {'Records': [{'messageId': f'm{i}', 'body': json.dumps({'item': item})} for i, item in enumerate(_items(3))]}
+    event['Records'].append({'messageId': 'bad', 'body': 'not-json'})
+
+    budget = iter([60000] + [1000] * 10)
+    context = SimpleNamespace(get_remaining_time_in_millis=lambda: next(budget))
+    res = lam.handler(event, context)
+    assert res['rotation_marked'] == 1
+    assert {f['itemIdentifier'] for f in res['batchItemFailures']} == {'m1', 'm2', 'bad'}
+
+
+def test_fanout_retries_failed_entries_and_counts_only_queued(monkeypatch):
+    import src.lambdas.credentials_maintenance as lam
+
+    sent = []
+
+    class FakeSQS:
+        def send_message_batch(self, QueueUrl, Entries):
+            ok, failed = [], []
+            for e in Entries:
+                item_id = json.loads(e['MessageBody'])['item']['id']
+                if item_id == 'cred-3':
+                    failed.append({'Id': e['Id'], 'SenderFault': True, 'Code': 'InvalidParameterValue'})
+                elif item_id == 'cred-5' and item_id not in [s for s, _ in sent]:
+                    # throttled once, accepted on the retry
+                    sent.append((item_id, False))
+                    failed.append({'Id': e['Id'], 'SenderFault': False, 'Code': 'InternalError'})
+                else:
+                    sent.append((item_id, True))
+                    ok.append({'Id': e['Id'], 'MessageId': item_id})
+            return {'Successful': ok, 'Failed': failed}
+
+    fake_table = FakeTable(_items(12))
+    monkeypatch.setattr(lam, 'dynamo', SimpleNamespace(Table=lambda name: fake_table))
+    monkeypatch.setattr(lam, '_sqs', FakeSQS())
+    monkeypatch.setattr(lam, 'MAINTENANCE_QUEUE_URL', 'https://sqs/maintenance')
+    monkeypatch.setattr(lam, 'FANOUT_THRESHOLD', 5)
+    monkeypatch.setattr(lam.time, 'sleep', lambda s: None)
+
+    body = json.loads(lam.handler({}, SimpleNamespace())['body'])
+    assert body == {'dispatched': 11, 'not_dispatched': 1}
+    assert ('cred-5', True) in sent and not any(i == 'cred-3' for i, _ in sent)
@@ -31,3 +31,31 @@ def test_register_credential_record(monkeypatch):
     assert saved["client_id"] == "client-1"
     assert 'id' in saved
     assert captured['item']['client_id'] == 'client-1'
+
+
+def test_clients_are_cached_per_service_and_region(monkeypatch):
+    cm.reset_clients()
+    created = []
+
+    def fake_client(service_name, **kwargs):
+        created.append((service_name, kwargs))
+        return object()
+
+    monkeypatch.setattr('boto3.client', fake_client)
+    sm1 = cm._client('secretsmanager', 'us-east-1')
+    assert cm._client('secretsmanager', 'us-east-1') is sm1
+    assert cm._client('secretsmanager', 'eu-west-1') is not sm1
+    assert cm._sts_client('us-east-1') is cm._sts_client('us-east-1')
+    # caller-supplied keys never land in the shared cache
+    cm._sts_client('us-east-1', aws_access_key_id='AKIA', aws_secret_access_key='SECRET')
+    assert len(created) == 4
+    assert ('sts', 'us-east-1') in cm._clients and len(cm._clients) == 3
+    cm.reset_clients()
+
+
+def test_regional_sts_endpoint(monkeypatch):
+    cm.reset_clients()
+    monkeypatch.setattr(cm, 'STS_REGIONAL_ENDPOINTS', True)
+    sts = cm._sts_client('eu-west-1')
+    assert sts.meta.endpoint_url == 'https://sts.eu-west-1.amazonaws.com'
+    cm.reset_clients()
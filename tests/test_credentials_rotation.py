@@ -19,6 +19,9 @@ def test_credentials_maintenance_rotation(monkeypatch):
         def scan(self):
             return {'Items': [item]}
 
+        def query(self, IndexName=None, KeyConditionExpression=None, ExclusiveStartKey=None):
+            return {'Items': [item] if IndexName == 'rotationIndex' else []}
+
         def update_item(self, Key=None, UpdateExpression=None, ExpressionAttributeValues=None, ExpressionAttributeNames=None):
             self.updated.append({'Key': Key, 'UpdateExpression': UpdateExpression, 'Values': ExpressionAttributeValues})
 
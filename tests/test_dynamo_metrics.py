@@ -0,0 +1,74 @@
+import io
+import json
+
+import boto3
+from botocore.stub import Stubber
+
+
+def _sent_params(client):
+    # the parameters that get serialized, as left by every before-parameter-build hook
+    sent = []
+    client.meta.events.register('before-parameter-build.dynamodb', lambda params, **kw: sent.append(params))
+    return sent
+
+
+def test_instrumented_client_requests_index_capacity_and_emits_emf(monkeypatch):
+    import src.app.dynamo_metrics as dm
+
+    sink = dm.DynamoMetrics(namespace='Test', stream=io.StringIO())
+    monkeypatch.setattr(dm, 'metrics', sink)
+    client = dm.instrument_client(boto3.client('dynamodb', region_name='us-east-1',
+                                               aws_access_key_id='x', aws_secret_access_key='y'))
+    sent = _sent_params(client)
+    stubber = Stubber(client)
+    stubber.add_response('query', {'Items': [], 'ConsumedCapacity': {
+        'TableName': 'autowar-evaluations', 'CapacityUnits': 1.5,
+        'Table': {'CapacityUnits': 0.0}, 'GlobalSecondaryIndexes': {'clientIndex': {'CapacityUnits': 1.5}}}})
+    stubber.add_response('put_item', {'ConsumedCapacity': {'TableName': 'autowar-evaluations', 'CapacityUnits': 2.0}})
+    with stubber:
+        client.query(TableName='autowar-evaluations', IndexName='clientIndex',
+                     KeyConditionExpression='client_id = :c', ExpressionAttributeValues={':c': {'S': 'c1'}})
+        client.put_item(TableName='autowar-evaluations', Item={'id': {'S': 'e1'}}, ReturnConsumedCapacity='TOTAL')
+    stubber.assert_no_pending_responses()
+    assert [b['ReturnConsumedCapacity'] for b in sent] == ['INDEXES', 'TOTAL']
+
+    sink.flush()
+    docs = [json.loads(line) for line in sink.stream.getvalue().splitlines()]
+    by_dims = {(d['TableName'], d['IndexName'], d['Operation']): d for d in docs}
+    query = by_dims[('autowar-evaluations', 'clientIndex', 'Query')]
+    assert query['ConsumedRCU'] == [1.5] and len(query['Latency']) == 1
+    assert query['_aws']['CloudWatchMetrics'][0]['Namespace'] == 'Test'
+    assert by_dims[('autowar-evaluations', 'table', 'PutItem')]['ConsumedWCU'] == [2.0]
+
+
+def test_batch_responses_are_attributed_per_table():
+    from src.app.dynamo_metrics import DynamoMetrics, record_response
+
+    sink = DynamoMetrics(stream=io.StringIO())
+    record_response('BatchWriteItem', {'RequestItems': {'a': [], 'b': []}},
+                    {'ConsumedCapacity': [{'TableName': 'a', 'CapacityUnits': 3.0},
+                                          {'TableName': 'b', 'CapacityUnits': 1.0,
+                                           'Table': {'CapacityUnits': 1.0}}]}, 4.0, sink=sink)
+    assert sink._samples[('a', 'table', 'BatchWriteItem')] == {'Latency': [4.0], 'ConsumedRCU': [], 'ConsumedWCU': [3.0]}
+    assert sink._samples[('b', 'table', 'BatchWriteItem')]['ConsumedWCU'] == [1.0]
+
+
+def test_resource_table_calls_request_consumed_capacity(monkeypatch):
+    import src.app.dynamo_metrics as dm
+
+    sink = dm.DynamoMetrics(namespace='Test', stream=io.StringIO())
+    monkeypatch.setattr(dm, 'metrics', sink)
+    resource = dm.instrument_resource(boto3.resource('dynamodb', region_name='us-east-1',
+                                                     aws_access_key_id='x', aws_secret_access_key='y'))
+    sent = _sent_params(resource.meta.client)
+    stubber = Stubber(resource.meta.client)
+    stubber.add_response('get_item', {'Item': {'id': {'S': 'e1'}}, 'ConsumedCapacity': {
+        'TableName': 'autowar-evaluations', 'CapacityUnits': 0.5}})
+    with stubber:
+        assert resource.Table('autowar-evaluations').get_item(Key={'id': 'e1'})['Item'] == {'id': 'e1'}
+    stubber.assert_no_pending_responses()
+    assert [p['ReturnConsumedCapacity'] for p in sent] == ['INDEXES']
+
+    sink.flush()
+    [doc] = [json.loads(line) for line in sink.stream.getvalue().splitlines()]
+    assert doc['Operation'] == 'GetItem' and doc['ConsumedRCU'] == [0.5]
@@ -0,0 +1,93 @@
+import asyncio
+import threading
+
+
+def test_events_from_stream_record():
+    import src.app.evaluation_events as ev
+
+    record = {
+        'eventName': 'MODIFY',
+        'dynamodb': {
+            'OldImage': {'id': {'S': 'ev-1'}, 'status': {'S': 'RUNNING'}, 'results': {'L': []}},
+            'NewImage': {
+                'id': {'S': 'ev-1'},
+                'status': {'S': 'COMPLETED'},
+                'results': {'L': [{'M': {'name': {'S': 's3-public-access'}, 'status': {'S': 'PASS'}}}]},
+            },
+        },
+    }
+    events = ev.events_from_stream_record(record)
+    assert [e['event'] for e in events] == ['result', 'status']
+    assert events[0]['data']['result']['name'] == 's3-public-access'
+    assert events[1]['data']['status'] == 'COMPLETED'
+
+
+def test_stream_evaluation_events_until_terminal():
+    import src.app.evaluation_events as ev
+
+    async def consume():
+        frames = []
+        gen = ev.stream_evaluation_events({'id': 'ev-2', 'status': 'RUNNING'}, heartbeat=0.05)
+        frames.append(await gen.__anext__())
+
+        def worker():
+            ev.publish_result('ev-2', {'name': 'iam-root-mfa', 'status': 'PASS'})
+            ev.publish_status('ev-2', 'COMPLETED')
+
+        threading.Thread(target=worker).start()
+        async for frame in gen:
+            frames.append(frame)
+        return frames
+
+    frames = asyncio.run(consume())
+    frames = [f for f in frames if not f.startswith(':')]
+    assert frames[0].startswith('event: status')
+    assert frames[1].startswith('event: result') and 'iam-root-mfa' in frames[1]
+    assert frames[-1].startswith('event: status') and 'COMPLETED' in frames[-1]
+    assert 'ev-2' not in ev.broker._subscribers
+
+
+def test_events_endpoint_completed_evaluation(monkeypatch):
+    from fastapi.testclient import TestClient
+    import src.app.main as main
+
+    item = {'id': 'ev-3', 'evaluationId': 'ev-3', 'status': 'COMPLETED', 'results': [{'name': 'cloudtrail-logging', 'status': 'PASS'}]}
+    monkeypatch.setattr(main, 'get_evaluation', lambda evaluation_id: item if evaluation_id == 'ev-3' else None)
+
+    client = TestClient(main.app)
+    resp = client.get('/evaluations/ev-3/events')
+    assert resp.status_code == 200
+    assert resp.headers['content-type'].startswith('text/event-stream')
+    assert resp.text.count('event: ') == 2
+    assert client.get('/evaluations/missing/events').status_code == 404
+
+
+def test_stream_falls_back_to_reloading_the_evaluation():
+    import src.app.evaluation_events as ev
+
+    # progress made by another process (the worker Lambda) never reaches this broker
+    reads = [{'id': 'ev-4', 'status': 'RUNNING', 'results': [{'name': 'iam-root-mfa', 'status': 'PASS'}]},
+             {'id': 'ev-4', 'status': 'COMPLETED', 'results': [{'name': 'iam-root-mfa', 'status': 'PASS'},
+                                                                {'name': 'waf-web-acl', 'status': 'FAIL'}]}]
+
+    async def consume():
+        gen = ev.stream_evaluation_events({'id': 'ev-4', 'status': 'PENDING'}, heartbeat=0.01,
+                                          reload=lambda: reads.pop(0) if len(reads) > 1 else reads[0])
+        return [frame async for frame in gen]
+
+    frames = [f for f in asyncio.run(consume()) if not f.startswith(':')]
+    assert [f.split('\n')[0] for f in frames] == ['event: status', 'event: result', 'event: status', 'event: result',
+                                                  'event: status']
+    assert 'RUNNING' in frames[2] and 'waf-web-acl' in frames[3] and 'COMPLETED' in frames[4]
+
+
+def test_stream_ends_after_max_lifetime():
+    import src.app.evaluation_events as ev
+
+    async def consume():
+        gen = ev.stream_evaluation_events({'id': 'ev-5', 'status': 'RUNNING'}, heartbeat=0.01, max_seconds=0.05)
+        return [frame async for frame in gen]
+
+    frames = asyncio.run(consume())
+    assert frames[0].startswith('event: status') and all(f.startswith(':') for f in frames[1:])
+    assert 'ev-5' not in ev.broker._subscribers
@@ -0,0 +1,131 @@
+import gzip
+import io
+import json
+
+
+class FakeClient:
+    def __init__(self, items):
+        self.items = items
+
+    def batch_get_item(self, RequestItems):
+        (name, req), = RequestItems.items()
+        return {'Responses': {name: [self.items[k['id']] for k in req['Keys'] if k['id'] in self.items]}}
+
+    def batch_write_item(self, RequestItems):
+        (name, reqs), = RequestItems.items()
+        for r in reqs:
+            self.items[r['PutRequest']['Item']['id']] = r['PutRequest']['Item']
+        return {}
+
+
+class FakeTable:
+    name = 'autowar-evidence-technical'
+
+    def __init__(self):
+        self.items = {}
+        self.ttl_updates = []
+        self.meta = type('Meta', (), {'client': FakeClient(self.items)})()
+
+        self.queries = []
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues=None, **kwargs):
+        if UpdateExpression.startswith('REMOVE'):
+            self.ttl_updates.append((Key['id'], None))
+            self.items[Key['id']].pop('ttl', None)
+            return
+        self.ttl_updates.append((Key['id'], ExpressionAttributeValues[':t']))
+        self.items[Key['id']]['ttl'] = ExpressionAttributeValues[':t']
+
+    def query(self, IndexName, KeyConditionExpression, **kwargs):
+        attr, value = KeyConditionExpression.get_expression()['values']
+        self.queries.append((IndexName, value))
+        return {'Items': [i for i in self.items.values() if i.get(attr.name) == value]}
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+
+def _archive(table, s3):
+    from src.app.evidence_retention import EvidenceArchive
+    from src.app.evidence_store import EvidenceStore
+    from src.app.repository import EvidenceRepository, ID_SCHEMA
+
+    return EvidenceArchive(EvidenceStore(EvidenceRepository(table, schema=ID_SCHEMA)), bucket='archive', s3=s3)
+
+
+def test_ttl_follows_plan_and_reused_blobs_are_extended(monkeypatch):
+    import src.app.evidence_retention as er
+
+    day = 24 * 3600
+    assert er.ttl_for('basic', 0) == 30 * day
+    assert er.ttl_for(None, 0) == er.ttl_for(er.DEFAULT_PLAN, 0)
+    monkeypatch.setitem(er.PLAN_RETENTION_DAYS, 'forever', 0)
+    assert er.ttl_for('forever', 0) is None
+
+    table = FakeTable()
+    store = _archive(table, FakeS3()).store
+    results = [{'name': 'iam', 'resource': 'r', 'status': 'PASS', 'details': {'a': 1}}]
+    store.write_results('c1', 'e1', results, ts=0, ttl=30 * day)
+    row = next(i for i in table.items.values() if i.get('evaluation_id') == 'e1')
+    blob_id = f"BLOB#{row['details_hash']}"
+    assert row['ttl'] == table.items[blob_id]['ttl'] == 30 * day
+
+    # a premium client reuses the blob: its expiry moves out, never in
+    store.write_results('c2', 'e2', results, ts=0, ttl=365 * day)
+    store.write_results('c3', 'e3', results, ts=0, ttl=10 * day)
+    assert table.ttl_updates == [(blob_id, 365 * day)]
+
+    # a plan without retention writes rows that never expire: the blob must not either
+    store.write_results('c4', 'e4', results, ts=0, ttl=None)
+    assert table.ttl_updates[-1] == (blob_id, None) and 'ttl' not in table.items[blob_id]
+    assert store.resolve_many([i for i in table.items.values() if i.get('evaluation_id') == 'e4'])[0]['details'] == {'a': 1}
+
+
+def test_archive_and_restore_after_expiry():
+    from src.app.evidence_retention import load_evidence
+
+    table, s3 = FakeTable(), FakeS3()
+    archive = _archive(table, s3)
+    results = [{'name': 's3', 'resource': 'b', 'status': 'FAIL', 'details': {'public': True}}]
+    archive.store.write_results('c1', 'e1', results, ts=1, ttl=2)
+
+    key = archive.archive_evaluation('c1', 'e1')
+    lines = gzip.decompress(s3.objects[key]).decode().splitlines()
+    assert json.loads(lines[0])['details'] == {'public': True}
+
+    # every hot row is past its ttl: evidence comes back from the archive
+    rows = load_evidence('c1', 'e1', archive=archive, rehydrate=True)
+    assert [(r['validator'], r['details']) for r in rows] == [('s3', {'public': True})]
+    hot = [i for i in table.items.values() if i.get('evaluation_id') == 'e1' and i['ttl'] > 2]
+    assert len(hot) == 1
+    # rows are read through the evaluation index, not a table scan
+    assert table.queries and all(q == ('evaluationIdIndex', 'e1') for q in table.queries)
+
+
+def test_get_evidence_is_read_only_and_rehydration_needs_auth(monkeypatch):
+    from fastapi.testclient import TestClient
+    import src.app.main as main
+    from src.app.cognito_auth import require_cognito_auth
+
+    calls = []
+    monkeypatch.setattr(main, 'get_evaluation', lambda evaluation_id: {'evaluationId': evaluation_id, 'client_id': 'c1'})
+    monkeypatch.setattr(main, 'load_evidence', lambda client_id, evaluation_id, rehydrate=False: calls.append(rehydrate) or [])
+    client = TestClient(main.app)
+
+    assert client.get('/evaluations/e1/evidence?rehydrate=true').status_code == 200
+    assert calls == [False]
+    assert client.post('/evaluations/e1/evidence:rehydrate').status_code == 401
+    assert calls == [False]
+
+    monkeypatch.setitem(main.app.dependency_overrides, require_cognito_auth, lambda: {'sub': 'user1'})
+    resp = client.post('/evaluations/e1/evidence:rehydrate')
+    assert resp.status_code == 200 and resp.json() == {'count': 0, 'items': []}
+    assert calls == [False, True]
@@ -0,0 +1,89 @@
+import os
+
+
+class FakeClient:
+    """Serves BatchGetItem/BatchWriteItem from an in-memory dict keyed by `id`."""
+
+    def __init__(self):
+        self.items = {}
+        self.writes = []
+
+    def batch_get_item(self, RequestItems):
+        (name, req), = RequestItems.items()
+        found = [self.items[k['id']] for k in req['Keys'] if k['id'] in self.items]
+        return {'Responses': {name: found}}
+
+    def batch_write_item(self, RequestItems):
+        (name, reqs), = RequestItems.items()
+        for r in reqs:
+            item = r['PutRequest']['Item']
+            self.writes.append(item['id'])
+            self.items[item['id']] = item
+        return {}
+
+
+class FakeTable:
+    name = 'autowar-evidence-technical'
+
+    def __init__(self):
+        self.meta = type('Meta', (), {'client': FakeClient()})()
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        import io
+        return {'Body': io.BytesIO(self.objects[Key])}
+
+
+def _store(bucket=None, s3=None):
+    from src.app.evidence_store import EvidenceStore
+    from src.app.repository import EvidenceRepository, ID_SCHEMA
+
+    table = FakeTable()
+    return EvidenceStore(EvidenceRepository(table, schema=ID_SCHEMA), bucket=bucket, s3=s3), table.meta.client
+
+
+def test_repeated_evaluations_reuse_stored_details():
+    store, client = _store()
+    results = [
+        {'name': 's3', 'resource': 'bucket-a', 'status': 'PASS', 'details': {'public_block': True, 'rules': [1, 2]}},
+        {'name': 's3', 'resource': 'bucket-b', 'status': 'PASS', 'details': {'rules': [1, 2], 'public_block': True}},
+        {'name': 'iam', 'resource': 'role', 'status': 'FAIL', 'details': None},
+    ]
+    assert store.write_results('c1', 'e1', results, ts=100) == 3
+    blobs = [k for k in client.writes if k.startswith('BLOB#')]
+    # same content in a different key order hashes the same
+    assert len(blobs) == 1
+
+    client.writes.clear()
+    store.write_results('c1', 'e2', results, ts=200)
+    assert not any(k.startswith('BLOB#') for k in client.writes)
+
+    rows = [client.items[k] for k in client.writes]
+    assert all('details' not in r for r in rows)
+    resolved = store.resolve_many(rows)
+    assert resolved[0]['details'] == {'public_block': True, 'rules': [1, 2]}
+    assert 'details' not in resolved[2]
+
+
+def test_large_payloads_go_to_s3(monkeypatch):
+    import src.app.evidence_store as es
+
+    monkeypatch.setattr(es, 'INLINE_MAX_BYTES', 64)
+    s3 = FakeS3()
+    store, client = _store(bucket='evidence-bucket', s3=s3)
+    details = {'policy': os.urandom(256).hex()}
+    digest = store.store_payloads([details], ts=1)[0]
+    blob = client.items[f'BLOB#{digest}']
+    assert blob['encoding'] == 's3-gzip' and 'data' not in blob
+    assert blob['s3_key'] in s3.objects
+
+    fresh, _ = _store(bucket='evidence-bucket', s3=s3)
+    fresh.repository = store.repository
+    assert fresh.load(digest) == details
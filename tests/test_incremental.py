@@ -0,0 +1,136 @@
+import json
+import time
+
+
+class FakeConfig:
+    def __init__(self, pages=None, error=None):
+        self.pages = pages or [[]]
+        self.error = error
+        self.calls = []
+
+    def select_resource_config(self, Expression, Limit, NextToken=None):
+        if self.error:
+            raise self.error
+        self.calls.append((Expression, NextToken))
+        page = int(NextToken) if NextToken else 0
+        resp = {'Results': [json.dumps(r) for r in self.pages[page]]}
+        if page + 1 < len(self.pages):
+            resp['NextToken'] = str(page + 1)
+        return resp
+
+
+class FakeSession:
+    def __init__(self, config):
+        self.config = config
+
+    def client(self, name, region_name=None):
+        assert name == 'config'
+        return self.config
+
+
+NOW = 1_700_000_000
+PREVIOUS = {
+    'evaluationId': 'prev',
+    'created_at': NOW - 7 * 24 * 3600,
+    'results': [
+        {'name': 's3-public-access', 'resource': 'stable-bucket', 'status': 'PASS', 'details': {'public_block': True}},
+        {'name': 's3-public-access', 'resource': 'changed-bucket', 'status': 'PASS', 'details': {'public_block': True}},
+        {'name': 'cloudtrail-logging', 'status': 'PASS', 'details': {'logging': True}},
+        {'name': 'iam-password-policy', 'status': 'PASS', 'details': {}},
+        {'name': 'iam-root-mfa', 'status': 'PASS', 'details': {}},
+    ],
+}
+TARGETS = [
+    {'type': 's3', 'name': 'stable-bucket'},
+    {'type': 's3', 'name': 'changed-bucket'},
+    {'type': 'cloudtrail', 'name': 'trails'},
+    {'type': 'iam', 'name': 'account'},
+]
+
+
+def test_plan_reruns_changed_and_untracked_targets_only():
+    from src.app.incremental import plan_incremental
+
+    config = FakeConfig(pages=[
+        [{'resourceId': 'changed-bucket', 'resourceName': 'changed-bucket', 'resourceType': 'AWS::S3::Bucket'}],
+        [],
+    ])
+    plan = plan_incremental(TARGETS, PREVIOUS, session=FakeSession(config), now=NOW)
+    assert [t['name'] for t in plan.run_targets] == ['changed-bucket', 'account']
+    assert [(r['name'], r.get('resource')) for r in plan.carried] == [
+        ('s3-public-access', 'stable-bucket'), ('cloudtrail-logging', None)]
+    assert all(r['carried_from'] == 'prev' for r in plan.carried)
+    # one bulk query for all tracked types, paginated
+    assert len(config.calls) == 2
+    assert "'AWS::CloudTrail::Trail', 'AWS::S3::Bucket'" in config.calls[0][0]
+
+
+def test_unknown_changes_or_stale_baseline_force_full_run():
+    from src.app.incremental import plan_incremental
+
+    failing = FakeSession(FakeConfig(error=RuntimeError('advanced query not enabled')))
+    assert len(plan_incremental(TARGETS, PREVIOUS, session=failing, now=NOW).run_targets) == len(TARGETS)
+    stale = dict(PREVIOUS, created_at=NOW - 90 * 24 * 3600)
+    plan = plan_incremental(TARGETS, stale, session=FakeSession(FakeConfig()), now=NOW)
+    assert plan.changed is None and len(plan.run_targets) == len(TARGETS)
+
+
+def test_evaluate_merges_carried_and_fresh_results(monkeypatch):
+    import src.app.incremental as inc
+    import src.app.validators.manager as vm
+
+    ran = []
+
+    def fake_run(targets, region=None, account_id=None, on_result=None, session=None):
+        ran.extend(t['name'] for t in targets)
+        results = [{'name': 'fresh', 'resource': t['name'], 'status': 'PASS'} for t in targets]
+        for r in results:
+            on_result(r)
+        return results
+
+    monkeypatch.setattr(vm, 'run_validators_for_evaluation', fake_run)
+    monkeypatch.setattr(inc, 'changed_resources', lambda *a, **k: set())
+    seen = []
+    previous = dict(PREVIOUS, created_at=int(time.time()) - 3600)
+    results, stats = inc.evaluate({'targets': TARGETS}, previous, on_result=seen.append)
+    assert ran == ['account']
+    assert stats == {'rerun_targets': 1, 'carried_results': 3}
+    assert len(results) == len(seen) == 4
+
+
+def test_baseline_must_match_account_and_region():
+    import src.app.incremental as inc
+
+    class FakeEvaluations:
+        def __init__(self, items):
+            self.items = {i['evaluationId']: i for i in items}
+
+        def get(self, evaluation_id, client_id=None):
+            return self.items.get(evaluation_id)
+
+        def for_client(self, client_id, limit=None):
+            return [i for i in self.items.values() if i['client_id'] == client_id]
+
+    base = {'client_id': 'c1', 'account_id': '111122223333', 'region': 'us-east-1', 'status': 'COMPLETED'}
+    evaluations = FakeEvaluations([dict(base, evaluationId='other-region', region='eu-west-1'),
+                                   dict(base, evaluationId='other-account', account_id='444455556666'),
+                                   dict(base, evaluationId='same')])
+    item = dict(base, evaluationId='new', status='RUNNING')
+    assert inc.find_baseline(evaluations, dict(item, previous_evaluation_id='other-region')) is None
+    assert inc.find_baseline(evaluations, dict(item, previous_evaluation_id='other-account')) is None
+    assert inc.find_baseline(evaluations, dict(item, previous_evaluation_id='same'))['evaluationId'] == 'same'
+    assert inc.find_baseline(evaluations, item)['evaluationId'] == 'same'
+
+
+def test_account_id_is_validated_before_the_config_query():
+    import pytest
+    import src.app.incremental as inc
+
+    config = FakeConfig()
+    with pytest.raises(ValueError):
+        inc.changed_resources(NOW, ['AWS::S3::Bucket'], session=FakeSession(config),
+                              account_id="1' OR '1'='1", aggregator='org')
+    assert config.calls == []
+    # the plan treats it like any Config failure: full run
+    plan = inc.plan_incremental(TARGETS, PREVIOUS, session=FakeSession(config), account_id='bad', now=NOW)
+    assert plan.run_targets == TARGETS and plan.carried == []
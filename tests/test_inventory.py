@@ -0,0 +1,148 @@
+import json
+
+
+class FakeConfig:
+    def __init__(self, pages=None, error=None):
+        self.pages = pages or [[]]
+        self.error = error
+        self.calls = []
+
+    def select_resource_config(self, Expression, Limit, NextToken=None):
+        if self.error:
+            raise self.error
+        self.calls.append(NextToken)
+        page = int(NextToken) if NextToken else 0
+        resp = {'Results': [json.dumps(r) for r in self.pages[page]]}
+        if page + 1 < len(self.pages):
+            resp['NextToken'] = str(page + 1)
+        return resp
+
+
+class FakeTagging:
+    def __init__(self, pages):
+        self.pages = pages
+
+    def get_resources(self, ResourcesPerPage, PaginationToken=None):
+        page = int(PaginationToken) if PaginationToken else 0
+        resp = {'ResourceTagMappingList': self.pages[page]}
+        if page + 1 < len(self.pages):
+            resp['PaginationToken'] = str(page + 1)
+        return resp
+
+
+class FakeSession:
+    def __init__(self, config=None, tagging=None):
+        self.clients = {'config': config, 'resourcegroupstaggingapi': tagging}
+
+    def client(self, name, region_name=None):
+        return self.clients[name]
+
+
+class FakeInventory:
+    def __init__(self, items=None):
+        self.items = list(items or [])
+        self.written = []
+
+    def for_client(self, client_id, account_id=None):
+        return [i for i in self.items if i['client_id'] == client_id]
+
+    def put_many(self, items):
+        self.written.extend(items)
+        return len(items)
+
+
+BUCKET = {'resourceId': 'logs', 'resourceName': 'logs', 'resourceType': 'AWS::S3::Bucket',
+          'arn': 'arn:aws:s3:::logs', 'awsRegion': 'us-east-1', 'tags': [{'key': 'env', 'value': 'prod'}],
+          'configurationItemCaptureTime': '2024-01-01T00:00:00Z'}
+VPC = {'resourceId': 'vpc-1', 'resourceType': 'AWS::EC2::VPC', 'arn': 'arn:aws:ec2:us-east-1:111:vpc/vpc-1',
+       'awsRegion': 'us-east-1', 'tags': [], 'configurationItemCaptureTime': '2024-01-01T00:00:00Z'}
+
+
+def test_config_discovery_pages_through_results():
+    from src.app.inventory import discover_resources
+
+    config = FakeConfig(pages=[[BUCKET], [VPC]])
+    source, resources = discover_resources(FakeSession(config=config), 'us-east-1')
+    assert source == 'config'
+    assert config.calls == [None, '1']
+    assert [r['resourceArn'] for r in resources] == ['arn:aws:s3:::logs', 'arn:aws:ec2:us-east-1:111:vpc/vpc-1']
+    assert resources[0]['tags'] == {'env': 'prod'}
+
+
+def test_falls_back_to_tagging_api_when_config_fails():
+    from src.app.inventory import discover_resources
+
+    tagging = FakeTagging([
+        [{'ResourceARN': 'arn:aws:s3:::logs', 'Tags': [{'Key': 'env', 'Value': 'prod'}]}],
+        [{'ResourceARN': 'arn:aws:ec2:us-east-1:111:vpc/vpc-1', 'Tags': []}],
+    ])
+    source, resources = discover_resources(FakeSession(FakeConfig(error=RuntimeError('no recorder')), tagging), 'us-east-1')
+    assert source == 'tagging'
+    assert [(r['resourceType'], r['resourceId']) for r in resources] == [
+        ('AWS::S3::Bucket', 'logs'), ('AWS::EC2::VPC', 'vpc-1')]
+
+
+def test_sync_writes_only_new_changed_and_removed():
+    from src.app.inventory import discover_resources, fingerprint, sync_inventory
+
+    _, resources = discover_resources(FakeSession(FakeConfig(pages=[[BUCKET, VPC]])), 'us-east-1')
+    bucket, vpc = resources
+    stored = [
+        dict(bucket, client_id='c1', account_id='111', fingerprint=fingerprint(bucket), status='ACTIVE', discovered_at=1),
+        dict(vpc, client_id='c1', account_id='111', fingerprint='old', status='ACTIVE', discovered_at=2),
+        {'client_id': 'c1', 'account_id': '111', 'resourceArn': 'arn:aws:s3:::gone', 'resourceType': 'AWS::S3::Bucket',
+         'resourceId': 'gone', 'region': 'us-east-1', 'status': 'ACTIVE', 'discovered_at': 3},
+    ]
+    repo = FakeInventory(stored)
+    counts = sync_inventory('c1', '111', resources, repo, now=100)
+    assert counts == {'discovered': 2, 'new': 0, 'changed': 1, 'unchanged': 1, 'removed': 1}
+    by_arn = {i['resourceArn']: i for i in repo.written}
+    assert set(by_arn) == {vpc['resourceArn'], 'arn:aws:s3:::gone'}
+    assert by_arn[vpc['resourceArn']]['discovered_at'] == 2
+    assert by_arn['arn:aws:s3:::gone']['status'] == 'DELETED'
+
+    # second run with nothing changed writes nothing
+    repo = FakeInventory([dict(i, client_id='c1') for i in repo.written] + [stored[0]])
+    assert sync_inventory('c1', '111', resources, repo, now=200)['unchanged'] == 2
+    assert repo.written == []
+
+
+def test_sync_only_removes_resources_of_the_synced_account_and_region():
+    from src.app.inventory import discover_resources, fingerprint, sync_inventory
+
+    _, resources = discover_resources(FakeSession(FakeConfig(pages=[[BUCKET]])), 'us-east-1')
+    [bucket] = resources
+
+    def stored(arn, region, account='111'):
+        return {'client_id': 'c1', 'account_id': account, 'resourceArn': arn, 'resourceType': 'AWS::EC2::VPC',
+                'resourceId': arn.rsplit('/', 1)[-1], 'region': region, 'status': 'ACTIVE', 'discovered_at': 1}
+
+    repo = FakeInventory([
+        dict(bucket, client_id='c1', account_id='111', fingerprint=fingerprint(bucket), status='ACTIVE', discovered_at=1),
+        stored('arn:aws:ec2:us-east-1:111:vpc/vpc-gone', 'us-east-1'),
+        stored('arn:aws:ec2:eu-west-1:111:vpc/vpc-eu', 'eu-west-1'),
+        stored('arn:aws:ec2:us-east-1:222:vpc/vpc-other-account', 'us-east-1', account='222'),
+    ])
+    counts = sync_inventory('c1', '111', resources, repo, now=100, region='us-east-1')
+    assert counts['removed'] == 1
+    assert [(i['resourceArn'], i['status']) for i in repo.written] == [('arn:aws:ec2:us-east-1:111:vpc/vpc-gone', 'DELETED')]
+
+    # syncing eu-west-1 with nothing found there leaves us-east-1 alone
+    repo.written = []
+    assert sync_inventory('c1', '111', [], repo, now=200, region='eu-west-1')['removed'] == 1
+    assert [i['resourceArn'] for i in repo.written] == ['arn:aws:ec2:eu-west-1:111:vpc/vpc-eu']
+
+
+def test_targets_from_inventory():
+    from src.app.inventory import targets_from_inventory
+
+    items = [
+        {'resourceType': 'AWS::S3::Bucket', 'resourceName': 'logs', 'resourceId': 'logs'},
+        {'resourceType': 'AWS::EC2::VPC', 'resourceId': 'vpc-1'},
+        {'resourceType': 'AWS::S3::Bucket', 'resourceName': 'old', 'status': 'DELETED'},
+        {'resourceType': 'AWS::Lambda::Function', 'resourceId': 'fn'},
+    ]
+    targets = targets_from_inventory(items)
+    assert targets[:2] == [{'type': 's3', 'name': 'logs'}, {'type': 'vpc', 'name': 'vpc-1'}]
+    assert {t['type'] for t in targets[2:]} == {'iam', 'cloudtrail', 'config', 'waf'}
+    assert targets_from_inventory(items, include_account_checks=False) == targets[:2]
@@ -0,0 +1,113 @@
+import httpx
+import pytest
+
+
+def _use_transport(monkeypatch, handler):
+    from src.app import renderer_client
+
+    monkeypatch.setattr(renderer_client, '_client', httpx.Client(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(renderer_client, '_backoff', lambda attempt: None)
+    monkeypatch.setattr(renderer_client, 'breaker', renderer_client.CircuitBreaker(threshold=2, cooldown=60))
+    return renderer_client
+
+
+def test_transient_errors_are_retried_on_the_pooled_client(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, content=b'%PDF-1.4 ok')
+
+    rc = _use_transport(monkeypatch, handler)
+    assert b''.join(rc.stream_render('https://renderer/render', {'format': 'pdf'})) == b'%PDF-1.4 ok'
+    assert len(calls) == 3
+    assert rc.breaker.state == 'closed'
+
+
+def test_client_errors_are_not_retried(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        return httpx.Response(400)
+
+    rc = _use_transport(monkeypatch, handler)
+    with pytest.raises(httpx.HTTPStatusError):
+        b''.join(rc.stream_render('https://renderer/render', {}))
+    assert len(calls) == 1
+
+
+def test_breaker_opens_after_consecutive_failures(monkeypatch):
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        raise httpx.ConnectError('refused', request=request)
+
+    rc = _use_transport(monkeypatch, handler)
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            b''.join(rc.stream_render('https://renderer/render', {}))
+    assert rc.breaker.state == 'open'
+    made = len(calls)
+    with pytest.raises(rc.CircuitOpenError):
+        b''.join(rc.stream_render('https://renderer/render', {}))
+    assert len(calls) == made
+
+
+def test_breaker_half_opens_after_cooldown():
+    from src.app.renderer_client import CircuitBreaker
+
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=1, cooldown=10, clock=lambda: now[0])
+    breaker.record_failure()
+    assert not breaker.allow()
+    now[0] = 11
+    assert breaker.allow()
+    # only one trial call while half-open
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+    now[0] = 22
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+
+def test_client_errors_do_not_open_the_breaker(monkeypatch):
+    rc = _use_transport(monkeypatch, lambda request: httpx.Response(422))
+    for _ in range(3):
+        with pytest.raises(httpx.HTTPStatusError):
+            b''.join(rc.stream_render('https://renderer/render', {}))
+    assert rc.breaker.state == 'closed'
+
+
+def test_abandoned_stream_still_records_its_outcome(monkeypatch):
+    from src.app.renderer_client import CircuitBreaker
+
+    now = [0.0]
+    rc = _use_transport(monkeypatch, lambda request: httpx.Response(200, content=b'x' * 10))
+    monkeypatch.setattr(rc, 'breaker', CircuitBreaker(threshold=1, cooldown=10, clock=lambda: now[0]))
+    rc.breaker.record_failure()
+    now[0] = 11
+    # half-open trial: the caller reads one chunk and walks away
+    gen = rc.stream_render('https://renderer/render', {}, chunk_size=2)
+    assert next(gen) == b'xx'
+    gen.close()
+    assert rc.breaker.state == 'closed' and rc.breaker.allow()
+
+
+def test_errors_outside_the_renderer_release_the_trial(monkeypatch):
+    from src.app.renderer_client import CircuitBreaker
+
+    now = [0.0]
+    rc = _use_transport(monkeypatch, lambda request: httpx.Response(200))
+    monkeypatch.setattr(rc, 'breaker', CircuitBreaker(threshold=1, cooldown=10, clock=lambda: now[0]))
+    rc.breaker.record_failure()
+    now[0] = 11
+    with pytest.raises(TypeError):
+        # not JSON serializable: the request never reaches the renderer
+        b''.join(rc.stream_render('https://renderer/render', {'x': object()}))
+    assert rc.breaker.state == 'half-open' and rc.breaker.allow()
@@ -1,48 +1,114 @@
 import json
+from botocore.exceptions import ClientError
 
-def test_report_generator_puts_report_and_updates_table(monkeypatch):
-    # Fake event
-    event = {'Records': [{'body': json.dumps({'evaluationId': 'ev-1'})}]}
 
-    class FakeTable:
-        def __init__(self):
-            self.items = {}
+class FakeClient:
+    def __init__(self, items=None):
+        self.items = items or {}
+        self.gets = []
+        self.written = {}
 
-        def get_item(self, Key=None):
-            return {'Item': {'id': Key['id'], 'evaluationId': Key['id'], 'created_at': 1, 'results': []}}
+    def batch_get_item(self, RequestItems):
+        (name, req), = RequestItems.items()
+        self.gets.append([k['id'] for k in req['Keys']])
+        return {'Responses': {name: [self.items[k['id']] for k in req['Keys'] if k['id'] in self.items]}}
 
-        def update_item(self, Key=None, UpdateExpression=None, ExpressionAttributeValues=None):
-            self.items[Key['id']] = ExpressionAttributeValues
+    def batch_write_item(self, RequestItems):
+        (name, reqs), = RequestItems.items()
+        for r in reqs:
+            item = r['PutRequest']['Item']
+            self.written[(item['pk'], item['sk'])] = item
+        return {}
 
-    class FakeS3:
-        def __init__(self):
-            self.objects = {}
 
-        def put_object(self, Bucket, Key, Body):
-            self.objects[Key] = Body
+class FakeTable:
+    def __init__(self, name, items=None):
+        self.name = name
+        self.meta = type('Meta', (), {'client': FakeClient(items)})()
 
-    fake_table = FakeTable()
-    fake_reports_table = FakeTable()
-    fake_s3 = FakeS3()
 
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        return {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+
+# the pooled renderer client returns a streamed body (PDF)
+class FakeResp:
+    def __init__(self, content):
+        self.content = content
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        return None
+
+    def iter_bytes(self, chunk_size=None):
+        yield self.content[:8]
+        yield self.content[8:]
+
+
+def _setup(monkeypatch, evaluations):
     import src.lambdas.report_generator as rg
 
-    monkeypatch.setenv('REPORTS_BUCKET', 'my-bucket')
+    fake_table = FakeTable('autowar-evaluations', {e['id']: e for e in evaluations})
+    fake_reports_table = FakeTable('autowar-reports')
+    fake_s3 = FakeS3()
+    monkeypatch.setattr(rg, 'REPORTS_BUCKET', 'my-bucket')
     monkeypatch.setenv('RENDERER_URL', 'https://fake-renderer.local/render')
+    monkeypatch.delenv('AUTOWAR_REPORT_FORMATS', raising=False)
     monkeypatch.setattr(rg, 'dynamo', type('D', (), {'Table': lambda name: fake_table if name == 'autowar-evaluations' else fake_reports_table}))
     monkeypatch.setattr(rg, 's3', fake_s3)
+    monkeypatch.setattr(rg.report_pipeline.renderer_client, '_client', type('H', (), {'stream': lambda self, method, url, json: FakeResp(b'%PDF-1.4 fakepdf')})())
+    return rg, fake_table, fake_reports_table, fake_s3
 
-    # mock httpx.post to return bytes (PDF)
-    class FakeResp:
-        def __init__(self, content):
-            self.content = content
 
-        def raise_for_status(self):
-            return None
-
-    monkeypatch.setattr(rg, 'httpx', type('H', (), {'post': lambda url, json, timeout: FakeResp(b'%PDF-1.4 fakepdf')}))
+def test_report_generator_puts_report_and_updates_table(monkeypatch):
+    event = {'Records': [{'messageId': 'm1', 'body': json.dumps({'evaluationId': 'ev-1'})}]}
+    rg, _, fake_reports_table, fake_s3 = _setup(monkeypatch, [
+        {'id': 'ev-1', 'evaluationId': 'ev-1', 'client_id': 'c1', 'created_at': 1, 'results': []}])
 
     res = rg.handler(event, {})
-    assert res['processed'] == 1
-    # verify reports table updated
-    assert 'ev-1' in fake_reports_table.items
+    assert res['processed'] == 1 and res['batchItemFailures'] == []
+    [(key, body)] = fake_s3.objects.items()
+    assert key.startswith('reports/ev-1/') and key.endswith('.pdf')
+    assert body == b'%PDF-1.4 fakepdf'
+    # verify reports table updated, keyed by the documented pk/sk
+    item = fake_reports_table.meta.client.written[('CLIENT#c1', 'REPORT#ev-1')]
+    assert item['status'] == 'COMPLETED'
+    assert item['formats'] == {'pdf': f's3://my-bucket/{key}'}
+
+
+def test_batch_is_fetched_once_and_reports_partial_failures(monkeypatch):
+    evaluations = [{'id': f'ev-{i}', 'evaluationId': f'ev-{i}', 'client_id': 'c1', 'created_at': 1,
+                    'results': [{'name': 'iam-root-mfa', 'status': 'PASS', 'details': {'n': i}}]} for i in range(5)]
+    records = [{'messageId': f'm{i}', 'body': json.dumps({'evaluationId': f'ev-{i}', 'clientId': 'c1'})} for i in range(5)]
+    records.append({'messageId': 'bad', 'body': 'not json'})
+    rg, fake_table, fake_reports_table, fake_s3 = _setup(monkeypatch, evaluations)
+
+    original = rg.render_report
+
+    def flaky(evaluation, bucket):
+        if evaluation['evaluationId'] == 'ev-3':
+            raise RuntimeError('S3 unavailable')
+        return original(evaluation, bucket)
+
+    monkeypatch.setattr(rg, 'render_report', flaky)
+    res = rg.handler({'Records': records}, {})
+    assert res['processed'] == 4
+    # the malformed record is skipped (acknowledged), not redelivered
+    assert [f['itemIdentifier'] for f in res['batchItemFailures']] == ['m3']
+    assert fake_table.meta.client.gets == [[f'ev-{i}' for i in range(5)]]
+    assert sorted(sk for _, sk in fake_reports_table.meta.client.written) == [f'REPORT#ev-{i}' for i in (0, 1, 2, 4)]
+    assert len(fake_s3.objects) == 4
@@ -0,0 +1,159 @@
+import csv
+import io
+import json
+import sys
+
+import pytest
+from botocore.exceptions import ClientError
+
+EVALUATION = {
+    'evaluationId': 'ev-1',
+    'client_id': 'c1',
+    'account_id': '111',
+    'created_at': 1,
+    'results': [
+        {'name': 's3-public-access', 'resource': 'logs', 'status': 'PASS', 'details': {'public_block': True}},
+        {'name': 'iam-root-mfa', 'status': 'FAIL', 'details': 'root has no MFA'},
+    ],
+}
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': '404'}}, 'HeadObject')
+        return {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+
+def test_model_is_rendered_into_every_requested_format_once(monkeypatch):
+    from src.app import report_pipeline
+
+    model = report_pipeline.build_model(EVALUATION)
+    assert model.summary == {'PASS': 1, 'FAIL': 1}
+    s3 = FakeS3()
+    keys = report_pipeline.render_formats(model, ['json', 'csv'], s3, 'b', 'reports/ev-1/1')
+    assert keys == {'json': 'reports/ev-1/1.json', 'csv': 'reports/ev-1/1.csv'}
+
+    doc = json.loads(s3.objects['reports/ev-1/1.json'])
+    assert doc['evaluationId'] == 'ev-1' and doc['summary'] == {'PASS': 1, 'FAIL': 1}
+    assert [r['name'] for r in doc['results']] == ['s3-public-access', 'iam-root-mfa']
+
+    rows = list(csv.reader(io.StringIO(s3.objects['reports/ev-1/1.csv'].decode('utf-8'))))
+    assert rows[0] == report_pipeline.COLUMNS
+    assert rows[1] == ['s3-public-access', 'logs', 'PASS', 'security', 'SEC08-BP04', '{"public_block": true}']
+    assert rows[2] == ['iam-root-mfa', '', 'FAIL', 'security', 'SEC01-BP02', 'root has no MFA']
+
+
+def test_failed_formats_are_skipped_and_json_is_the_last_resort(monkeypatch):
+    from src.app import report_pipeline
+
+    # a None entry makes `import openpyxl` raise ImportError
+    monkeypatch.setitem(sys.modules, 'openpyxl', None)
+    monkeypatch.delenv('RENDERER_URL', raising=False)
+    s3 = FakeS3()
+    model = report_pipeline.build_model(EVALUATION)
+    assert report_pipeline.render_formats(model, ['xlsx', 'csv'], s3, 'b', 'k') == {'csv': 'k.csv'}
+    assert report_pipeline.render_formats(model, ['xlsx', 'pdf'], s3, 'b', 'k') == {'json': 'k.json'}
+
+
+def test_xlsx_round_trip(monkeypatch):
+    openpyxl = pytest.importorskip('openpyxl')
+    from src.app import report_pipeline
+
+    # spilled to disk and streamed out in several chunks
+    monkeypatch.setattr(report_pipeline, 'SPOOL_MAX_BYTES', 1024)
+    monkeypatch.setattr(report_pipeline, 'RENDER_CHUNK_SIZE', 1024)
+    model = report_pipeline.build_model(EVALUATION)
+    chunks = list(report_pipeline.FORMATS['xlsx'].render(model))
+    assert len(chunks) > 1 and max(len(c) for c in chunks) <= 1024
+    body = b''.join(chunks)
+    workbook = openpyxl.load_workbook(io.BytesIO(body), read_only=True)
+    assert workbook.sheetnames == ['Summary', 'Results']
+    summary = [list(r) for r in workbook['Summary'].iter_rows(values_only=True)]
+    assert summary[:2] == [['evaluationId', 'ev-1'], ['accountId', '111']]
+    rows = [list(r) for r in workbook['Results'].iter_rows(values_only=True)]
+    assert rows[0] == report_pipeline.COLUMNS
+    assert rows[1][:3] == ['s3-public-access', 'logs', 'PASS'] and rows[2][0] == 'iam-root-mfa'
+
+
+def test_parquet_round_trip(monkeypatch):
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    from src.app import report_pipeline
+
+    monkeypatch.setattr(report_pipeline, 'PARQUET_ROWS_PER_GROUP', 1)
+    model = report_pipeline.build_model(EVALUATION)
+    body = b''.join(report_pipeline.FORMATS['parquet'].render(model))
+    assert pq.ParquetFile(io.BytesIO(body)).metadata.num_row_groups == 2
+    table = pq.read_table(io.BytesIO(body))
+    assert table.column_names == report_pipeline.COLUMNS
+    assert table.column('validator').to_pylist() == ['s3-public-access', 'iam-root-mfa']
+    assert table.column('status').to_pylist() == ['PASS', 'FAIL']
+
+
+def test_empty_parquet_report_keeps_its_columns():
+    pytest.importorskip('pyarrow')
+    import pyarrow.parquet as pq
+    from src.app import report_pipeline
+
+    model = report_pipeline.build_model(dict(EVALUATION, results=[]))
+    table = pq.read_table(io.BytesIO(b''.join(report_pipeline.FORMATS['parquet'].render(model))))
+    assert table.column_names == report_pipeline.COLUMNS and table.num_rows == 0
+
+
+def test_pdf_variants_ask_the_renderer_for_their_template(monkeypatch):
+    from src.app import report_pipeline
+
+    payloads = []
+
+    def fake_stream(url, payload, chunk_size):
+        payloads.append(payload)
+        return iter([b'%PDF'])
+
+    monkeypatch.setenv('RENDERER_URL', 'https://renderer/render')
+    monkeypatch.setattr(report_pipeline.renderer_client, 'stream_render', fake_stream)
+    s3 = FakeS3()
+    model = report_pipeline.build_model(EVALUATION)
+    keys = report_pipeline.render_formats(model, ['pdf', 'pdf-executive', 'pdf-technical'], s3, 'b', 'k')
+    assert keys == {'pdf': 'k.pdf', 'pdf-executive': 'k.executive.pdf', 'pdf-technical': 'k.technical.pdf'}
+    assert sorted(p.get('template') or '' for p in payloads) == ['', 'executive', 'technical']
+
+
+def test_requested_formats(monkeypatch):
+    from src.app.report_pipeline import requested_formats
+
+    monkeypatch.delenv('AUTOWAR_REPORT_FORMATS', raising=False)
+    monkeypatch.delenv('RENDERER_URL', raising=False)
+    assert requested_formats() == ['json']
+    monkeypatch.setenv('RENDERER_URL', 'https://renderer')
+    assert requested_formats() == ['pdf']
+    monkeypatch.setenv('AUTOWAR_REPORT_FORMATS', 'pdf, csv,xlsx')
+    assert requested_formats() == ['pdf', 'csv', 'xlsx']
+
+
+def test_unchanged_content_reuses_stored_reports(monkeypatch):
+    from src.app import report_pipeline
+
+    rendered = []
+    fmt = report_pipeline.FORMATS['json']
+    counting = report_pipeline.ReportFormat(fmt.extension, fmt.content_type,
+                                            lambda m: rendered.append(m) or fmt.render(m), fmt.compressible)
+    monkeypatch.setitem(report_pipeline.FORMATS, 'json', counting)
+    s3 = FakeS3()
+
+    model = report_pipeline.build_model(EVALUATION)
+    first = report_pipeline.render_formats(model, ['json'], s3, 'b', report_pipeline.key_prefix(model))
+    again = report_pipeline.build_model(json.loads(json.dumps(EVALUATION)))
+    assert report_pipeline.render_formats(again, ['json'], s3, 'b', report_pipeline.key_prefix(again)) == first
+    assert len(rendered) == 1
+
+    changed = report_pipeline.build_model(dict(EVALUATION, results=EVALUATION['results'][:1]))
+    assert report_pipeline.key_prefix(changed) != report_pipeline.key_prefix(model)
+    monkeypatch.setattr(report_pipeline, 'TEMPLATE_VERSION', '2')
+    assert report_pipeline.key_prefix(model) != first['json'][:-len('.json')]
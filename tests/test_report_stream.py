@@ -0,0 +1,71 @@
+import gzip
+import json
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+        self.parts = {}
+        self.aborted = []
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = (Body, kwargs)
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        self.parts['up-1'] = []
+        return {'UploadId': 'up-1'}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        self.parts[UploadId].append(Body)
+        return {'ETag': f'etag-{PartNumber}'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        assert [p['PartNumber'] for p in MultipartUpload['Parts']] == list(range(1, len(self.parts[UploadId]) + 1))
+        self.objects[Key] = (b''.join(self.parts.pop(UploadId)), {})
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.aborted.append(UploadId)
+
+
+def test_large_stream_uses_bounded_multipart_parts():
+    from src.app.report_stream import upload_chunks
+
+    s3 = FakeS3()
+    chunks = [bytes([i]) * 7 for i in range(10)]
+    size = upload_chunks(iter(chunks), s3, 'b', 'k', 'application/octet-stream', part_size=16)
+    assert size == 70
+    assert s3.objects['k'][0] == b''.join(chunks)
+
+
+def test_small_stream_is_a_single_put_and_can_be_gzipped():
+    from src.app.report_stream import json_report_chunks, upload_chunks
+
+    s3 = FakeS3()
+    content = {'evaluationId': 'ev-1', 'created_at': 1, 'results': [{'name': f'v{i}'} for i in range(250)]}
+    upload_chunks(json_report_chunks(content), s3, 'b', 'k.json.gz', 'application/json', compress=True)
+    body, args = s3.objects['k.json.gz']
+    assert args == {'ContentType': 'application/json', 'ContentEncoding': 'gzip'}
+    assert json.loads(gzip.decompress(body)) == content
+
+
+def test_failed_stream_aborts_the_upload():
+    from src.app.report_stream import upload_chunks
+
+    def chunks():
+        yield b'x' * 20
+        raise RuntimeError('renderer died')
+
+    s3 = FakeS3()
+    try:
+        upload_chunks(chunks(), s3, 'b', 'k', 'application/pdf', part_size=8)
+    except RuntimeError:
+        pass
+    else:
+        raise AssertionError('expected RuntimeError')
+    assert s3.aborted == ['up-1'] and 'k' not in s3.objects
+
+
+def test_json_chunks_without_results():
+    from src.app.report_stream import json_report_chunks
+
+    assert json.loads(b''.join(json_report_chunks({'results': None}))) == {'results': []}
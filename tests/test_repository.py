@@ -0,0 +1,155 @@
+from src.app.repository import (
+    COMPOSITE_SCHEMA,
+    ID_SCHEMA,
+    EvaluationRepository,
+    EvidenceRepository,
+    ReportRepository,
+)
+
+
+class FakeTable:
+    def __init__(self, pages=None):
+        self.pages = pages or [{'Items': []}]
+        self.queries = []
+        self.updates = []
+        self.puts = []
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs)
+        return self.pages[1 if kwargs.get('ExclusiveStartKey') else 0]
+
+    def update_item(self, **kwargs):
+        self.updates.append(kwargs)
+
+    def put_item(self, Item):
+        self.puts.append(Item)
+
+
+def _condition(kwargs):
+    return kwargs['KeyConditionExpression'].get_expression()
+
+
+def test_composite_layout_keys_and_index_patterns():
+    table = FakeTable([{'Items': [{'evaluationId': 'e1', 'client_id': 'c1'}]}])
+    repo = EvaluationRepository(table, schema=COMPOSITE_SCHEMA)
+
+    item = repo.put({'evaluationId': 'e1', 'client_id': 'c1', 'account_id': '111122223333'})
+    assert (item['pk'], item['sk'], item['account_pk'], item['id']) == ('CLIENT#c1', 'EVAL#e1', 'ACCOUNT#111122223333', 'e1')
+
+    # no client id: the key is resolved through evaluationByIdIndex
+    repo.update('e1', 'SET #s = :s', {':s': 'RUNNING'}, {'#s': 'status'})
+    assert table.queries[0]['IndexName'] == 'evaluationByIdIndex'
+    assert table.updates[0]['Key'] == {'pk': 'CLIENT#c1', 'sk': 'EVAL#e1'}
+
+    args = repo.query_args('account', '111122223333')
+    assert args['IndexName'] == 'accountEvaluationsIndex'
+    assert _condition(args)['values'][1] == 'ACCOUNT#111122223333'
+
+    repo.for_client('c1', limit=10)
+    by_client = table.queries[-1]
+    assert 'IndexName' not in by_client and by_client['ScanIndexForward'] is False
+    assert _condition(by_client)['operator'] == 'AND'
+
+
+def test_id_layout_uses_deployed_indexes_and_paginates():
+    table = FakeTable([{'Items': [{'id': 'a'}], 'LastEvaluatedKey': {'id': 'a'}}, {'Items': [{'id': 'b'}]}])
+    repo = EvaluationRepository(table, schema=ID_SCHEMA)
+    assert repo.key('e1') == {'id': 'e1'}
+    assert [i['id'] for i in repo.for_client('c1')] == ['a', 'b']
+    assert table.queries[0]['IndexName'] == 'clientIndex'
+    # no status index in this layout
+    assert repo.query_args('status', 'RUNNING') is None
+
+
+def test_evidence_and_report_items_follow_documented_keys():
+    item = EvidenceRepository.item_for_result('c1', 'e1', {'name': 'iam', 'resource': 'arn:aws:iam::1:role/x'}, ts=5)
+    assert (item['pk'], item['sk'], item['resourceArn']) == ('CLIENT#c1', 'EVID#e1#iam#5', 'arn:aws:iam::1:role/x')
+
+    table = FakeTable()
+    reports = ReportRepository(table)
+    reports.mark_completed('c1', 'e1', 's3://b/k', ts=7, size=10)
+    update = table.updates[0]
+    assert update['Key'] == {'pk': 'CLIENT#c1', 'sk': 'REPORT#e1'}
+    assert update['ExpressionAttributeNames'] == {'#s': 'status', '#x0': 'size'}
+    assert update['ExpressionAttributeValues'][':g'] == 7
+
+
+def test_find_scans_only_when_the_index_is_missing(monkeypatch):
+    import pytest
+    from botocore.exceptions import ClientError
+    import src.app.repository as repository
+
+    scans = []
+    monkeypatch.setattr(repository, 'parallel_scan', lambda table, filter_expression=None: scans.append(1) or [{'id': 's'}])
+
+    class FailingTable(FakeTable):
+        name = 'autowar-evaluations'
+
+        def __init__(self, code, message):
+            super().__init__()
+            self.error = ClientError({'Error': {'Code': code, 'Message': message}}, 'Query')
+
+        def query(self, **kwargs):
+            raise self.error
+
+    repo = EvaluationRepository(FailingTable('ValidationException', 'The table does not have the specified index: clientIndex'),
+                                schema=ID_SCHEMA)
+    assert repo.for_client('c1') == [{'id': 's'}] and scans == [1]
+
+    for code, message in (('ProvisionedThroughputExceededException', 'slow down'), ('AccessDeniedException', 'denied'),
+                          ('ValidationException', 'Invalid KeyConditionExpression')):
+        repo = EvaluationRepository(FailingTable(code, message), schema=ID_SCHEMA)
+        with pytest.raises(ClientError):
+            repo.for_client('c1')
+    assert scans == [1]
+
+
+class IndexedTable(FakeTable):
+    """Evaluations table in the composite layout: keeps items and answers evaluationByIdIndex
+    like DynamoDB, which only indexes items carrying the index's key attributes."""
+
+    def __init__(self):
+        super().__init__()
+        self.items = {}
+
+    def put_item(self, Item):
+        if any(v is None for v in Item.values()):
+            raise ValueError('GSI key attributes cannot be NULL')
+        self.items[(Item['pk'], Item['sk'])] = Item
+
+    def query(self, IndexName, KeyConditionExpression, **kwargs):
+        assert IndexName == 'evaluationByIdIndex'
+        evaluation_id = KeyConditionExpression.get_expression()['values'][1]
+        return {'Items': [i for i in self.items.values()
+                          if i.get('evaluationId') == evaluation_id and 'created_at' in i]}
+
+    def get_item(self, Key):
+        return {'Item': self.items[(Key['pk'], Key['sk'])]} if (Key['pk'], Key['sk']) in self.items else {}
+
+
+def test_composite_layout_resolves_pending_evaluations(monkeypatch):
+    import src.app.evaluation_service as evaluation_service
+    from src.app.models import EvaluationIn
+
+    table = IndexedTable()
+    monkeypatch.setattr(evaluation_service, 'EvaluationRepository',
+                        lambda name: EvaluationRepository(table, schema=COMPOSITE_SCHEMA))
+    monkeypatch.setattr(evaluation_service, 'SQS_QUEUE_URL', 'https://sqs/queue')
+    monkeypatch.setattr(evaluation_service, '_get_sqs', lambda: type('SQS', (), {'send_message': lambda self, **kw: None})())
+
+    created = evaluation_service.create_evaluation(EvaluationIn(client_id='c1', account_id='111122223333'))
+    assert created['status'] == 'PENDING' and 'end_ts' not in created
+    evaluation_id = created['evaluationId']
+
+    assert evaluation_service.get_evaluation(evaluation_id)['status'] == 'PENDING'
+    repo = EvaluationRepository(table, schema=COMPOSITE_SCHEMA)
+    assert repo.key(evaluation_id) == {'pk': 'CLIENT#c1', 'sk': f'EVAL#{evaluation_id}'}
+    # items written without created_at get one, so they are indexed too
+    assert 'created_at' in repo.put({'evaluationId': 'e2', 'client_id': 'c1', 'end_ts': None})
+
+
+def test_evidence_rows_require_a_client():
+    import pytest
+
+    with pytest.raises(ValueError):
+        EvidenceRepository.item_for_result(None, 'e1', {'name': 'iam'}, ts=5)
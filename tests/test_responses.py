@@ -0,0 +1,42 @@
+import gzip
+import json
+from decimal import Decimal
+
+
+def test_fast_json_response_decimals():
+    import src.app.responses as responses
+
+    resp = responses.FastJSONResponse({'score': Decimal('87.5'), 'count': Decimal('3'), 'tags': {'a'}})
+    assert json.loads(resp.body) == {'score': 87.5, 'count': 3, 'tags': ['a']}
+    assert b'content-encoding' not in dict(resp.raw_headers)
+
+
+def test_fast_json_response_compresses_large_bodies(monkeypatch):
+    import src.app.responses as responses
+
+    monkeypatch.setattr(responses, 'brotli', None)
+    content = {'results': [{'name': 'check', 'status': 'PASS', 'n': Decimal(i)} for i in range(200)]}
+
+    resp = responses.FastJSONResponse(content, accept_encoding='gzip, deflate')
+    headers = dict(resp.raw_headers)
+    assert headers[b'content-encoding'] == b'gzip'
+    assert json.loads(gzip.decompress(resp.body))['results'][199]['n'] == 199
+
+    small = responses.FastJSONResponse({'ok': True}, accept_encoding='gzip')
+    assert b'content-encoding' not in dict(small.raw_headers)
+
+
+def test_get_evaluation_endpoint_serializes_dynamo_item(monkeypatch):
+    from fastapi.testclient import TestClient
+    import src.app.main as main
+
+    item = {'id': 'ev-1', 'evaluationId': 'ev-1', 'created_at': Decimal('1700000000'),
+            'results': [{'name': 'iam-root-mfa', 'status': 'PASS', 'score': Decimal('0.5')}] * 100}
+    monkeypatch.setattr(main, 'get_evaluation', lambda evaluation_id: item)
+
+    resp = TestClient(main.app).get('/evaluations/ev-1', headers={'Accept-Encoding': 'gzip'})
+    assert resp.status_code == 200
+    assert resp.headers['content-encoding'] == 'gzip'
+    body = resp.json()
+    assert body['created_at'] == 1700000000
+    assert body['results'][0]['score'] == 0.5
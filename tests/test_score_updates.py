@@ -0,0 +1,136 @@
+import pytest
+from botocore.exceptions import ClientError
+
+
+class FakeEvaluations:
+    def __init__(self, item, conflicts=0):
+        self.item = item
+        self.conflicts = conflicts
+        self.updates = []
+
+    def get(self, evaluation_id, client_id=None):
+        return dict(self.item)
+
+    def update(self, evaluation_id, expression, values, names=None, client_id=None, condition=None):
+        if self.conflicts:
+            self.conflicts -= 1
+            raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'UpdateItem')
+        self.updates.append((expression, values, names, condition))
+
+
+RESULTS = [
+    {'name': 'iam-root-mfa', 'status': 'FAIL'},
+    {'name': 'cloudtrail-logging', 'status': 'PASS'},
+    {'name': 'vpc-flow-logs', 'resource': 'vpc-1', 'status': 'FAIL'},
+    {'name': 's3-public-access', 'resource': 'logs', 'status': 'PASS'},
+]
+
+
+def _stored_item(results):
+    from src.app.catalog import load_catalog
+    from src.app.scoring import bp_scores_from_results, default_model, state_to_dynamo
+
+    state = default_model().build_state(bp_scores_from_results(results), version=1)
+    return dict(state_to_dynamo(state), id='ev-1', results=list(results), catalog_version=load_catalog().version)
+
+
+def test_delta_matches_full_rescoring():
+    from src.app.scoring import bp_scores_from_results, default_model, state_from_item
+
+    model = default_model()
+    state = state_from_item(_stored_item(RESULTS))
+    assert model.apply(state, 'SEC01-BP02', 100.0) == ('SEC01', 'security')
+    assert model.apply(state, 'SEC08-BP04', None) == ('SEC08', 'security')
+    assert model.apply(state, 'SEC08-BP04', None) is None
+    expected = bp_scores_from_results(RESULTS)
+    expected['SEC01-BP02'] = 100.0
+    del expected['SEC08-BP04']
+    assert state.scores() == model.score(expected)
+
+
+def test_record_result_writes_only_affected_scores_in_one_conditional_update():
+    from src.app.score_updates import record_result
+    from src.app.scoring import bp_scores_from_results, default_model
+
+    evaluations = FakeEvaluations(_stored_item(RESULTS))
+    fixed = {'name': 'vpc-flow-logs', 'resource': 'vpc-1', 'status': 'PASS'}
+    scores = record_result(evaluations, 'ev-1', fixed)
+
+    [(expression, values, names, condition)] = evaluations.updates
+    assert condition == 'score_version = :v0' and values[':v0'] == 1 and values[':v1'] == 2
+    assert 'results[2] = :new' in expression and values[':new'] == fixed
+    # SEC04-BP01 (cloudtrail, config, flow logs) and its question/pillar only
+    assert {v for k, v in names.items() if k.startswith(('#b', '#q', '#p')) and k not in ('#qs', '#ps')} == {
+        'SEC04-BP01', 'SEC04', 'security'}
+    assert str(values[':b0']) == '100.0'
+    expected = default_model().score(bp_scores_from_results([RESULTS[0], RESULTS[1], fixed, RESULTS[3]]))
+    assert scores == expected
+
+
+def test_conflicting_writes_are_retried():
+    from src.app.score_updates import update_scores
+
+    evaluations = FakeEvaluations(_stored_item(RESULTS), conflicts=2)
+    update_scores(evaluations, 'ev-1', {'SEC02-BP01': 0.0})
+    assert len(evaluations.updates) == 1
+
+    evaluations = FakeEvaluations(_stored_item(RESULTS), conflicts=5)
+    with pytest.raises(RuntimeError):
+        update_scores(evaluations, 'ev-1', {'SEC02-BP01': 0.0})
+
+
+def test_evaluation_without_stored_sums_gets_the_full_state():
+    from src.app.score_updates import update_scores
+
+    evaluations = FakeEvaluations({'id': 'ev-1', 'results': RESULTS})
+    scores = update_scores(evaluations, 'ev-1', {'SEC01-BP02': 100.0})
+    [(expression, values, names, condition)] = evaluations.updates
+    assert condition == 'attribute_not_exists(score_version)'
+    assert set(names.values()) >= {'score_sums', 'bp_scores', 'score_total', 'score_version'}
+    assert scores['question_scores']['SEC01'] == 100.0
+
+
+def test_sums_of_another_catalog_version_are_rebuilt_not_moved(monkeypatch):
+    import copy
+    from src.app import catalog as catalog_module
+    from src.app.score_updates import update_scores
+    from src.app.scoring import bp_scores_from_results
+
+    item = _stored_item(RESULTS)
+    raw = copy.deepcopy(catalog_module._from_file(catalog_module.CATALOG_PATH))
+    raw['version'] = 'reweighted'
+    for pillar in raw['pillars'].values():
+        pillar['weight'] = 1
+    raw['pillars']['security'] = {'weight': 5}
+    for bp in raw['best_practices'].values():
+        bp['weight'] = 3 if bp['question'] == 'SEC04' else 1
+    new_catalog = catalog_module.compile_catalog(raw)
+    monkeypatch.setattr(catalog_module, '_catalog', new_catalog)
+
+    evaluations = FakeEvaluations(item)
+    scores = update_scores(evaluations, 'ev-1', {'SEC01-BP02': 100.0})
+    expected = bp_scores_from_results(RESULTS)
+    expected['SEC01-BP02'] = 100.0
+    assert scores == new_catalog.scoring_model.score(expected)
+
+    [(expression, values, names, condition)] = evaluations.updates
+    assert 'catalog_version = :cv' in expression and values[':cv'] == 'reweighted'
+    # the whole state is written, still guarded by the stored version
+    assert set(names.values()) >= {'score_sums', 'bp_scores', 'score_total', 'score_version'}
+    written_version = next(values[':' + k[1:]] for k, v in names.items() if v == 'score_version')
+    assert condition == 'score_version = :v0' and values[':v0'] == 1 and written_version == 2
+
+
+def test_reads_keep_stored_scores_unless_missing_or_stale(monkeypatch):
+    from src.app import evaluation_service
+    from src.app.catalog import load_catalog
+
+    version = load_catalog().version
+    # stored scores moved by a delta update, differing from a full recomputation
+    fresh = dict(_stored_item(RESULTS), score_total=42, catalog_version=version)
+    stale = dict(_stored_item(RESULTS), id='ev-2', score_total=42, catalog_version='older')
+    legacy = {'id': 'ev-3', 'results': list(RESULTS), 'score_total': 42}
+    computed = evaluation_service.score_evaluations([legacy])[0]['score_total']
+    items = evaluation_service._with_scores([fresh, stale, legacy, {'id': 'ev-4'}])
+    assert [i['score_total'] for i in items[:3]] == [42, computed, computed]
+    assert 'score_total' not in items[3]
@@ -0,0 +1,51 @@
+import math
+
+import numpy as np
+
+
+def _model():
+    from src.app.scoring import BestPractice, ScoringModel
+
+    return ScoringModel([
+        BestPractice('A1', 'QA', 'security', 3.0),
+        BestPractice('A2', 'QA', 'security', 1.0),
+        BestPractice('B1', 'QB', 'security'),
+        BestPractice('C1', 'QC', 'reliability'),
+    ], pillar_weights={'security': 3.0})
+
+
+def test_scores_roll_up_through_weighted_levels():
+    scores = _model().score({'A1': 100, 'A2': 0, 'B1': 0, 'C1': 100})
+    assert scores['question_scores'] == {'QA': 75.0, 'QB': 0.0, 'QC': 100.0}
+    assert scores['pillar_scores'] == {'security': 37.5, 'reliability': 100.0}
+    assert scores['score_total'] == round((37.5 * 3 + 100) / 4, 2)
+
+
+def test_unevaluated_practices_are_left_out_not_zeroed():
+    scores = _model().score({'A2': 100})
+    assert scores == {'score_total': 100.0, 'pillar_scores': {'security': 100.0}, 'question_scores': {'QA': 100.0}}
+    assert _model().score({})['score_total'] is None
+
+
+def test_batch_matches_single_scoring():
+    model = _model()
+    rng = np.random.default_rng(7)
+    batch = [{bp: float(v) for bp, v in zip(model.bp_ids, row) if v >= 10} for row in rng.integers(0, 101, (200, 4))]
+    assert model.score_batch(batch) == [model.score(s) for s in batch]
+    assert model.score_batch([]) == []
+
+
+def test_results_map_to_bp_scores_through_validators():
+    from src.app.scoring import bp_scores_from_results, score_evaluations, to_dynamo
+
+    results = [
+        {'name': 'cloudtrail-logging', 'status': 'PASS'},
+        {'name': 'vpc-flow-logs', 'status': 'FAIL'},
+        {'name': 's3-public-access', 'status': 'ERROR'},
+    ]
+    bp = bp_scores_from_results(results)
+    assert bp == {'SEC04-BP01': 50.0, 'OPS08-BP01': 100.0}
+    [scores] = score_evaluations([{'results': results}])
+    assert scores['pillar_scores'] == {'security': 50.0, 'operational-excellence': 100.0}
+    assert math.isclose(scores['score_total'], 75.0)
+    assert str(to_dynamo(scores)['score_total']) == '75.0'
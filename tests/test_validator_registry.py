@@ -0,0 +1,141 @@
+import sys
+import types
+
+import pytest
+
+
+def _registry_module():
+    import src.app.validators.registry as registry
+    return registry
+
+
+class FakeEntryPoint:
+    def __init__(self, name, value):
+        self.name = name
+        self.value = value
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return self.value
+
+
+def _pack_module(monkeypatch, name, loaded):
+    class RDSEncryptionValidator:
+        name = 'rds-encryption'
+
+        def __init__(self):
+            loaded.append(self.name)
+
+        def run(self, **kwargs):
+            return {'status': 'PASS'}
+
+    module = types.ModuleType(name)
+    module.RDSEncryptionValidator = RDSEncryptionValidator
+    monkeypatch.setitem(sys.modules, name, module)
+
+
+def test_validators_are_loaded_only_for_requested_types(monkeypatch):
+    registry = _registry_module()
+    loaded = []
+    _pack_module(monkeypatch, 'fake_pack_lazy', loaded)
+    reg = registry.ValidatorRegistry([
+        registry.ValidatorSpec('rds-encryption', 'rds', 'fake_pack_lazy:RDSEncryptionValidator'),
+        registry.ValidatorSpec('never-loaded', 'ghost', 'fake_pack_missing_module:Nope'),
+    ], entry_point_group=None)
+
+    assert reg.names('ghost') == ['never-loaded']
+    assert loaded == [] and reg.loaded_types() == []
+    [v] = reg['rds']
+    assert v.name == 'rds-encryption' and loaded == ['rds-encryption']
+    assert reg.get('rds')[0] is v and loaded == ['rds-encryption']
+    assert reg.get('unknown', []) == []
+    assert reg.loaded_types() == ['rds']
+
+
+def test_entry_point_packs_are_discovered_once(monkeypatch):
+    registry = _registry_module()
+    loaded = []
+    _pack_module(monkeypatch, 'fake_pack_ep', loaded)
+    ep = FakeEntryPoint('rds-pack', [
+        registry.ValidatorSpec('rds-encryption', 'rds', 'fake_pack_ep:RDSEncryptionValidator',
+                               best_practices=('SEC08-BP02',))])
+    broken = FakeEntryPoint('broken', None)
+    groups = []
+
+    def fake_entry_points(group):
+        groups.append(group)
+        return [ep, broken]
+
+    monkeypatch.setattr(registry, 'entry_points', fake_entry_points)
+    reg = registry.ValidatorRegistry()
+    assert reg.specs('rds')[0].best_practices == ('SEC08-BP02',)
+    assert loaded == []
+    assert [v.name for v in reg['rds']] == ['rds-encryption']
+    assert list(reg) == ['rds']
+    assert groups == ['autowar.validators'] and ep.loads == 1
+
+
+def test_declared_name_must_match_validator():
+    registry = _registry_module()
+    spec = registry.ValidatorSpec('other-name', 's3', 'src.app.validators.s3_validators:S3PublicAccessValidator')
+    with pytest.raises(RuntimeError):
+        spec.load()
+
+
+def test_builtin_specs_match_catalog_and_overrides_replace_them(monkeypatch):
+    from src.app.catalog import compile_catalog, _from_file, CATALOG_PATH
+    from src.app.validators import manager
+
+    catalog = compile_catalog(_from_file(CATALOG_PATH))
+    for spec in manager.BUILTIN_VALIDATORS:
+        assert spec.best_practices == catalog.validator_bps[spec.name]
+    assert manager.VALIDATOR_MAP.names('iam') == ['iam-password-policy', 'iam-root-mfa']
+
+    fake = type('V', (), {'name': 'fake-check'})()
+    monkeypatch.setitem(manager.VALIDATOR_MAP, 'iam', [fake])
+    assert manager.VALIDATOR_MAP['iam'] == [fake]
+    assert manager.VALIDATOR_MAP.names('iam') == ['fake-check']
+
+
+def test_unloadable_validator_reports_error_without_aborting_its_type(monkeypatch):
+    registry = _registry_module()
+    from src.app.validators import manager
+
+    loaded = []
+    _pack_module(monkeypatch, 'fake_pack_partial', loaded)
+    reg = registry.ValidatorRegistry([
+        registry.ValidatorSpec('rds-missing', 'rds', 'fake_pack_missing_module:Nope'),
+        registry.ValidatorSpec('rds-encryption', 'rds', 'fake_pack_partial:RDSEncryptionValidator'),
+        registry.ValidatorSpec('rds-typo', 'rds', 'fake_pack_partial:NoSuchClass'),
+    ], entry_point_group=None)
+    monkeypatch.setattr(manager, 'VALIDATOR_MAP', reg)
+
+    results = manager.run_validators_for_evaluation([{'type': 'rds', 'name': 'db-1'}])
+    assert [(r.get('name'), r['status']) for r in results] == [
+        ('rds-missing', 'ERROR'), (None, 'PASS'), ('rds-typo', 'ERROR')]
+    assert 'fake_pack_missing_module:Nope' in results[0]['details']
+
+
+def test_plugin_best_practices_count_when_the_catalog_does_not_map_them(monkeypatch):
+    registry = _registry_module()
+    from src.app import catalog as catalog_module
+    from src.app.validators import manager
+
+    ep = FakeEntryPoint('rds-pack', [
+        registry.ValidatorSpec('rds-encryption', 'rds', 'fake_pack_cat:RDSEncryptionValidator',
+                               best_practices=('SEC08-BP04',)),
+        registry.ValidatorSpec('rds-unknown-bp', 'rds', 'fake_pack_cat:Other', best_practices=('NOPE-BP01',)),
+        # the catalog's own mapping wins over a spec's
+        registry.ValidatorSpec('iam-root-mfa', 'iam2', 'fake_pack_cat:Root', best_practices=('SEC08-BP04',)),
+    ])
+    monkeypatch.setattr(registry, 'entry_points', lambda group: [ep])
+    monkeypatch.setattr(manager, 'VALIDATOR_MAP', registry.ValidatorRegistry(manager.BUILTIN_VALIDATORS))
+    monkeypatch.setattr(catalog_module, '_catalog', None)
+
+    catalog = catalog_module.load_catalog()
+    monkeypatch.setattr(catalog_module, '_catalog', None)
+    assert catalog.validator_bps['rds-encryption'] == ('SEC08-BP04',)
+    assert 'rds-encryption' in catalog.bp_validators['SEC08-BP04']
+    assert 'rds-unknown-bp' not in catalog.validator_bps
+    assert catalog.validator_bps['iam-root-mfa'] == ('SEC01-BP02',)